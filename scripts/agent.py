@@ -1,11 +1,23 @@
 # agent.py
-import os
-from typing import List, Tuple
+import os, threading, time, traceback
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional, Tuple
 from dotenv import load_dotenv
-from langchain_community.vectorstores import FAISS
 from langchain_huggingface import HuggingFaceEmbeddings
-from utils.web_tools import ddg_search, fetch_readable
-from transformers import AutoTokenizer, AutoModelForCausalLM
+from utils.web_tools import web_search
+from utils.batcher import MicroBatcher
+from utils.live_index import LiveIndex, upgrade_current
+from utils.ann_index import tune_index
+from utils.chunk_store import load_store
+from utils.snapshots import version_dir
+from utils.query_cache import CachedEmbeddings, QueryCache, normalize_query
+from utils.context_packer import ContextPacker
+from utils.prefix_cache import PrefixCache, common_prefix
+from utils.optimized_model import load_optimized, read_config
+from utils.speculative import SpeculativeDecoder, load_draft
+from utils.metrics import SIZE_BUCKETS, Histogram, collector, stage
+from transformers import (AutoTokenizer, AutoModelForCausalLM,
+                          StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer)
 import torch
 
 load_dotenv()
@@ -13,25 +25,95 @@ BASE_MODEL = os.getenv("BASE_MODEL", "gpt2")
 EMBED_MODEL = os.getenv("EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
 DB_DIR = "storage/faiss"
 LORA_DIR = "models/lora-lecture-gpt2/checkpoint-16"
+OPTIMIZED_DIR = os.getenv("OPTIMIZED_DIR", "models/optimized-gpt2")
+USE_OPTIMIZED = os.getenv("USE_OPTIMIZED", "1") == "1"
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "20"))
+# answer_batch(): prompts handed to the scheduler at a time, and concurrent web searches
+ANSWER_BATCH_SIZE = int(os.getenv("ANSWER_BATCH_SIZE", str(BATCH_MAX_SIZE)))
+ANSWER_BATCH_WEB_WORKERS = int(os.getenv("ANSWER_BATCH_WEB_WORKERS", "4"))
+DELTA_COMPACT_EVERY = int(os.getenv("DELTA_COMPACT_EVERY", "500"))
+SNAPSHOT_POLL_S = float(os.getenv("SNAPSHOT_POLL_S", "2"))  # how often to look for new index versions; 0 = never
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "900"))  # leaves room for output under the 1024 cap
+CONTEXT_ITEM_TOKENS = int(os.getenv("CONTEXT_ITEM_TOKENS", "300"))  # cap per lecture chunk / web snippet
+PREFIX_CACHE_SIZE = int(os.getenv("PREFIX_CACHE_SIZE", "8"))  # token prefixes whose KV is kept; 0 = off
+# Speculative decoding: a small draft model with the same vocabulary, e.g. DRAFT_MODEL=distilgpt2
+DRAFT_MODEL = os.getenv("DRAFT_MODEL", "")
+DRAFT_TOKENS = int(os.getenv("DRAFT_TOKENS", "5"))                       # tokens proposed per step
+SPEC_MIN_ACCEPTANCE = float(os.getenv("SPEC_MIN_ACCEPTANCE", "0.3"))     # below this, decode without the draft
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "8"))          # IVF indexes: lists probed per query
+FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))   # HNSW: candidate list size per query
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")      # dense | bm25 | hybrid (RRF of both)
+# Query caches (size 0 disables a layer). Answers are sampled, so the answer cache is opt-in via a TTL.
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "1024"))
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "1024"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "256"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "0"))       # seconds; 0 = no answer cache
+# cosine similarity above which a near-duplicate question reuses cached results; 0 = exact match only
+CACHE_SEMANTIC_THRESHOLD = float(os.getenv("CACHE_SEMANTIC_THRESHOLD", "0"))
 
-# Load generator (base + LoRA if present)
-tokenizer = AutoTokenizer.from_pretrained(LORA_DIR if os.path.exists(LORA_DIR) else BASE_MODEL)
-if tokenizer.pad_token is None:
-    tokenizer.pad_token = tokenizer.eos_token
+# Models and index are loaded by load(), which the API runs in a background thread at startup
+# (see scripts/api.py): importing this module stays cheap and a failed load leaves the process up
+tokenizer = model = draft = speculative = None
+embeddings = query_embeddings = store = None
+prefix_cache = packer = None
+load_times: Dict[str, float] = {}   # component -> seconds, in load order
+load_error: Optional[str] = None
+_loading: Optional[str] = None      # component being loaded right now
+_ready = threading.Event()
+_load_lock = threading.Lock()
 
-model = AutoModelForCausalLM.from_pretrained(
-    LORA_DIR if os.path.exists(LORA_DIR) else BASE_MODEL,
-    device_map="auto"
-)
-model.eval()
+PROMPT_TOKENS = Histogram("rag_prompt_tokens", "Prompt tokens per generated answer", SIZE_BUCKETS)
+GENERATED_TOKENS = Histogram("rag_generated_tokens", "New tokens per generated answer", SIZE_BUCKETS)
+RETRIEVED_CHUNKS = Histogram("rag_retrieved_chunks", "Lecture chunks returned per retrieval", SIZE_BUCKETS)
+BATCH_SIZE = Histogram("rag_generate_batch_size", "Prompts per generate() call", SIZE_BUCKETS)
 
-# Load embeddings + FAISS
-embeddings = HuggingFaceEmbeddings(model_name=EMBED_MODEL)
-db = FAISS.load_local(DB_DIR, embeddings, allow_dangerous_deserialization=True)
+def _generate(**kwargs):
+    if speculative is not None and kwargs["input_ids"].shape[0] == 1:
+        return speculative.generate(**kwargs)
+    return model.generate(**kwargs)
+
+def generation_stats() -> Dict:
+    return {"speculative": speculative.stats() if speculative is not None else None}
+
+retrieval_cache = QueryCache("retrieval", maxsize=RETRIEVAL_CACHE_SIZE, threshold=CACHE_SEMANTIC_THRESHOLD)
+answer_cache = QueryCache("answer", maxsize=ANSWER_CACHE_SIZE if ANSWER_CACHE_TTL > 0 else 0,
+                          ttl=ANSWER_CACHE_TTL, threshold=CACHE_SEMANTIC_THRESHOLD)
+
+def invalidate_caches():
+    # retrieval results and answers depend on the corpus; query embeddings do not
+    retrieval_cache.clear()
+    answer_cache.clear()
+
+def cache_stats() -> Dict:
+    stats = {c.name: c.stats() for c in (retrieval_cache, answer_cache)}
+    if query_embeddings is not None:
+        stats["embedding"] = query_embeddings.cache.stats()
+    if prefix_cache is not None:
+        stats["prefix_kv"] = prefix_cache.stats()
+    return stats
+
+@collector
+def _cache_metrics():
+    samples = [({"cache": name, "result": result}, s[key]) for name, s in cache_stats().items()
+               for result, key in (("hit", "hits"), ("semantic_hit", "semantic_hits"), ("miss", "misses"))
+               if key in s]
+    return [("rag_cache_lookups_total", "counter", "Cache lookups by cache and outcome", samples)]
+
+def _query_vec(query: str):
+    # only needed for semantic lookups; comes from the embedding cache when the query was seen before
+    return query_embeddings.embed_query(query) if CACHE_SEMANTIC_THRESHOLD else None
 
 def retrieve(query: str, k: int = 4) -> List[Tuple[str, dict]]:
-    docs = db.similarity_search(query, k=k)
-    return [(d.page_content, d.metadata) for d in docs]
+    with stage("retrieve"):
+        params, vec = (RETRIEVAL_MODE, k), _query_vec(query)
+        chunks = retrieval_cache.get(query, params, vec)
+        if chunks is None:
+            docs = store.search(query, k=k, mode=RETRIEVAL_MODE)
+            chunks = [(d.page_content, d.metadata) for d in docs]
+            retrieval_cache.put(query, chunks, params, vec)
+    RETRIEVED_CHUNKS.observe(len(chunks))
+    return chunks
 
 PROMPT = """You are an expert assistant fine-tuned on my lectures.
 Use the provided CONTEXT (from my lectures) and, if present, WEB_SNIPPETS (fresh info from the internet).
@@ -50,42 +132,316 @@ WEB_SNIPPETS (Optional):
 Answer:
 """
 
+def prompt_inputs(prompts: List[str]) -> Dict:
+    # build_prompt keeps prompts within PROMPT_TOKEN_BUDGET, so this truncation never cuts the question/cue
+    with stage("tokenize"):
+        rows = tokenizer(prompts, truncation=True, max_length=PROMPT_TOKEN_BUDGET)["input_ids"]
+        for r in rows:
+            PROMPT_TOKENS.observe(len(r))
+        return prefix_cache.prepare(rows, pad_id=tokenizer.pad_token_id)
+
+def _count_generated(out, prompt_len: int):
+    # rows that finished early are padded with eos up to the longest one
+    for n in (out[:, prompt_len:] != tokenizer.eos_token_id).sum(dim=1).tolist():
+        GENERATED_TOKENS.observe(n)
+
 @torch.inference_mode()
+def generate_batch(prompts: List[str]) -> List[str]:
+    inputs = prompt_inputs(prompts)
+    BATCH_SIZE.observe(len(prompts))
+    with stage("generate_batch"):
+        out = _generate(
+            **inputs,
+            max_length=1024,        # absolute model cap
+            temperature=0.7,
+            top_p=0.9,
+            do_sample=True,
+            pad_token_id=tokenizer.eos_token_id,
+        )
+    prompt_len = inputs["input_ids"].shape[1]
+    _count_generated(out, prompt_len)
+    # only the new text, like stream_answer (the prompt is left-padded, so every row continues at prompt_len)
+    return tokenizer.batch_decode(out[:, prompt_len:], skip_special_tokens=True)
+
 def generate_answer(prompt):
-    inputs = tokenizer(prompt, return_tensors="pt", truncation=True, max_length=900)  # 900 leaves room for output
-    input_ids = inputs["input_ids"]
+    return generate_batch([prompt])[0]
 
-    out = model.generate(
-        input_ids,
-        max_length=1024,        # absolute model cap
-        temperature=0.7,
-        top_p=0.9,
-        do_sample=True,
-        pad_token_id=tokenizer.eos_token_id,
-    )
-    return tokenizer.decode(out[0], skip_special_tokens=True)
+# Concurrent /ask calls are grouped here into one padded generate() call
+scheduler = MicroBatcher(generate_batch, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS)
 
 
-def answer(query: str, use_web: bool = True, k: int = 4):
+def build_prompt(query: str, use_web: bool = True, k: int = 4) -> str:
     # 1) RAG from lectures
     chunks = retrieve(query, k=k)
-    context = "\n\n".join(f"[L{i+1}] {c[:1200]}" for i, (c, _) in enumerate(chunks))
 
     # 2) Web (lightweight) if requested
-    web_txt = ""
+    pages = []
     if use_web:
-        hits = ddg_search(query, max_results=3)
-        snippets = []
-        for i, h in enumerate(hits):
+        # search + concurrent page fetches share one WEB_DEADLINE; pages that miss it are left out
+        with stage("web_search"):
+            pages = web_search(query, max_results=3)
+
+    # 3) Fill the token budget by relevance; the question and the answer cue are always kept
+    with stage("pack"):
+        prompt, _ = packer.pack(query, [c for c, _ in chunks], pages)
+    return prompt
+
+
+def answer(query: str, use_web: bool = True, k: int = 4):
+    params, vec = ("answer", use_web, k), _query_vec(query)
+    cached = answer_cache.get(query, params, vec)
+    if cached is not None:
+        return cached
+    prompt = build_prompt(query, use_web=use_web, k=k)
+    # waiting for a batch slot + tokenize + generate_batch (those two run on the batcher thread)
+    with stage("generate"):
+        resp = scheduler(prompt)
+    answer_cache.put(query, resp, params, vec)
+    return resp
+
+
+def answer_batch(queries: List[str], use_web: bool = True, k: int = 4) -> Iterator[Dict]:
+    """
+    answer() for many questions at once, for offline jobs (evaluation, study guides). All questions
+    are embedded in one encoder call and retrieved with one matrix search, each distinct web query
+    runs once, and prompts go through the batch scheduler ANSWER_BATCH_SIZE at a time, sorted by
+    length so rows in a batch pad little. Yields {"index", "question", "answer"} (or "error") in
+    completion order: answer-cache hits first, then each group as it finishes.
+    """
+    params = ("answer", use_web, k)
+    vecs = query_embeddings.embed_queries(queries)
+    lookup = lambda i: vecs[i] if CACHE_SEMANTIC_THRESHOLD else None
+
+    todo = []
+    for i, q in enumerate(queries):
+        cached = answer_cache.get(q, params, lookup(i))
+        if cached is not None:
+            yield {"index": i, "question": q, "answer": cached}
+        else:
+            todo.append(i)
+    if not todo:
+        return
+
+    # 1) RAG from lectures: retrieval-cache misses share one index.search
+    chunks: Dict[int, list] = {}
+    with stage("retrieve"):
+        for i in todo:
+            chunks[i] = retrieval_cache.get(queries[i], (RETRIEVAL_MODE, k), lookup(i))
+        missing = [i for i in todo if chunks[i] is None]
+        if missing:
+            found = store.search_batch([queries[i] for i in missing], k=k, mode=RETRIEVAL_MODE,
+                                       vectors=[vecs[i] for i in missing])
+            for i, docs in zip(missing, found):
+                chunks[i] = [(d.page_content, d.metadata) for d in docs]
+                retrieval_cache.put(queries[i], chunks[i], (RETRIEVAL_MODE, k), lookup(i))
+    for i in todo:
+        RETRIEVED_CHUNKS.observe(len(chunks[i]))
+
+    # 2) Web: one search per distinct (normalized) question; page fetches still share web_tools' pool
+    pages: Dict[str, List[Dict]] = {}
+    if use_web:
+        distinct: Dict[str, str] = {}
+        for i in todo:
+            distinct.setdefault(normalize_query(queries[i]), queries[i])
+        with stage("web_search"), ThreadPoolExecutor(max_workers=min(ANSWER_BATCH_WEB_WORKERS, len(distinct)),
+                                                     thread_name_prefix="batch-web") as pool:
+            pages = dict(zip(distinct, pool.map(lambda q: web_search(q, max_results=3), distinct.values())))
+
+    # 3) Pack and generate, shortest prompts together
+    prompts, lengths = {}, {}
+    with stage("pack"):
+        for i in todo:
+            prompts[i], info = packer.pack(queries[i], [c for c, _ in chunks[i]],
+                                           pages.get(normalize_query(queries[i]), []))
+            lengths[i] = info["tokens"]
+    todo.sort(key=lengths.get)
+    # generation shares the scheduler (one model, prefix cache and tokenizer) with /ask; submitting
+    # one group at a time keeps interactive questions from queueing behind the whole job
+    for start in range(0, len(todo), ANSWER_BATCH_SIZE):
+        group = todo[start:start + ANSWER_BATCH_SIZE]
+        with stage("generate"):
+            futures = [scheduler.submit(prompts[i]) for i in group]
+            wait(futures)
+        for i, fut in zip(group, futures):
             try:
-                text = fetch_readable(h["url"])[:1500]
-                snippets.append(f"[W{i+1}] {h['title']}\n{text}\n(Source: {h['url']})")
-            except Exception:
+                resp = fut.result()
+            except Exception as e:
+                # one failed batch does not sink the rest of the job
+                yield {"index": i, "question": queries[i], "error": f"{type(e).__name__}: {e}"}
                 continue
-        web_txt = "\n\n".join(snippets)
+            answer_cache.put(queries[i], resp, params, lookup(i))
+            yield {"index": i, "question": queries[i], "answer": resp}
+
+
+class _StopOnEvent(StoppingCriteria):
+    # lets the consumer abort generation, e.g. when the HTTP client disconnects
+    def __init__(self, event: threading.Event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return self.event.is_set()
+
+@torch.inference_mode()
+def _generate_in_thread(streamer, **kwargs):
+    try:
+        _count_generated(_generate(streamer=streamer, **kwargs), kwargs["input_ids"].shape[1])
+    except Exception:
+        streamer.failed = True  # the partial text must not end up in the answer cache
+        streamer.end()  # unblock the consumer instead of leaving it waiting forever
+        raise
+
+def stream_answer(query: str, use_web: bool = True, k: int = 4) -> Iterator[Dict]:
+    """
+    Yields {"token": text} pieces as the model produces them, then a final
+    {"done": True, "ttft_ms": ..., "total_ms": ..., "pieces": ...} event.
+    ttft_ms is measured from the start of the request (retrieval + web + prefill).
+    An answer-cache hit is sent as a single piece and the done event carries "cached": True.
+    """
+    t0 = time.perf_counter()
+    params, vec = ("stream", use_web, k), _query_vec(query)
+    cached = answer_cache.get(query, params, vec)
+    if cached is not None:
+        ms = round((time.perf_counter() - t0) * 1000, 1)
+        yield {"token": cached}
+        yield {"done": True, "ttft_ms": ms, "total_ms": ms, "pieces": 1, "cached": True}
+        return
+
+    prompt = build_prompt(query, use_web=use_web, k=k)
+
+    stop = threading.Event()
+    streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+    gen_kwargs = dict(
+        **prompt_inputs([prompt]),
+        max_length=1024,
+        temperature=0.7,
+        top_p=0.9,
+        do_sample=True,
+        pad_token_id=tokenizer.eos_token_id,
+        stopping_criteria=StoppingCriteriaList([_StopOnEvent(stop)]),
+    )
+    worker = threading.Thread(target=_generate_in_thread, args=(streamer,), kwargs=gen_kwargs, daemon=True)
+    worker.start()
+
+    ttft, pieces, text = None, 0, []
+    with stage("generate"):
+        try:
+            for piece in streamer:
+                if not piece:
+                    continue
+                if ttft is None:
+                    ttft = time.perf_counter() - t0
+                pieces += 1
+                text.append(piece)
+                yield {"token": piece}
+        finally:
+            stop.set()
+            worker.join()
+    # only reached when the client read the whole stream
+    if text and not getattr(streamer, "failed", False):
+        answer_cache.put(query, "".join(text), params, vec)
+
+    total = time.perf_counter() - t0
+    yield {
+        "done": True,
+        "ttft_ms": round((ttft if ttft is not None else total) * 1000, 1),
+        "total_ms": round(total * 1000, 1),
+        "pieces": pieces,
+    }
+
+
+def _load_generator():
+    # the optimized artifact from scripts/optimize_model.py (LoRA merged, int8) if built, else base + LoRA if present
+    if USE_OPTIMIZED and read_config(OPTIMIZED_DIR) is not None:
+        tok = AutoTokenizer.from_pretrained(OPTIMIZED_DIR)
+        mdl = load_optimized(OPTIMIZED_DIR)
+    else:
+        tok = AutoTokenizer.from_pretrained(LORA_DIR if os.path.exists(LORA_DIR) else BASE_MODEL)
+        mdl = AutoModelForCausalLM.from_pretrained(
+            LORA_DIR if os.path.exists(LORA_DIR) else BASE_MODEL,
+            device_map="auto"
+        )
+    if tok.pad_token is None:
+        tok.pad_token = tok.eos_token
+    tok.padding_side = "left"  # decoder-only: pad on the left so every row ends at the prompt
+    return tok, mdl.eval()
+
+def _build_prefix_cache():
+    # KV of the instruction header (everything before the question) is computed once and reused by
+    # every generate(); rendering with two different questions yields the header as tokenized in context
+    cache = PrefixCache(model, maxsize=PREFIX_CACHE_SIZE)
+    if PREFIX_CACHE_SIZE > 0:
+        cache.add(common_prefix(tokenizer, [PROMPT.format(question=q, context="", web="") for q in ("a", "b")]))
+    return cache
+
+def _timed(component: str, fn, *args, **kwargs):
+    global _loading
+    _loading = component
+    t0 = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        load_times[component] = round(time.perf_counter() - t0, 3)
+        _loading = None
+
+@torch.inference_mode()
+def warmup():
+    # first calls pay for lazy init (kernels, allocator, mmapped index pages); do it before serving
+    store.search("What is DNS?", k=1, mode=RETRIEVAL_MODE)
+    _generate(**prompt_inputs([PROMPT.format(question="What is DNS?", context="", web="(none)")]),
+              max_new_tokens=4, do_sample=False, pad_token_id=tokenizer.eos_token_id)
+
+def load():
+    """Load generator, draft model, embedder and index, then warm up. Idempotent and thread-safe."""
+    global tokenizer, model, draft, speculative, embeddings, query_embeddings, store, prefix_cache, packer
+    with _load_lock:
+        if _ready.is_set():
+            return
+        tokenizer, model = _timed("generator", _load_generator)
+        # draft model for single-prompt generations (assisted decoding does not batch)
+        draft = _timed("draft", load_draft, DRAFT_MODEL, model) if DRAFT_MODEL else None
+        speculative = (SpeculativeDecoder(model, draft, draft_tokens=DRAFT_TOKENS, min_acceptance=SPEC_MIN_ACCEPTANCE)
+                       if draft is not None else None)
+
+        embeddings = _timed("embedder", HuggingFaceEmbeddings, model_name=EMBED_MODEL)
+        # index.faiss of the published snapshot version is memory-mapped and chunk text is read from
+        # chunks.sqlite on demand, so startup time and per-worker RAM do not grow with the corpus
+        version = upgrade_current(DB_DIR)
+        db = _timed("index", load_store, version_dir(DB_DIR, version), embeddings)
+        tune_index(db.index, nprobe=FAISS_NPROBE, ef_search=FAISS_EF_SEARCH)
+        # live view over db: replays the delta log and takes in-process ingests (see ingest_new.ingest);
+        # query embeddings go through an LRU so a repeated question is encoded once
+        query_embeddings = CachedEmbeddings(embeddings, maxsize=EMBED_CACHE_SIZE)
+        store = _timed("delta_replay", LiveIndex, db, query_embeddings, DB_DIR,
+                       compact_every=DELTA_COMPACT_EVERY, version=version)
+        store.on_reload(lambda new_db: tune_index(new_db.index, nprobe=FAISS_NPROBE, ef_search=FAISS_EF_SEARCH))
+        store.on_change(invalidate_caches)
+        # versions published by other workers / build_vector_db are swapped in without touching the models
+        store.watch(SNAPSHOT_POLL_S)
+
+        prefix_cache = _timed("prefix_kv", _build_prefix_cache)
+        packer = ContextPacker(tokenizer, PROMPT, budget=PROMPT_TOKEN_BUDGET, max_item_tokens=CONTEXT_ITEM_TOKENS)
+        _timed("warmup", warmup)
+        _ready.set()
+        print(f"Agent ready in {sum(load_times.values()):.1f}s: {load_times}")
+
+def load_in_background() -> threading.Thread:
+    def run():
+        global load_error
+        try:
+            load()
+        except Exception as e:
+            load_error = f"{type(e).__name__} while loading {_loading or 'agent'}: {e}"
+            traceback.print_exc()
+    thread = threading.Thread(target=run, name="agent-loader", daemon=True)
+    thread.start()
+    return thread
+
+def is_ready() -> bool:
+    return _ready.is_set()
 
-    prompt = PROMPT.format(question=query, context=context, web=web_txt or "(none)")
-    return generate_answer(prompt)
+def readiness() -> Dict:
+    return {"ready": _ready.is_set(), "loading": _loading, "error": load_error, "load_times": dict(load_times)}
 
 if __name__ == "__main__":
+    load()
     print(answer("Summarize key ideas from lecture series on network and dnodal", use_web=True))
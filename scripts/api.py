@@ -1,17 +1,61 @@
-import os
-from fastapi import FastAPI, UploadFile, File, Form
+import os, json, time, asyncio, threading
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+from typing import List
+from starlette.background import BackgroundTask
 from dotenv import load_dotenv
-from scripts.agent import answer, db, embeddings
+from scripts import agent
+from scripts.agent import answer, answer_batch, stream_answer, cache_stats, generation_stats
 from utils.loader import load_any
 from langchain_community.vectorstores import FAISS
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from scripts.ingest_new import ingest
+from utils.workers import BoundedPool, PoolSaturated
+from utils import metrics
+from utils.profiler import profiler
 
 load_dotenv()
 PORT = int(os.getenv("PORT", "8000"))
+LOADING_RETRY_AFTER = int(os.getenv("LOADING_RETRY_AFTER", "10"))
+ASK_BATCH_MAX = int(os.getenv("ASK_BATCH_MAX", "500"))  # questions per /ask_batch request
 
-app = FastAPI(title="Lecture RAG Agent")
+# Separate pools so a long PDF ingest never starves question answering (and vice versa).
+# INFER_WORKERS should be >= BATCH_MAX_SIZE, otherwise batches can never fill up.
+inference_pool = BoundedPool(
+    "inference",
+    max_workers=int(os.getenv("INFER_WORKERS", "8")),
+    max_queue=int(os.getenv("INFER_QUEUE", "32")),
+    timeout=float(os.getenv("INFER_TIMEOUT", "120")),
+    retry_after=int(os.getenv("INFER_RETRY_AFTER", "5")),
+)
+ingest_pool = BoundedPool(
+    "ingest",
+    max_workers=int(os.getenv("INGEST_WORKERS", "1")),
+    max_queue=int(os.getenv("INGEST_QUEUE", "4")),
+    timeout=float(os.getenv("INGEST_TIMEOUT", "600")),
+    retry_after=int(os.getenv("INGEST_RETRY_AFTER", "30")),
+)
+
+REQUEST_SECONDS = metrics.Histogram("rag_http_request_seconds", "HTTP request latency by route and status")
+
+@metrics.collector
+def _pool_metrics():
+    pools = (inference_pool, ingest_pool)
+    return [("rag_pool_inflight", "gauge", "Tasks running or queued per worker pool",
+             [({"pool": p.name}, p.stats()["inflight"]) for p in pools])]
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # bind right away and load models/index in the background; /ready reports progress
+    agent.load_in_background()
+    yield
+    inference_pool.shutdown()
+    ingest_pool.shutdown()
+
+app = FastAPI(title="Lecture RAG Agent", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -19,13 +63,133 @@ app.add_middleware(
     allow_methods=["*"], allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    t0 = time.perf_counter()
+    response = await call_next(request)
+    # route template rather than raw path, so label values stay bounded
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    REQUEST_SECONDS.observe(time.perf_counter() - t0, route=route, status=response.status_code)
+    return response
+
+@app.exception_handler(PoolSaturated)
+async def pool_saturated(request: Request, exc: PoolSaturated):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+async def run_on(pool: BoundedPool, fn, *args, **kwargs):
+    try:
+        return await pool.run(fn, *args, **kwargs)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=f"{pool.name} timed out after {pool.timeout:.0f}s")
+
+def require_ready():
+    if not agent.is_ready():
+        state = agent.readiness()
+        detail = f"model failed to load: {state['error']}" if state["error"] else "model is loading"
+        raise HTTPException(status_code=503, detail=detail, headers={"Retry-After": str(LOADING_RETRY_AFTER)})
+
+@app.get("/health")
+async def health():
+    # liveness: answers as soon as the process is up, whether or not the models are loaded
+    return {"status": "ok", "inference": inference_pool.stats(), "ingest": ingest_pool.stats(),
+            **generation_stats()}
+
+@app.get("/ready")
+async def ready():
+    # readiness: 200 once models and index are loaded and warmed up; includes per-component load times
+    state = agent.readiness()
+    return JSONResponse(status_code=200 if state["ready"] else 503, content=state)
+
+@app.get("/cache_stats")
+async def cache_stats_endpoint():
+    # hit/miss counters of the embedding, retrieval and answer caches
+    return cache_stats()
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    # Prometheus text format: stage latency histograms, token/chunk counts, cache and web outcomes
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+def answer_traced(q: str, use_web: bool):
+    with metrics.trace() as timings:
+        resp = answer(q, use_web=use_web)
+    return resp, timings
+
 @app.post("/ask")
-async def ask(q: str = Form(...), use_web: bool = Form(True)):
-    resp = answer(q, use_web=use_web)
+async def ask(q: str = Form(...), use_web: bool = Form(True), timings: bool = Form(False)):
+    require_ready()
+    # runs on the inference pool so the event loop stays free and concurrent requests can meet in the batch scheduler
+    if timings:
+        # per-stage milliseconds for this request (retrieve, web_search, pack, generate, total)
+        resp, breakdown = await run_on(inference_pool, answer_traced, q, use_web)
+        return {"answer": resp, "timings": breakdown}
+    resp = await run_on(inference_pool, answer, q, use_web=use_web)
     return {"answer": resp}
 
+@app.post("/ask_stream")
+async def ask_stream(q: str = Form(...), use_web: bool = Form(True)):
+    # Server-sent events: one "data:" line per token piece, last event carries ttft_ms/total_ms
+    require_ready()
+    release = inference_pool.reserve()  # admission control: the stream holds an inference slot until it ends
+
+    def events():
+        try:
+            for ev in stream_answer(q, use_web=use_web):
+                yield f"data: {json.dumps(ev)}\n\n"
+        finally:
+            release()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(release),
+    )
+
+class AskBatch(BaseModel):
+    questions: List[str]
+    use_web: bool = True
+
+@app.post("/ask_batch")
+async def ask_batch(body: AskBatch):
+    # JSON lines {"index", "question", "answer"|"error"} in completion order, not request order
+    require_ready()
+    if len(body.questions) > ASK_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"at most {ASK_BATCH_MAX} questions per request")
+    loop = asyncio.get_running_loop()
+    lines: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+
+    def produce():
+        # the whole job runs on the inference pool and holds one slot; generation goes through the scheduler
+        try:
+            for item in answer_batch(body.questions, use_web=body.use_web):
+                loop.call_soon_threadsafe(lines.put_nowait, json.dumps(item) + "\n")
+                if stop.is_set():
+                    break  # client went away
+        except Exception as e:
+            loop.call_soon_threadsafe(lines.put_nowait, json.dumps({"error": f"{type(e).__name__}: {e}"}) + "\n")
+        finally:
+            loop.call_soon_threadsafe(lines.put_nowait, None)
+
+    inference_pool.submit(produce)  # PoolSaturated (503) before the response starts
+
+    async def stream():
+        try:
+            while (line := await lines.get()) is not None:
+                yield line
+        finally:
+            stop.set()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
+
 @app.post("/add")
 async def add(file: UploadFile = File(...)):
+    require_ready()
     # Save uploaded file temporarily so ingest() can process it
     temp_path = os.path.join("uploads", file.filename)
     os.makedirs("uploads", exist_ok=True)
@@ -33,9 +197,28 @@ async def add(file: UploadFile = File(...)):
     with open(temp_path, "wb") as f:
         f.write(await file.read())
 
-    # Call the existing ingest() function
-    ingest(temp_path)
+    # Ingest into the live index on the ingest pool; chunks are searchable as soon as this returns
+    n_chunks = await run_on(ingest_pool, ingest, temp_path, store=agent.store)
+
+    return {"status": "ok", "file": file.filename, "chunks": n_chunks}
+
+@app.post("/profiler/start")
+async def profiler_start(interval_ms: float = Form(10)):
+    # wall-clock stack sampling of every thread in this worker until /profiler/stop
+    if not profiler.start(interval_ms):
+        raise HTTPException(status_code=409, detail="profiler is already running")
+    return profiler.report(top=0)
+
+@app.post("/profiler/stop")
+async def profiler_stop(top: int = Form(20)):
+    await asyncio.to_thread(profiler.stop)
+    return profiler.report(top=top)
 
-    return {"status": "ok", "file": file.filename}
+@app.get("/profiler")
+async def profiler_profile(format: str = "json", top: int = 20):
+    # format=collapsed gives "stack count" lines for flamegraph.pl / speedscope
+    if format == "collapsed":
+        return PlainTextResponse(profiler.collapsed())
+    return profiler.report(top=top)
 
 # Run: uvicorn scripts.api:app --reload --port 8000
@@ -0,0 +1,55 @@
+"""
+Compare PDF extraction backends: pages/sec and how close the extracted text is.
+
+    python scripts/bench_extract.py [file.pdf ...]      (defaults to every PDF in data/lectures)
+"""
+import sys, time, difflib
+from utils.loader import collect_files, load_pdf_pymupdf, load_pdf_unstructured
+
+DATA_DIR = "data/lectures"
+
+
+def page_count(path: str) -> int:
+    import pymupdf
+    with pymupdf.open(path) as doc:
+        return doc.page_count
+
+def words(text: str):
+    return text.lower().split()
+
+def similarity(a: str, b: str) -> float:
+    # word-level similarity; layout (line breaks, element order) differs between backends
+    return difflib.SequenceMatcher(None, words(a), words(b), autojunk=False).ratio()
+
+def timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, time.perf_counter() - t0
+
+
+def main(paths):
+    backends = {
+        "pymupdf(1 proc)": lambda p: load_pdf_pymupdf(p, workers=1),
+        "pymupdf(pages)": lambda p: load_pdf_pymupdf(p),
+        "unstructured": load_pdf_unstructured,
+    }
+    totals = {name: [0, 0.0] for name in backends}
+    print(f"{'file':40} {'pages':>5} " + " ".join(f"{n:>16}" for n in backends) + f" {'similarity':>10}")
+    for fp in paths:
+        n = page_count(fp)
+        texts, cells = {}, []
+        for name, fn in backends.items():
+            texts[name], secs = timed(fn, fp)
+            totals[name][0] += n
+            totals[name][1] += secs
+            cells.append(f"{n / secs:11.1f} p/s")
+        sim = similarity(texts["pymupdf(pages)"], texts["unstructured"])
+        print(f"{fp[-40:]:40} {n:5d} " + " ".join(f"{c:>16}" for c in cells) + f" {sim:10.3f}")
+
+    print("\nOverall pages/sec:")
+    for name, (pages, secs) in totals.items():
+        print(f"  {name:16} {pages / secs if secs else 0:8.1f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or [p for p in collect_files(DATA_DIR) if p.lower().endswith(".pdf")])
@@ -0,0 +1,161 @@
+import os, random, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+# Offline stand-ins for scripts/bench_suite.py: a synthetic lecture corpus, tiny randomly
+# initialised models built from a tokenizer trained on that corpus, and a fake search engine.
+# Nothing here touches the network, so the suite measures this code and not the hub or DuckDuckGo.
+
+TOPICS = {
+    "dns": ["resolver", "root server", "TLD server", "authoritative server", "A record", "MX record",
+            "CNAME", "TTL", "zone file", "recursive query", "iterative query", "cache"],
+    "tcp": ["handshake", "sequence number", "acknowledgement", "congestion window", "slow start",
+            "retransmission", "flow control", "segment", "socket", "port", "timeout", "RTT"],
+    "routing": ["router", "forwarding table", "link-state", "distance vector", "OSPF", "BGP",
+                "autonomous system", "subnet", "prefix", "hop", "Dijkstra", "next hop"],
+    "nodal": ["node voltage", "Kirchhoff's current law", "conductance matrix", "reference node",
+              "supernode", "branch current", "mesh", "resistor", "current source", "admittance"],
+}
+TEMPLATES = [
+    "The {a} passes the {b} to the {c} before the {d} expires.",
+    "When the {a} changes, the {b} is recomputed from the {c}.",
+    "A {a} never depends on the {b}, but the {c} always limits the {d}.",
+    "In the exam, explain how the {a} relates to the {b} and give one example with the {c}.",
+    "Each {a} keeps its own {b}, so a failed {c} only affects the {d} behind it.",
+]
+
+
+def lecture_text(rng: random.Random, topic: str, words: int) -> str:
+    terms, out, n = TOPICS[topic], [], 0
+    while n < words:
+        s = rng.choice(TEMPLATES).format(**{k: rng.choice(terms) for k in "abcd"})
+        out.append(s)
+        n += len(s.split())
+    return " ".join(out)
+
+def synthetic_corpus(out_dir: str, n_pdfs: int = 6, pages: int = 8, n_txt: int = 6,
+                     words_per_page: int = 250, seed: int = 0) -> List[str]:
+    """Writes lecture decks (text-layer PDFs) and notes (.txt) to out_dir; returns their paths."""
+    import pymupdf
+    rng = random.Random(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    paths, topics = [], sorted(TOPICS)
+    for i in range(n_pdfs):
+        path = os.path.join(out_dir, f"deck_{i:02d}.pdf")
+        with pymupdf.open() as doc:
+            for _ in range(pages):
+                page = doc.new_page()
+                page.insert_textbox(page.rect + (40, 40, -40, -40),
+                                    lecture_text(rng, topics[i % len(topics)], words_per_page), fontsize=8)
+            doc.save(path)
+        paths.append(path)
+    for i in range(n_txt):
+        path = os.path.join(out_dir, f"notes_{i:02d}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(lecture_text(rng, topics[i % len(topics)], words_per_page * pages))
+        paths.append(path)
+    return paths
+
+
+def _train_tokenizer(texts: List[str], vocab_size: int):
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+    from transformers import PreTrainedTokenizerFast
+    tok = Tokenizer(models.BPE())
+    tok.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tok.decoder = decoders.ByteLevel()
+    trainer = trainers.BpeTrainer(vocab_size=vocab_size, special_tokens=["<|endoftext|>", "<pad>"],
+                                  initial_alphabet=pre_tokenizers.ByteLevel.alphabet())
+    tok.train_from_iterator(texts, trainer)
+    return PreTrainedTokenizerFast(tokenizer_object=tok, eos_token="<|endoftext|>", bos_token="<|endoftext|>",
+                                   unk_token="<|endoftext|>", model_input_names=["input_ids", "attention_mask"])
+
+def tiny_models(out_dir: str, texts: List[str], vocab_size: int = 2000, seed: int = 0):
+    """
+    (generator_dir, embedder_dir): a 2-layer GPT-2 with the full 1024-token context the agent
+    relies on, and a 2-layer BERT wrapped as a mean-pooling sentence-transformers model. Weights are
+    random (answers and rankings are noise); shapes and code paths match the real models.
+    """
+    import torch
+    from transformers import BertConfig, BertModel, GPT2Config, GPT2LMHeadModel
+    from sentence_transformers import SentenceTransformer, models
+    gen_dir, emb_dir = os.path.join(out_dir, "tiny-gpt2"), os.path.join(out_dir, "tiny-embedder")
+    if os.path.exists(os.path.join(gen_dir, "config.json")) and os.path.exists(os.path.join(emb_dir, "modules.json")):
+        return gen_dir, emb_dir
+
+    torch.manual_seed(seed)
+    tokenizer = _train_tokenizer(texts, vocab_size)
+    eos = tokenizer.eos_token_id
+    gpt = GPT2LMHeadModel(GPT2Config(vocab_size=len(tokenizer), n_positions=1024, n_embd=64, n_layer=2, n_head=2,
+                                     bos_token_id=eos, eos_token_id=eos))
+    gpt.save_pretrained(gen_dir)
+    tokenizer.save_pretrained(gen_dir)
+
+    bert_dir = os.path.join(out_dir, "tiny-bert")
+    BertModel(BertConfig(vocab_size=len(tokenizer), hidden_size=64, num_hidden_layers=2, num_attention_heads=2,
+                         intermediate_size=128, max_position_embeddings=512)).save_pretrained(bert_dir)
+    tokenizer.pad_token = "<pad>"
+    tokenizer.model_max_length = 512
+    tokenizer.save_pretrained(bert_dir)
+    encoder = models.Transformer(bert_dir, max_seq_length=256)
+    pooling = models.Pooling(encoder.get_word_embedding_dimension(), pooling_mode="mean")
+    SentenceTransformer(modules=[encoder, pooling], device="cpu").save(emb_dir)
+    return gen_dir, emb_dir
+
+
+class StubWeb:
+    """
+    Fake search engine on localhost: POST /html/ answers in DuckDuckGo's HTML result format with
+    `n_results` links to GET /page/<n>, which serves a short article. Every response waits
+    `latency_ms` to stand in for the network. Point DDG_URL at `search_url`.
+    """
+
+    def __init__(self, n_results: int = 3, latency_ms: float = 30, seed: int = 0):
+        rng = random.Random(seed)
+        self.articles = [lecture_text(rng, t, 300) for t in sorted(TOPICS) for _ in range(3)]
+        self.n_results = n_results
+        self.latency = latency_ms / 1000
+        self.hits = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like a real server behind the pooled session
+
+            def _send(self, body: str):
+                time.sleep(stub.latency)
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                stub.hits += 1
+                base = f"http://{self.headers['Host']}"
+                start = stub.hits % len(stub.articles)
+                links = "".join(f'<a class="result__a" href="{base}/page/{(start + i) % len(stub.articles)}">'
+                                f"Result {i}</a>" for i in range(stub.n_results))
+                self._send(f"<html><body>{links}</body></html>")
+
+            def do_GET(self):
+                n = int(self.path.rsplit("/", 1)[-1]) % len(stub.articles)
+                paras = "".join(f"<p>{s}.</p>" for s in stub.articles[n].split(". "))
+                self._send(f"<html><head><title>Article {n}</title></head><body><nav>menu</nav>"
+                           f"<article><h1>Article {n}</h1>{paras}</article></body></html>")
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.search_url = f"http://127.0.0.1:{self.server.server_address[1]}/html/"
+        self._thread = threading.Thread(target=self.server.serve_forever, name="stub-web", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,56 @@
+"""
+Prefill time per request with and without the PROMPT-preamble KV cache, on CPU.
+
+    python scripts/bench_prefix_cache.py [repeats]
+
+Prompts are built from the real template with filler context of a few sizes; times are the
+median of `repeats` forward passes over the prompt (the prefill that precedes the first token).
+"""
+import os, sys, time, statistics
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "")  # measure on CPU
+
+import torch
+from scripts import agent
+from scripts.agent import PROMPT, PROMPT_TOKEN_BUDGET
+from utils.prefix_cache import PrefixCache, common_prefix
+
+FILLER = "The resolver asks the root servers, then the TLD servers, then the authoritative server. "
+
+
+def median_ms(fn, repeats: int) -> float:
+    fn()  # warm-up
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(times)
+
+
+@torch.inference_mode()
+def main(repeats: int = 10):
+    agent.load()
+    model, tokenizer = agent.model, agent.tokenizer
+    cache = PrefixCache(model)
+    prefix = common_prefix(tokenizer, [PROMPT.format(question=q, context="", web="") for q in ("a", "b")])
+    cache.add(prefix)
+    print(f"preamble: {len(prefix)} tokens, device {model.device}")
+    print(f"{'prompt tokens':>13} {'full ms':>9} {'cached ms':>9} {'saved ms':>9} {'saved %':>8}")
+    for n_filler in (0, 10, 40, 80):
+        prompt = PROMPT.format(question="How does DNS resolve a name?", context=FILLER * n_filler, web="(none)")
+        ids = tokenizer(prompt, truncation=True, max_length=PROMPT_TOKEN_BUDGET)["input_ids"]
+        full = torch.tensor([ids], device=model.device)
+        kwargs = cache.prepare([ids], pad_id=tokenizer.pad_token_id)
+        rest = kwargs["input_ids"][:, len(prefix):]
+
+        full_ms = median_ms(lambda: model(full, use_cache=True), repeats)
+        # a fresh copy of the prefix KV per call, as in generate()
+        cached_ms = median_ms(lambda: model(rest, attention_mask=kwargs["attention_mask"], use_cache=True,
+                                            past_key_values=cache.prepare([ids], pad_id=tokenizer.pad_token_id)["past_key_values"]),
+                              repeats)
+        print(f"{len(ids):>13} {full_ms:9.1f} {cached_ms:9.1f} {full_ms - cached_ms:9.1f} "
+              f"{100 * (full_ms - cached_ms) / full_ms:7.1f}%")
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:2]])
@@ -0,0 +1,55 @@
+"""
+Compare dense, BM25 and hybrid retrieval over storage/faiss: latency and hit rate.
+
+Queries are spans cut from random chunks (the chunk they came from is the expected hit),
+so this measures how well each mode finds a known passage, not answer quality.
+
+    python scripts/bench_retrieval.py [n_queries] [k]
+"""
+import os, sys, time, random
+import numpy as np
+from langchain_huggingface import HuggingFaceEmbeddings
+from utils.chunk_store import load_store
+from utils.snapshots import version_dir
+from utils.live_index import LiveIndex, upgrade_current
+
+EMBED_MODEL = os.getenv("EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+DB_DIR = "storage/faiss"
+MODES = ("dense", "bm25", "hybrid")
+
+
+def make_queries(store: LiveIndex, n: int, words: int = 12, seed: int = 0):
+    rng = random.Random(seed)
+    mapping = store.db.index_to_docstore_id
+    queries = []
+    for pos in rng.sample(range(len(store)), min(n, len(store))):
+        chunk_id = mapping[pos]
+        toks = store.db.docstore.search(chunk_id).page_content.split()
+        if len(toks) < words:
+            continue
+        start = rng.randrange(len(toks) - words + 1)
+        queries.append((" ".join(toks[start:start + words]), chunk_id))
+    return queries
+
+
+def main(n_queries: int = 200, k: int = 4):
+    embeddings = HuggingFaceEmbeddings(model_name=EMBED_MODEL)
+    version = upgrade_current(DB_DIR)
+    store = LiveIndex(load_store(version_dir(DB_DIR, version), embeddings), embeddings, DB_DIR, version=version)
+    queries = make_queries(store, n_queries)
+    print(f"{len(queries)} queries over {len(store)} chunks, k={k}")
+    print(f"{'mode':8} {'hit@k':>6} {'p50 ms':>8} {'p95 ms':>8}")
+    for mode in MODES:
+        hits, times = 0, []
+        for q, expected in queries:
+            t0 = time.perf_counter()
+            docs = store.search(q, k=k, mode=mode)
+            times.append((time.perf_counter() - t0) * 1000)
+            hits += any(d.id == expected for d in docs)
+        print(f"{mode:8} {hits / max(len(queries), 1):6.3f} "
+              f"{np.percentile(times, 50):8.2f} {np.percentile(times, 95):8.2f}")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    main(*args)
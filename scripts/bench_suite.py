@@ -0,0 +1,296 @@
+"""
+Offline end-to-end performance suite: extraction, chunking, embedding, index build, ingest,
+retrieval, generation, time-to-first-token and /ask latency under concurrent load.
+
+    python scripts/bench_suite.py [--quick] [--save-baseline]
+
+Runs in a scratch workspace (BENCH_DIR/workspace) on a synthetic lecture corpus with tiny local
+models and a stub search engine (scripts/bench_fixtures.py), so it needs no network and leaves
+data/ and storage/faiss alone. Absolute numbers are only comparable on the same machine: the
+first run (or --save-baseline) stores BENCH_DIR/baseline.json, later runs flag every gated metric
+that is more than its threshold (BENCH_THRESHOLD, default 20%) and its noise floor worse than it,
+and exit with status 1. Gated metrics are medians over BENCH_REPEATS runs, compared after
+factoring out how fast the machine itself is running today (a fixed calibration workload timed
+around every stage); numbers measured once (agent load, ingest) and tail percentiles are
+reported but never fail the run.
+"""
+import os, sys, io, json, time, random, shutil, platform, statistics, contextlib, threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)  # the workspace becomes the working directory below
+from scripts.bench_fixtures import TOPICS, StubWeb, lecture_text, synthetic_corpus, tiny_models
+
+BENCH_DIR = os.path.abspath(os.getenv("BENCH_DIR", os.path.join(ROOT, "storage", "bench")))
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+LAST_RUN_PATH = os.path.join(BENCH_DIR, "last_run.json")
+THRESHOLD = float(os.getenv("BENCH_THRESHOLD", "0.2"))
+GEN_TOKENS = 64
+ASK_CONCURRENCY = int(os.getenv("BENCH_ASK_CONCURRENCY", "8"))
+REPEATS = int(os.getenv("BENCH_REPEATS", "5"))  # runs per gated measurement; the median is kept
+
+# metric -> (higher is better, relative threshold or None = report only, noise floor). A change only
+# counts as a regression when it is beyond both the threshold and the floor (in the metric's unit),
+# so sub-second timings do not fail on scheduler jitter.
+METRICS = {
+    "extract_pages_per_sec": (True, THRESHOLD, 0),
+    "extract_files_per_sec": (True, THRESHOLD, 0),
+    "chunk_mb_per_sec": (True, THRESHOLD, 0),
+    "embed_chunks_per_sec": (True, THRESHOLD, 0),
+    "index_build_s": (False, THRESHOLD, 0.1),
+    "index_noop_s": (False, THRESHOLD, 0.05),
+    "agent_load_s": (False, None, 0),      # measured once
+    "retrieval_p50_ms": (False, THRESHOLD, 1),
+    "retrieval_p99_ms": (False, None, 0),  # one pass; p99 of a few dozen queries is the max
+    "ingest_ms": (False, None, 0),         # measured once
+    "gen_tokens_per_sec": (True, THRESHOLD, 0),
+    "ttft_p50_ms": (False, THRESHOLD, 10),
+    "ask_p50_ms": (False, THRESHOLD, 100),
+    "ask_p99_ms": (False, None, 0),
+    "ask_rps": (True, THRESHOLD, 0),
+    "calibration_ms": (False, None, 0),    # machine speed; scales the comparison of everything else
+}
+
+
+def timed(fn: Callable, *args, **kwargs):
+    t0 = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, time.perf_counter() - t0
+
+def median_of(fn: Callable, before: Callable = None):
+    """(result, seconds): the median time of REPEATS runs; `before` resets state outside the timing."""
+    result, times = None, []
+    for _ in range(REPEATS):
+        if before is not None:
+            before()
+        result, seconds = timed(fn)
+        times.append(seconds)
+    return result, statistics.median(times)
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+def questions(n: int) -> List[str]:
+    terms = [t for ts in TOPICS.values() for t in ts]
+    return [f"How does the {terms[i % len(terms)]} relate to the {terms[(7 * i + 3) % len(terms)]}? ({i})"
+            for i in range(n)]
+
+def quiet(fn: Callable, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+
+def calibrate() -> float:
+    """Median ms of a fixed mix of interpreter and BLAS work; tracks shared-host CPU speed drift."""
+    import torch
+    a = torch.randn(192, 192, generator=torch.Generator().manual_seed(0))
+    words = lecture_text(random.Random(0), "tcp", 20000).split()
+
+    def work():
+        for _ in range(20):
+            a @ a
+        json.loads(json.dumps(sorted(words)))
+        sum(len(w) for w in words)
+    work()
+    return statistics.median(timed(work)[1] for _ in range(REPEATS)) * 1000
+
+
+def setup(quick: bool, stub: StubWeb) -> List[str]:
+    """Fresh workspace with the corpus in data/lectures; env points every module at the fixtures."""
+    ws = os.path.join(BENCH_DIR, "workspace")
+    shutil.rmtree(ws, ignore_errors=True)
+    files = synthetic_corpus(os.path.join(ws, "data", "lectures"), n_pdfs=3 if quick else 8,
+                             n_txt=3 if quick else 8, pages=6 if quick else 12)
+    corpus = [lecture_text(random.Random(i), t, 400) for i, t in enumerate(sorted(TOPICS) * 5)]
+    gen_dir, emb_dir = tiny_models(os.path.join(BENCH_DIR, "models"), corpus)
+    os.environ.update({
+        "BASE_MODEL": gen_dir, "EMBED_MODEL": emb_dir, "DDG_URL": stub.search_url,
+        "HF_HUB_OFFLINE": "1", "TRANSFORMERS_OFFLINE": "1",
+        "PARSE_CACHE_DIR": os.path.join(ws, "storage", "parse_cache"),
+        "USE_OPTIMIZED": "0", "DRAFT_MODEL": "",
+        # measure the uncached paths; cache hit rates depend on traffic, not on the code under test
+        "WEB_CACHE_TTL": "0", "EMBED_CACHE_SIZE": "0", "RETRIEVAL_CACHE_SIZE": "0", "ANSWER_CACHE_TTL": "0",
+    })
+    os.chdir(ws)
+    return files
+
+
+def bench_extract(files: List[str]) -> Dict:
+    import pymupdf
+    from utils.loader import load_many, load_pdf_pymupdf
+    pdfs = [f for f in files if f.endswith(".pdf")]
+    pages = 0
+    for p in pdfs:
+        with pymupdf.open(p) as doc:
+            pages += doc.page_count
+    _, pdf_s = median_of(lambda: [load_pdf_pymupdf(p) for p in pdfs])
+    # the ingest path: parallel workers writing the (cold) parse cache
+    texts, many_s = median_of(lambda: [t for _, t in load_many(files)],
+                              before=lambda: shutil.rmtree(os.environ["PARSE_CACHE_DIR"], ignore_errors=True))
+    return {"extract_pages_per_sec": pages / pdf_s, "extract_files_per_sec": len(files) / many_s,
+            "texts": texts}
+
+def bench_chunk_embed(texts: List[str]) -> Dict:
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    from scripts.build_vector_db import CHUNK_OVERLAP, CHUNK_SIZE, EMBED_BATCH_SIZE, EMBED_MODEL
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    chunks, chunk_s = median_of(lambda: [c for t in texts for c in splitter.split_text(t)])
+    embeddings = HuggingFaceEmbeddings(model_name=EMBED_MODEL)
+    embeddings.embed_documents(chunks[:EMBED_BATCH_SIZE])  # warm-up
+    _, embed_s = median_of(lambda: [embeddings.embed_documents(chunks[i:i + EMBED_BATCH_SIZE])
+                                  for i in range(0, len(chunks), EMBED_BATCH_SIZE)])
+    mb = sum(len(t.encode("utf-8")) for t in texts) / 1e6
+    return {"chunk_mb_per_sec": mb / chunk_s, "embed_chunks_per_sec": len(chunks) / embed_s}
+
+def bench_index() -> Dict:
+    from scripts import build_vector_db
+    _, build_s = median_of(lambda: quiet(build_vector_db.main, full=True))
+    _, noop_s = median_of(lambda: quiet(build_vector_db.main))  # manifest check only, nothing changed
+    return {"index_build_s": build_s, "index_noop_s": noop_s}
+
+def bench_agent(n_queries: int, n_streams: int) -> Dict:
+    import torch
+    from scripts import agent
+    from scripts.ingest_new import ingest
+    _, load_s = timed(quiet, agent.load)
+
+    qs = questions(n_queries)
+    retrieval = [timed(agent.retrieve, q)[1] * 1000 for q in qs]
+
+    path = os.path.join("data", "uploads", "new_notes.txt")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(lecture_text(random.Random(99), "dns", 2000))
+    _, ingest_s = timed(quiet, ingest, path, store=agent.store)
+
+    inputs = agent.prompt_inputs([agent.build_prompt(qs[0], use_web=False)])
+    with torch.inference_mode():
+        gen = [timed(agent.model.generate, **inputs, max_new_tokens=GEN_TOKENS, min_new_tokens=GEN_TOKENS,
+                     do_sample=False, pad_token_id=agent.tokenizer.eos_token_id)[1] for _ in range(REPEATS)]
+    ttft = [list(agent.stream_answer(q, use_web=False))[-1]["ttft_ms"] for q in qs[:n_streams]]
+    return {
+        "agent_load_s": load_s,
+        "retrieval_p50_ms": percentile(retrieval, 0.5), "retrieval_p99_ms": percentile(retrieval, 0.99),
+        "ingest_ms": ingest_s * 1000,
+        "gen_tokens_per_sec": GEN_TOKENS / statistics.median(gen),
+        "ttft_p50_ms": statistics.median(ttft),
+    }
+
+def bench_ask(n_requests: int) -> Dict:
+    """
+    /ask with web search (stub) through a real uvicorn server, ASK_CONCURRENCY clients at a time;
+    REPEATS rounds of n_requests, each metric is the median over the rounds.
+    """
+    import requests, uvicorn
+    from scripts import api
+    server = uvicorn.Server(uvicorn.Config(api.app, host="127.0.0.1", port=0, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="bench-api", daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    url = "http://127.0.0.1:{}".format(server.servers[0].sockets[0].getsockname()[1])
+    while requests.get(url + "/ready").status_code != 200:
+        time.sleep(0.2)
+
+    def ask(q):
+        t0 = time.perf_counter()
+        r = requests.post(url + "/ask", data={"q": q, "use_web": "true"}, timeout=300)
+        r.raise_for_status()
+        return (time.perf_counter() - t0) * 1000
+
+    rounds = []
+    try:
+        with ThreadPoolExecutor(max_workers=ASK_CONCURRENCY) as ex:
+            for _ in range(REPEATS):
+                lat, wall = timed(lambda: list(ex.map(ask, questions(n_requests))))
+                rounds.append({"ask_p50_ms": percentile(lat, 0.5), "ask_p99_ms": percentile(lat, 0.99),
+                               "ask_rps": n_requests / wall})
+    finally:
+        server.should_exit = True
+        thread.join()
+    return {k: statistics.median(r[k] for r in rounds) for k in rounds[0]}
+
+
+def compare(metrics: Dict, baseline: Dict) -> List[str]:
+    """Prints metric / baseline / change and returns the names of regressed metrics."""
+    regressions = []
+    # > 1 when this machine is slower than when the baseline was taken; times are divided by it and
+    # rates multiplied, so a busy host does not read as a code regression
+    slowdown = 1.0
+    if metrics.get("calibration_ms") and baseline.get("calibration_ms"):
+        slowdown = metrics["calibration_ms"] / baseline["calibration_ms"]
+        print(f"\nmachine speed vs baseline: {1 / slowdown:.2f}x (changes below are adjusted for it)")
+    print(f"\n{'metric':24} {'value':>12} {'baseline':>12} {'change':>8}")
+    for name, (higher, threshold, floor) in METRICS.items():
+        value, base = metrics.get(name), baseline.get(name)
+        if value is None:
+            continue
+        change, flag = "", "" if threshold is not None else "  (not gated)"
+        if base:
+            adjusted = value if threshold is None else value * slowdown if higher else value / slowdown
+            delta = (adjusted - base) / base
+            change = f"{delta:+.1%}"
+            worse = -delta if higher else delta
+            if threshold is not None and worse > threshold and abs(adjusted - base) > floor:
+                flag = "  REGRESSION"
+                regressions.append(name)
+        shown = f"{base:12.2f}" if base is not None else f"{'-':>12}"
+        print(f"{name:24} {value:12.2f} {shown} {change:>8}{flag}")
+    return regressions
+
+def machine() -> Dict:
+    import torch
+    return {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count(),
+            "torch_threads": torch.get_num_threads(), "torch": torch.__version__}
+
+def main(args: List[str]):
+    quick = "--quick" in args
+    metrics: Dict[str, float] = {}
+    with StubWeb() as stub:
+        files = setup(quick, stub)
+        texts = None
+        stages = [
+            ("extract", lambda: bench_extract(files)),
+            ("chunk + embed", lambda: bench_chunk_embed(texts)),
+            ("index build", bench_index),
+            ("agent", lambda: bench_agent(n_queries=50 if quick else 200, n_streams=10 if quick else 20)),
+            ("/ask under load", lambda: bench_ask(n_requests=ASK_CONCURRENCY * (2 if quick else 6))),
+        ]
+        calibration = []
+        for name, fn in stages:
+            calibration.append(calibrate())
+            out, seconds = timed(fn)
+            texts = out.pop("texts", texts)
+            metrics.update(out)
+            print(f"{name}: {seconds:.1f}s")
+        calibration.append(calibrate())
+        metrics["calibration_ms"] = statistics.median(calibration)
+    metrics = {k: round(v, 3) for k, v in metrics.items()}
+
+    run = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "quick": quick, "machine": machine(), "metrics": metrics}
+    with open(LAST_RUN_PATH, "w", encoding="utf-8") as f:
+        json.dump(run, f, indent=1)
+
+    baseline = None
+    if os.path.exists(BASELINE_PATH) and "--save-baseline" not in args:
+        with open(BASELINE_PATH, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("machine") != run["machine"] or baseline.get("quick") != quick:
+            print("Baseline was recorded on a different machine or mode; comparisons are indicative only.")
+    regressions = compare(metrics, baseline["metrics"] if baseline else {})
+    if baseline is None:
+        shutil.copyfile(LAST_RUN_PATH, BASELINE_PATH)
+        print(f"\nSaved baseline to {BASELINE_PATH}")
+    elif regressions:
+        print(f"\n{len(regressions)} metric(s) worse than the baseline beyond threshold and noise floor: "
+              f"{', '.join(regressions)}")
+        sys.exit(1)
+    else:
+        print(f"\nNo regressions beyond {THRESHOLD:.0%} (baseline from {baseline['time']}).")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,44 +1,266 @@
-import os
+import os, sys, copy, json, resource, hashlib
+import faiss
 from pathlib import Path
+from typing import Optional
 from dotenv import load_dotenv
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
 from langchain_community.embeddings import HuggingFaceEmbeddings
-from utils.loader import collect_files, load_any
+from utils.loader import collect_files, load_many, file_sha256
+from utils.live_index import drop_log_head, log_records, log_size, upgrade_current
+from utils.chunk_store import CHUNK_DB, BuildStore, iter_chunks
+from utils.snapshots import current_version, new_build_dir, publish, publish_lock, version_dir
+from utils.ann_index import FLAT_SIDECAR, build_index, index_type_of, read_index_mmap, recall_report, tune_index
 
 load_dotenv()
 EMBED_MODEL = os.getenv("EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
 
 DATA_DIR = "data/lectures"
-DB_DIR = "storage/faiss"
+DB_DIR = "storage/faiss"     # snapshot versions + delta log, see utils/snapshots.py
+MANIFEST = "manifest.json"   # per version, next to the index it describes
+CHECKPOINT = os.path.join(DB_DIR, ".checkpoint.sqlite")  # BuildStore of the running (or interrupted) build
+CHUNK_SIZE, CHUNK_OVERLAP = 900, 150
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+CHECKPOINT_EVERY = int(os.getenv("CHECKPOINT_EVERY", "5000"))  # chunks between checkpoints
+# Served index: flat (exact) | ivf_flat | ivf_pq | hnsw; see utils/ann_index.py
+INDEX_TYPE = os.getenv("INDEX_TYPE", "flat")
+IVF_NLIST = int(os.getenv("IVF_NLIST", "0")) or None
+PQ_M = int(os.getenv("PQ_M", "0")) or None
+HNSW_M = int(os.getenv("HNSW_M", "32"))
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "8"))
+FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))
+ANN_REPORT = "ann_report.json"
 
+# Anything that changes how a file turns into vectors (or how its chunks are named) invalidates the whole manifest
+BUILD_PARAMS = {"embed_model": EMBED_MODEL, "chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP,
+                "chunk_ids": "path+sha256"}
 
-def main():
-    # Step 1: Collect files and split into chunks
+
+def chunk_ids(path: str, sha256: str, n: int):
+    # path and content both go in: byte-identical copies of a deck are separate files with separate chunks
+    prefix = hashlib.sha1(f"{path}\0{sha256}".encode("utf-8")).hexdigest()[:16]
+    return [f"{prefix}-{i}" for i in range(n)]
+
+
+def load_manifest(db_dir: str) -> dict:
+    """manifest = {"params": BUILD_PARAMS, "files": {path: {"sha256": ..., "ids": [chunk ids]}}}"""
+    path = os.path.join(db_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {"params": BUILD_PARAMS, "files": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_manifest(manifest: dict, db_dir: str):
+    tmp = os.path.join(db_dir, MANIFEST + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp, os.path.join(db_dir, MANIFEST))
+
+
+class IndexWriter:
+    """Embeds chunks in fixed-size batches and writes each batch to the build store right away."""
+
+    def __init__(self, embeddings, store: BuildStore, batch_size: int = 64):
+        self.embeddings = embeddings
+        self.store = store
+        self.batch_size = batch_size
+        self.embedded = 0
+        self._texts, self._metas, self._ids = [], [], []
+
+    def add(self, texts, metadatas, ids):
+        self._texts.extend(texts)
+        self._metas.extend(metadatas)
+        self._ids.extend(ids)
+        while len(self._texts) >= self.batch_size:
+            self._add_batch(self.batch_size)
+
+    def flush(self):
+        if self._texts:
+            self._add_batch(len(self._texts))
+
+    def _add_batch(self, n):
+        texts, metas, ids = self._texts[:n], self._metas[:n], self._ids[:n]
+        del self._texts[:n], self._metas[:n], self._ids[:n]
+        self.store.add(ids, texts, metas, self.embeddings.embed_documents(texts))
+        self.embedded += n
+
+
+def load_checkpoint() -> Optional[dict]:
+    """Manifest of an interrupted build with the same BUILD_PARAMS, else None (and the checkpoint is dropped)."""
+    if not os.path.exists(CHECKPOINT):
+        return None
+    store = BuildStore(CHECKPOINT)
+    manifest = store.manifest()
+    store.close()
+    if manifest is None or manifest.get("params") != BUILD_PARAMS:
+        drop_checkpoint()
+        return None
+    return manifest
+
+def drop_checkpoint():
+    for suffix in ("", "-journal"):
+        if os.path.exists(CHECKPOINT + suffix):
+            os.remove(CHECKPOINT + suffix)
+
+
+def load_exact(db_dir: str):
+    """Exact flat vectors of a saved version (the sidecar when the served index is approximate), memory-mapped."""
+    index = read_index_mmap(os.path.join(db_dir, "index.faiss")).base
+    if index_type_of(index) == "flat":
+        return index
+    sidecar = os.path.join(db_dir, FLAT_SIDECAR)
+    if os.path.exists(sidecar):
+        flat = read_index_mmap(sidecar).base
+        if flat.ntotal == index.ntotal:
+            return flat
+    return None
+
+def uploads_of(db_dir: str, manifest: dict):
+    """(position, id, text, metadata) of a saved version's chunks that did not come from DATA_DIR (/add uploads)."""
+    if not os.path.exists(os.path.join(db_dir, CHUNK_DB)):
+        return
+    built = {i for f in manifest["files"].values() for i in f["ids"]}
+    data_dir = os.path.normpath(DATA_DIR) + os.sep
+    for row in iter_chunks(db_dir):
+        if row[1] not in built and not os.path.normpath(row[3].get("path", "")).startswith(data_dir):
+            yield row
+
+def write_ann_report(flat, index, out_dir: str):
+    rows = recall_report(flat, index, k=10)
+    print(f"recall@10 vs flat ({flat.ntotal} vectors):")
+    for r in rows:
+        label = r["index"] if r["param"] is None else f"{r['index']} {r['param']}={r['value']}"
+        print(f"  {label:24} recall {r['recall']:.3f}  {r['ms_per_query']:.3f} ms/query")
+    with open(os.path.join(out_dir, ANN_REPORT), "w", encoding="utf-8") as f:
+        json.dump(rows, f, indent=1)
+
+
+def main(full: bool = False):
+    upgrade_current(DB_DIR)  # an old-layout snapshot is republished before the build reads it
+    # one writer at a time: delta-log compaction in the servers skips while a build holds the lock
+    with publish_lock(DB_DIR):
+        build(full)
+
+def build(full: bool = False):
+    # Step 1: Initialize embedding model, resume an interrupted build if there is one
+    embeddings = HuggingFaceEmbeddings(model_name=EMBED_MODEL)
+    version = current_version(DB_DIR)
+    src = version_dir(DB_DIR, version)
+    folded = log_size(DB_DIR)  # uploads logged so far end up in this build; later ones stay in the log
+    if full:
+        drop_checkpoint()
+    manifest, base = load_checkpoint(), None
+    resumed = manifest is not None
+    if resumed:
+        print(f"Resuming from checkpoint with {len(manifest['files'])} files already indexed.")
+    src_manifest = load_manifest(src)
+    have_index = os.path.exists(os.path.join(src, "index.faiss"))
+    if not resumed:
+        manifest = copy.deepcopy(src_manifest)  # edited below; src_manifest still tells uploads apart
+        if full or not have_index or manifest.get("params") != BUILD_PARAMS:
+            manifest = {"params": BUILD_PARAMS, "files": {}}
+        else:
+            base = load_exact(src)
+            if base is None:
+                print("Exact vectors for the approximate index are missing or out of sync; rebuilding from scratch.")
+                manifest = {"params": BUILD_PARAMS, "files": {}}
+    old = manifest["files"]
+
+    # Step 2: Diff files on disk against the manifest by content hash
     files = collect_files(DATA_DIR)
-    docs, metadatas = [], []
-    for fp in files:
-        txt = load_any(fp)
-        splitter = RecursiveCharacterTextSplitter(chunk_size=900, chunk_overlap=150)
+    hashes = {fp: file_sha256(fp) for fp in files}
+    unchanged = [fp for fp in files if fp in old and old[fp]["sha256"] == hashes[fp]]
+    changed = [fp for fp in files if fp in old and old[fp]["sha256"] != hashes[fp]]
+    added = [fp for fp in files if fp not in old]
+    removed = [fp for fp in old if fp not in hashes]
+
+    print(f"{len(unchanged)} unchanged (skipped), {len(changed)} changed, "
+          f"{len(added)} new, {len(removed)} removed")
+    if (base is not None and not (changed or added or removed)
+            and manifest.get("index_type") == INDEX_TYPE):
+        print(f"FAISS DB in {DB_DIR} is up to date.")
+        return
+
+    # Step 3: Start from the previous version's chunks, drop those of changed/removed files (and
+    # forget the files, so a resume re-adds them)
+    store = BuildStore(CHECKPOINT)
+    if base is not None:
+        store.seed(src, base)
+        store.checkpoint(manifest)
+    stale = [i for fp in changed + removed for i in old.pop(fp)["ids"]]
+    store.delete(stale)
+
+    # Step 4: Stream files -> chunks -> embedding batches -> build store, checkpointing between files
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    writer = IndexWriter(embeddings, store, batch_size=EMBED_BATCH_SIZE)
+    since_checkpoint = 0
+    # files are parsed in parallel processes; previously parsed content comes from the parse cache
+    for fp, txt in load_many(changed + added, hashes=hashes):
         chunks = splitter.split_text(txt)
-        docs.extend(chunks)
-        metadatas.extend([{"path": fp}] * len(chunks))
+        ids = chunk_ids(fp, hashes[fp], len(chunks))
+        writer.add(chunks, [{"path": fp} for _ in chunks], ids)
+        old[fp] = {"sha256": hashes[fp], "ids": ids}
+        since_checkpoint += len(chunks)
+        if since_checkpoint >= CHECKPOINT_EVERY:
+            writer.flush()
+            store.checkpoint(manifest)  # commits only the rows written since the last checkpoint
+            since_checkpoint = 0
+    writer.flush()
 
-    # Step 2: Initialize embedding model
-    embeddings = HuggingFaceEmbeddings(model_name=EMBED_MODEL)
+    # Step 5: Uploads (/add, ingest_new.py) are not in data/. A rebuild that did not start from the
+    # previous version (--full, new BUILD_PARAMS, lost sidecar) carries that version's uploads over,
+    # and everything logged so far goes in too, so the log head can be dropped below. Their vectors
+    # are reused unless the embedding model changed.
+    same_model = src_manifest["params"].get("embed_model") == EMBED_MODEL
+    exact = base
+    if exact is None and same_model and have_index:
+        exact = load_exact(src)
+    carried = [row for row in uploads_of(src, src_manifest) if not store.has(row[1])]
+    if carried and exact is not None:
+        store.add([r[1] for r in carried], [r[2] for r in carried], [r[3] for r in carried],
+                  [exact.reconstruct(r[0]) for r in carried])
+    elif carried:
+        writer.add([r[2] for r in carried], [r[3] for r in carried], [r[1] for r in carried])
+    writer.flush()
+    logged = [rec for rec in log_records(DB_DIR, upto=folded) if not store.has(rec["id"])]
+    if logged and same_model:
+        store.add([r["id"] for r in logged], [r["text"] for r in logged], [r["metadata"] for r in logged],
+                  [r["vector"] for r in logged])
+    elif logged:
+        writer.add([r["text"] for r in logged], [r["metadata"] for r in logged], [r["id"] for r in logged])
+    writer.flush()
+    if carried or logged:
+        print(f"{len(carried)} uploaded chunks carried over from the previous version, {len(logged)} from the delta log.")
+    store.checkpoint(manifest)
+    if not len(store):
+        print(f"No chunks found in {DATA_DIR}, nothing to build.")
+        store.close()
+        drop_checkpoint()
+        return
 
-    # Step 3: Build FAISS vector database
-    os.makedirs(DB_DIR, exist_ok=True)
-    db = FAISS.from_texts(
-        texts=docs,
-        embedding=embeddings,
-        metadatas=metadatas
-    )
+    # Step 6: Derive the served index type from the exact vectors, in a fresh version directory
+    out_dir = new_build_dir(DB_DIR)
+    flat = store.flat_index()
+    index = build_index(flat, INDEX_TYPE, nlist=IVF_NLIST, pq_m=PQ_M, hnsw_m=HNSW_M)
+    if index is not flat:
+        faiss.write_index(flat, os.path.join(out_dir, FLAT_SIDECAR))
+        write_ann_report(flat, index, out_dir)
+        tune_index(index, nprobe=FAISS_NPROBE, ef_search=FAISS_EF_SEARCH)
+    manifest["index_type"] = INDEX_TYPE
 
-    # Step 4: Save database locally
-    db.save_local(DB_DIR)
-    print(f"Saved FAISS DB to {DB_DIR} with {len(docs)} chunks.")
+    # Step 7: Save index + chunks + manifest, then publish; servers switch to it without a restart
+    faiss.write_index(index, os.path.join(out_dir, "index.faiss"))
+    store.write_chunk_db(out_dir)
+    save_manifest(manifest, out_dir)
+    version = publish(DB_DIR, out_dir)
+    store.close()
+    drop_checkpoint()
+    # the new version contains everything logged before the build started
+    drop_log_head(DB_DIR, folded)
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"Published FAISS DB version {version} in {DB_DIR}: embedded {writer.embedded} chunks from "
+          f"{len(changed) + len(added)} files, {index.ntotal} chunks total, peak RSS {peak_mb:.0f} MB.")
 
 
 if __name__ == "__main__":
-    main()
+    # python scripts/build_vector_db.py [--full]   (--full ignores the manifest and re-embeds everything)
+    main(full="--full" in sys.argv[1:])
@@ -0,0 +1,34 @@
+"""
+Train the LoRA adapter once per TRAIN_MODE (pad / dynamic / packed) and compare throughput.
+
+    python scripts/compare_train_modes.py [epochs] [modes...]
+
+Each run is a separate scripts/finetune.py process writing to models/train-compare/<mode>;
+the table is read back from the train_stats.json files it leaves there.
+"""
+import os, sys, json, subprocess
+
+OUT_ROOT = "models/train-compare"
+MODES = ("pad", "dynamic", "packed")
+
+
+def run(mode: str, epochs: str) -> dict:
+    out_dir = os.path.join(OUT_ROOT, mode)
+    env = dict(os.environ, TRAIN_MODE=mode, NUM_EPOCHS=epochs, FINETUNE_OUT_DIR=out_dir)
+    subprocess.run([sys.executable, os.path.join("scripts", "finetune.py")], env=env, check=True)
+    with open(os.path.join(out_dir, "train_stats.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main(epochs: str = "1", *modes: str):
+    rows = [run(m, epochs) for m in (modes or MODES)]
+    base = rows[0]["real_tokens_per_sec"]
+    print(f"{'mode':8} {'sequences':>9} {'pad %':>7} {'epoch s':>9} {'real tok/s':>11} {'speedup':>8}")
+    for r in rows:
+        epoch_s = sum(r["epoch_wall_s"]) / max(len(r["epoch_wall_s"]), 1)
+        print(f"{r['mode']:8} {r['sequences']:>9} {100 * r['pad_fraction']:6.1f}% {epoch_s:9.2f} "
+              f"{r['real_tokens_per_sec']:>11} {r['real_tokens_per_sec'] / base:7.2f}x")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
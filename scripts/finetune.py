@@ -1,17 +1,35 @@
-import os, json
+import time
+T_START = time.perf_counter()  # startup is reported as time from here to the first training step
+import os, json, math, shutil, hashlib
 from dataclasses import dataclass
 from typing import Dict, List
-from datasets import load_dataset
+from datasets import load_dataset, load_from_disk
 from transformers import (AutoTokenizer, AutoModelForCausalLM,
-                          DataCollatorForLanguageModeling, Trainer, TrainingArguments)
+                          DataCollatorForLanguageModeling, Trainer, TrainerCallback, TrainingArguments)
 from peft import LoraConfig, get_peft_model, prepare_model_for_kbit_training
 from dotenv import load_dotenv
+from utils.packing import PackedCollator, enable_packed_attention, pack_examples
 
 load_dotenv()
 BASE_MODEL=os.getenv("BASE_MODEL","gpt3")
 print(f"using model for finetuning :{BASE_MODEL}")
 DATA_PATH = "data/lecture_instructions.jsonl"
-OUT_DIR = "models/lora-lecture-gpt2"
+OUT_DIR = os.getenv("FINETUNE_OUT_DIR", "models/lora-lecture-gpt2")
+MAX_LEN = 1024
+# pad: every example padded to MAX_LEN (the original setup)
+# dynamic: pad to the longest example of each batch, batches grouped by length
+# packed: examples concatenated into MAX_LEN blocks, attention kept within each example
+TRAIN_MODE = os.getenv("TRAIN_MODE", "dynamic")
+NUM_EPOCHS = float(os.getenv("NUM_EPOCHS", "8"))
+BATCH_SIZE, GRAD_ACCUM = 2, 8
+# tokenized datasets are cached here, keyed by a fingerprint of the data file, tokenizer and settings
+TRAIN_CACHE_DIR = os.getenv("TRAIN_CACHE_DIR", "storage/train_cache")
+TRAIN_CACHE_KEEP = 3
+PREP_WORKERS = int(os.getenv("PREP_WORKERS", str(os.cpu_count() or 1)))
+# STREAM_DATA=1 tokenizes on the fly while training (for instruction files larger than RAM; no cache)
+STREAM_DATA = os.getenv("STREAM_DATA", "0") == "1"
+MAX_STEPS = int(os.getenv("MAX_STEPS", "-1"))
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")  # the prep workers are forked processes
 """
 Loading tokenizer and setting eos for tokenizer
 """
@@ -22,6 +40,7 @@ if tokenizer.pad_token is None:
 """
 Setting up model
 """
+t0 = time.perf_counter()
 model=AutoModelForCausalLM.from_pretrained(BASE_MODEL,device_map="auto")
 
 lora_cfg=LoraConfig(
@@ -30,44 +49,148 @@ lora_cfg=LoraConfig(
     target_modules=["c_attn","c_proj"]
 )
 model=get_peft_model(model,lora_cfg)
+startup = {"model_load_s": round(time.perf_counter() - t0, 2)}
 """
 loading dataset
 """
-dataset=load_dataset(
-    "json",
-    data_files=DATA_PATH,
-    split="train"
-)
-
-def format_example(ex):
+def format_and_tokenize(batch):
     # supervised fine-tuning: concatenate prompt + response
-    text = ex["prompt"].strip() + "\n" + ex["response"].strip()
-    return {"text": text}
-dataset=dataset.map(format_example,remove_columns=dataset.column_names)
-
-def tokenize(batch):
-    return tokenizer(
-        batch["text"],
+    texts = [p.strip() + "\n" + r.strip() for p, r in zip(batch["prompt"], batch["response"])]
+    enc = tokenizer(
+        texts,
         truncation=True,
-        max_length=1024,
-        padding="max_length",
+        max_length=MAX_LEN,
+        padding="max_length" if TRAIN_MODE == "pad" else False,
         return_tensors=None,
     )
-tokenized=dataset.map(tokenize,batched=True,remove_columns=["text"])
+    return {"input_ids": enc["input_ids"], "attention_mask": enc["attention_mask"]}
 
-data_collator = DataCollatorForLanguageModeling(
-    tokenizer=tokenizer,
-    mlm=False
-)
+def build_dataset(streaming: bool):
+    dataset=load_dataset(
+        "json",
+        data_files=DATA_PATH,
+        split="train",
+        streaming=streaming,
+    )
+    # streamed datasets are mapped lazily in the training loop, so only the in-memory one gets workers
+    workers = {} if streaming or PREP_WORKERS <= 1 else {"num_proc": PREP_WORKERS}
+    columns = dataset.column_names or ["prompt", "response"]
+    dataset=dataset.map(format_and_tokenize,batched=True,remove_columns=columns,**workers)
+    if TRAIN_MODE == "packed":
+        dataset=dataset.map(lambda b: pack_examples(b, MAX_LEN), batched=True,
+                            remove_columns=["input_ids", "attention_mask"], **workers)
+    return dataset
+
+def fingerprint() -> str:
+    st = os.stat(DATA_PATH)
+    key = [os.path.abspath(DATA_PATH), st.st_size, st.st_mtime_ns, tokenizer.name_or_path, len(tokenizer),
+           tokenizer.pad_token, MAX_LEN, TRAIN_MODE]
+    return hashlib.sha1(json.dumps(key).encode()).hexdigest()[:16]
+
+def cached_dataset():
+    path = os.path.join(TRAIN_CACHE_DIR, fingerprint())
+    if os.path.exists(path):
+        return load_from_disk(path), "hit"
+    dataset = build_dataset(streaming=False)
+    tmp = path + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    dataset.save_to_disk(tmp)
+    os.replace(tmp, path)
+    entries = sorted((os.path.join(TRAIN_CACHE_DIR, d) for d in os.listdir(TRAIN_CACHE_DIR) if not d.endswith(".tmp")),
+                     key=os.path.getmtime, reverse=True)
+    for old in entries[TRAIN_CACHE_KEEP:]:
+        shutil.rmtree(old, ignore_errors=True)
+    return load_from_disk(path), "miss"  # memory-mapped from the cache rather than the map() output
+
+def count_examples(path: str) -> int:
+    with open(path, "rb") as f:
+        return sum(1 for line in f if line.strip())
+
+t0 = time.perf_counter()
+if STREAM_DATA:
+    tokenized, startup["data_cache"] = build_dataset(streaming=True), "streaming"
+    if MAX_STEPS <= 0:
+        # an iterable dataset has no length; one step per BATCH_SIZE * GRAD_ACCUM examples (packed blocks
+        # hold several examples, so set MAX_STEPS explicitly there to avoid extra passes)
+        MAX_STEPS = math.ceil(math.ceil(count_examples(DATA_PATH) / BATCH_SIZE) / GRAD_ACCUM * NUM_EPOCHS)
+else:
+    os.makedirs(TRAIN_CACHE_DIR, exist_ok=True)
+    tokenized, startup["data_cache"] = cached_dataset()
+startup["data_prep_s"] = round(time.perf_counter() - t0, 2)
+print(f"Dataset ready in {startup['data_prep_s']} s (cache: {startup['data_cache']})")
+
+if TRAIN_MODE == "packed":
+    data_collator = PackedCollator(tokenizer.pad_token_id)
+    if not enable_packed_attention(model):
+        print("This transformers version cannot mask attention per example; packed examples will see earlier ones")
+else:
+    # pads each batch to its longest example (all examples are MAX_LEN long in "pad" mode)
+    data_collator = DataCollatorForLanguageModeling(
+        tokenizer=tokenizer,
+        mlm=False
+    )
+
+class CountingCollator:
+    """Counts real and padded tokens handed to the model (for the throughput report)."""
+    def __init__(self, inner):
+        self.inner = inner
+        self.real = self.padded = self.sequences = 0
+
+    def __call__(self, features):
+        batch = self.inner(features)
+        self.sequences += len(features)
+        self.padded += batch["input_ids"].numel()
+        self.real += int(batch["attention_mask"].sum())
+        return batch
+
+class ThroughputCallback(TrainerCallback):
+    def __init__(self, counter: CountingCollator):
+        self.counter = counter
+        self.epoch_s: List[float] = []
+        self.train_s = 0.0
+        self.first_step_s = None
+
+    def on_train_begin(self, args, state, control, **kwargs):
+        self.t_train = time.perf_counter()
+
+    def on_step_begin(self, args, state, control, **kwargs):
+        if self.first_step_s is None:
+            self.first_step_s = round(time.perf_counter() - T_START, 2)
+            print(f"First training step {self.first_step_s} s after launch")
+
+    def on_epoch_begin(self, args, state, control, **kwargs):
+        self.t_epoch = time.perf_counter()
+
+    def on_epoch_end(self, args, state, control, **kwargs):
+        self.epoch_s.append(round(time.perf_counter() - self.t_epoch, 2))
+
+    def on_train_end(self, args, state, control, **kwargs):
+        self.train_s = time.perf_counter() - self.t_train
+
+    def report(self) -> Dict:
+        c = self.counter
+        return {
+            "mode": TRAIN_MODE, "epochs": NUM_EPOCHS,
+            "sequences": c.sequences if STREAM_DATA else len(tokenized),
+            "startup": dict(startup, first_step_s=self.first_step_s),
+            "epoch_wall_s": self.epoch_s, "train_wall_s": round(self.train_s, 2),
+            "real_tokens": c.real, "padded_tokens": c.padded,
+            "pad_fraction": round(1 - c.real / c.padded, 4) if c.padded else None,
+            "real_tokens_per_sec": round(c.real / self.train_s, 1) if self.train_s else None,
+        }
+
+counter = CountingCollator(data_collator)
+throughput = ThroughputCallback(counter)
 """
 Training arguments set up
 """
 
 args = TrainingArguments(
     output_dir=OUT_DIR,
-    num_train_epochs=8,
-    per_device_train_batch_size=2,
-    gradient_accumulation_steps=8,
+    num_train_epochs=NUM_EPOCHS,
+    max_steps=MAX_STEPS,
+    per_device_train_batch_size=BATCH_SIZE,
+    gradient_accumulation_steps=GRAD_ACCUM,
     learning_rate=2e-4,
     lr_scheduler_type="cosine",
     warmup_ratio=0.05,
@@ -78,16 +201,26 @@ args = TrainingArguments(
     bf16=False,
     fp16=False,
     report_to="none",
+    group_by_length=TRAIN_MODE == "dynamic" and not STREAM_DATA,  # needs the lengths up front
+    # position_ids of packed blocks must reach the model
+    remove_unused_columns=TRAIN_MODE != "packed",
 )
 trainer=Trainer(
     model=model,
     args=args,
-    data_collator=data_collator,
-    train_dataset=tokenized
+    data_collator=counter,
+    train_dataset=tokenized,
+    callbacks=[throughput],
 )
 
 trainer.train()
 # 5) Save adapter + tokenizer
 trainer.save_model(OUT_DIR)
 tokenizer.save_pretrained(OUT_DIR)
-print(f"Saved LoRA adapter to {OUT_DIR}")
\ No newline at end of file
+print(f"Saved LoRA adapter to {OUT_DIR}")
+stats = throughput.report()
+with open(os.path.join(OUT_DIR, "train_stats.json"), "w", encoding="utf-8") as f:
+    json.dump(stats, f, indent=1)
+print(f"{TRAIN_MODE}: {stats['real_tokens_per_sec']} real tokens/s, pad fraction {stats['pad_fraction']}, "
+      f"epoch wall times {stats['epoch_wall_s']} s")
+print(f"startup: {stats['startup']}")
\ No newline at end of file
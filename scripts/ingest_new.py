@@ -1,38 +1,51 @@
 import os, sys
 from dotenv import load_dotenv
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
 from langchain_community.embeddings import HuggingFaceEmbeddings
-from utils.loader import load_any
+from utils.loader import load_cached
+from utils.live_index import LiveIndex, upgrade_current
+from utils.chunk_store import load_store
+from utils.snapshots import version_dir
+from utils.metrics import SIZE_BUCKETS, Histogram, stage
 
 load_dotenv()
 EMBED_MODEL = os.getenv("EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
 
 DB_DIR = "storage/faiss"
-
-def ingest(path: str):
-    # Step 1: Load file text
-    txt = load_any(path)
+INGESTED_CHUNKS = Histogram("rag_ingest_chunks", "Chunks added per ingested file", SIZE_BUCKETS)
+
+def ingest(path: str, store: LiveIndex = None) -> int:
+    """
+    Add one file to the vector DB. Pass the running agent's `store` to reuse the loaded
+    embedder and index: new chunks are searchable at once and only appended to the delta log.
+    Without it (CLI use) the embedder and snapshot are loaded here; running servers replay
+    the delta log within SNAPSHOT_POLL_S.
+    """
+    # Step 1: Load file text (re-uploads of the same content hit the parse cache)
+    with stage("ingest_extract"):
+        txt = load_cached(path)
 
     # Step 2: Split into chunks
-    splitter = RecursiveCharacterTextSplitter(chunk_size=900, chunk_overlap=150)
-    chunks = splitter.split_text(txt)
-
-    # Step 3: Initialize embeddings (LangChain wrapper, not raw SentenceTransformer)
-    embeddings = HuggingFaceEmbeddings(model_name=EMBED_MODEL)
-
-    # Step 4: Load existing FAISS DB
-    db = FAISS.load_local(DB_DIR, embeddings, allow_dangerous_deserialization=True)
-
-    # Step 5: Add new chunks
-    db.add_texts(
-        texts=chunks,
-        metadatas=[{"path": path}] * len(chunks)
-    )
-
-    # Step 6: Save DB
-    db.save_local(DB_DIR)
+    with stage("ingest_split"):
+        splitter = RecursiveCharacterTextSplitter(chunk_size=900, chunk_overlap=150)
+        chunks = splitter.split_text(txt)
+
+    # Step 3: Reuse the live index, or load embeddings + existing FAISS DB once for the CLI
+    if store is None:
+        embeddings = HuggingFaceEmbeddings(model_name=EMBED_MODEL)
+        version = upgrade_current(DB_DIR)
+        db = load_store(version_dir(DB_DIR, version), embeddings)
+        store = LiveIndex(db, embeddings, DB_DIR, version=version)
+
+    # Step 4: Embed + add new chunks (in memory + append-only delta log)
+    with stage("ingest_embed"):
+        store.add_texts(
+            texts=chunks,
+            metadatas=[{"path": path} for _ in chunks]
+        )
+    INGESTED_CHUNKS.observe(len(chunks))
     print(f"Added {len(chunks)} chunks from {path}")
+    return len(chunks)
 
 if __name__ == "__main__":
     ingest(sys.argv[1])
@@ -0,0 +1,119 @@
+"""
+Build the CPU serving artifact: merge the LoRA adapter into the base weights, record the
+post-load optimizations (dynamic int8 quantization and/or torch.compile) and compare the result
+with the unoptimized path (base + adapter, fp32 eager).
+
+    python scripts/optimize_model.py [--no-quantize] [--compile] [--no-report]
+
+scripts/agent.py serves OPTIMIZED_DIR when it exists (USE_OPTIMIZED=0 to ignore it).
+"""
+import os, sys, json, math, time, shutil, statistics
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "")  # dynamic int8 kernels are CPU-only
+
+import torch
+from dotenv import load_dotenv
+from transformers import AutoTokenizer, AutoModelForCausalLM
+from utils.optimized_model import OPTIMIZE_CONFIG, load_optimized
+
+load_dotenv()
+BASE_MODEL = os.getenv("BASE_MODEL", "gpt2")
+LORA_DIR = os.getenv("LORA_DIR", "models/lora-lecture-gpt2/checkpoint-16")
+OPTIMIZED_DIR = os.getenv("OPTIMIZED_DIR", "models/optimized-gpt2")
+DATA_PATH = "data/lecture_instructions.jsonl"
+NEW_TOKENS = 64
+N_EXAMPLES = 8
+
+FALLBACK_TEXTS = [
+    "DNS translates human-readable domain names into IP addresses using a hierarchy of name servers.",
+    "TCP provides reliable, ordered delivery of a byte stream with flow and congestion control.",
+    "An MX record names the mail servers responsible for accepting email for a domain.",
+]
+
+
+def merge(out_dir: str, quantize: bool, compile_model: bool):
+    src = LORA_DIR if os.path.exists(LORA_DIR) else BASE_MODEL
+    tokenizer = AutoTokenizer.from_pretrained(src)
+    model = AutoModelForCausalLM.from_pretrained(BASE_MODEL, torch_dtype=torch.float32)
+    if os.path.exists(LORA_DIR):
+        from peft import PeftModel
+        model = PeftModel.from_pretrained(model, LORA_DIR).merge_and_unload()
+        print(f"Merged LoRA adapter {LORA_DIR} into {BASE_MODEL}")
+    else:
+        print(f"No adapter at {LORA_DIR}; optimizing {BASE_MODEL} as is")
+
+    tmp = out_dir + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    model.save_pretrained(tmp)
+    tokenizer.save_pretrained(tmp)
+    with open(os.path.join(tmp, OPTIMIZE_CONFIG), "w", encoding="utf-8") as f:
+        json.dump({"base_model": BASE_MODEL, "lora_dir": LORA_DIR if os.path.exists(LORA_DIR) else None,
+                   "quantize": "int8" if quantize else None, "compile": compile_model}, f, indent=1)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp, out_dir)
+    print(f"Saved serving artifact to {out_dir}")
+
+
+def eval_texts():
+    if not os.path.exists(DATA_PATH):
+        return FALLBACK_TEXTS
+    with open(DATA_PATH, "r", encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    return [r["prompt"].strip() + "\n" + r["response"].strip() for r in rows[:N_EXAMPLES]] or FALLBACK_TEXTS
+
+@torch.inference_mode()
+def perplexity(model, tokenizer, texts) -> float:
+    nll, n = 0.0, 0
+    for t in texts:
+        ids = tokenizer(t, return_tensors="pt", truncation=True, max_length=512)["input_ids"]
+        loss = model(ids, labels=ids).loss
+        nll += float(loss) * (ids.shape[1] - 1)
+        n += ids.shape[1] - 1
+    return math.exp(nll / max(n, 1))
+
+@torch.inference_mode()
+def greedy(model, tokenizer, prompts):
+    outs, times = [], []
+    for p in prompts:
+        ids = tokenizer(p, return_tensors="pt", truncation=True, max_length=512)
+        t0 = time.perf_counter()
+        out = model.generate(**ids, max_new_tokens=NEW_TOKENS, min_new_tokens=NEW_TOKENS, do_sample=False,
+                             pad_token_id=tokenizer.eos_token_id)
+        times.append(time.perf_counter() - t0)
+        outs.append(out[0, ids["input_ids"].shape[1]:].tolist())
+    return outs, times
+
+def report(out_dir: str):
+    tokenizer = AutoTokenizer.from_pretrained(out_dir)
+    texts = eval_texts()
+    prompts = [t[: len(t) // 2] for t in texts]
+    # the path agent.py used before: checkpoint loaded as is (adapter unmerged), fp32 eager
+    baseline = AutoModelForCausalLM.from_pretrained(LORA_DIR if os.path.exists(LORA_DIR) else BASE_MODEL,
+                                                    torch_dtype=torch.float32).eval()
+    optimized = load_optimized(out_dir)
+
+    rows, ref = [], None
+    for name, model in (("baseline", baseline), ("optimized", optimized)):
+        greedy(model, tokenizer, prompts[:1])  # warm-up (and torch.compile)
+        outs, times = greedy(model, tokenizer, prompts)
+        ref = ref or outs
+        agree = statistics.mean(sum(a == b for a, b in zip(o, r)) / max(len(r), 1) for o, r in zip(outs, ref))
+        rows.append({
+            "model": name,
+            "latency_ms_p50": round(statistics.median(times) * 1000, 1),
+            "tokens_per_sec": round(NEW_TOKENS * len(times) / sum(times), 1),
+            "perplexity": round(perplexity(model, tokenizer, texts), 3),
+            "greedy_token_agreement": round(agree, 4),
+        })
+    print(f"{NEW_TOKENS} new tokens, {len(prompts)} prompts (CPU, {torch.get_num_threads()} threads)")
+    for r in rows:
+        print(f"  {r['model']:10} p50 {r['latency_ms_p50']:8.1f} ms  {r['tokens_per_sec']:7.1f} tok/s  "
+              f"ppl {r['perplexity']:8.3f}  agreement {r['greedy_token_agreement']:.3f}")
+    with open(os.path.join(out_dir, "report.json"), "w", encoding="utf-8") as f:
+        json.dump(rows, f, indent=1)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    merge(OPTIMIZED_DIR, quantize="--no-quantize" not in args, compile_model="--compile" in args)
+    if "--no-report" not in args:
+        report(OPTIMIZED_DIR)
@@ -1,11 +1,20 @@
 import os, json, random
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from pathlib import Path
-from utils.loader import collect_files, load_any
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from utils.dedup import NearDuplicateFilter, minhash
+from utils.loader import collect_files, load_cached, mark_file_worker
 
 random.seed(42)
 
 DATA_DIR = "data/lectures"
 OUT_PATH = "data/lecture_instructions.jsonl"
+# chunks whose estimated Jaccard similarity with an earlier chunk reaches this are dropped (0 = keep all)
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.8"))
+DEDUP_NUM_PERM = 128
 
 TEMPLATE = (
     "You are a helpful lecturer. Based on the following lecture passage, "
@@ -55,20 +64,59 @@ def chunk(text, size=800, overlap=150):
         i += size - overlap
     return out
 
+def _chunk_job(path: str) -> Tuple[str, List[Tuple[str, np.ndarray]]]:
+    # extraction (via the parse cache), chunking and MinHash signatures all run in the worker
+    return path, [(ch, minhash(ch, DEDUP_NUM_PERM)) for ch in chunk(load_cached(path))]
+
+def iter_chunks(files: List[str], workers: Optional[int] = None) -> Iterator[Tuple[str, str, np.ndarray]]:
+    """
+    Yields (path, chunk, signature) in file order. Files are processed in worker processes at
+    most 2 * workers files ahead of the consumer, so memory stays bounded for large corpora.
+    """
+    workers = workers or int(os.getenv("EXTRACT_WORKERS", "0")) or os.cpu_count() or 1
+    if workers <= 1 or len(files) <= 1:
+        for fp in files:
+            _, items = _chunk_job(fp)
+            for ch, sig in items:
+                yield fp, ch, sig
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(files)), initializer=mark_file_worker) as ex:
+        todo = iter(files)
+        pending = deque(ex.submit(_chunk_job, fp) for fp in islice(todo, 2 * workers))
+        while pending:
+            fp, items = pending.popleft().result()
+            for nxt in islice(todo, 1):
+                pending.append(ex.submit(_chunk_job, nxt))
+            for ch, sig in items:
+                yield fp, ch, sig
+
+def examples(chunks: Iterator[Tuple[str, str, np.ndarray]],
+             dedup: Optional[NearDuplicateFilter] = None) -> Iterator[Dict[str, str]]:
+    for fp, ch, sig in chunks:
+        if dedup is not None and dedup.is_duplicate(sig):
+            continue
+        q = random.choice(GENERIC_QS)
+        # trivial "answer" bootstrap: use the first 3-4 sentences of the chunk
+        ans = " ".join(ch.split(".")[:3]).strip()
+        prompt = TEMPLATE.format(passage=ch, question=q, answer=ans)
+        yield {"prompt": prompt, "response": ans}
+
 def main():
     files = collect_files(DATA_DIR)
     os.makedirs(Path(OUT_PATH).parent, exist_ok=True)
-    with open(OUT_PATH, "w", encoding="utf-8") as out:
-        for fp in files:
-            text = load_any(fp)
-            for ch in chunk(text):
-                q = random.choice(GENERIC_QS)
-                # trivial "answer" bootstrap: use the first 3-4 sentences of the chunk
-                ans = " ".join(ch.split(".")[:3]).strip()
-                prompt = TEMPLATE.format(passage=ch, question=q, answer=ans)
-                rec = {"prompt": prompt, "response": ans}
-                out.write(json.dumps(rec, ensure_ascii=False) + "\n")
-    print(f"Wrote {OUT_PATH}")
+    # first occurrence wins; files are visited in sorted order, so the output is reproducible
+    dedup = NearDuplicateFilter(DEDUP_THRESHOLD, DEDUP_NUM_PERM) if DEDUP_THRESHOLD > 0 else None
+    n, tmp = 0, OUT_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as out:
+        for rec in examples(iter_chunks(files), dedup):
+            out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            n += 1
+    os.replace(tmp, OUT_PATH)
+    print(f"Wrote {n} examples from {len(files)} files to {OUT_PATH}")
+    if dedup is not None:
+        st = dedup.stats()
+        print(f"Near-duplicate filter (Jaccard >= {st['threshold']}, {st['bands']}x{st['rows']} LSH bands): "
+              f"dropped {st['dropped']} of {st['seen']} chunks, dedup ratio {st['dedup_ratio']:.1%}")
 
 if __name__ == "__main__":
     main()
@@ -1,9 +1,22 @@
 # ui.py
+import json
 import streamlit as st
 import requests
 
 API_URL = "http://localhost:8001"  # FastAPI backend
 
+
+def http_error(resp) -> str:
+    # FastAPI errors carry {"detail": ...}; anything else (proxy pages, crashes) is shown as text
+    try:
+        detail = resp.json().get("detail", resp.text)
+    except ValueError:
+        detail = resp.text
+    msg = f"HTTP {resp.status_code} {resp.reason}: {str(detail).strip()[:300] or 'no details'}"
+    if resp.headers.get("Retry-After"):
+        msg += f" (retry in {resp.headers['Retry-After']}s)"
+    return msg
+
 st.set_page_config(
     page_title="Ziyanda's Personal Study AI Agent",
     page_icon="👑",
@@ -263,14 +276,39 @@ with tab1:
     
     if st.button("🚀 Ask Your Question", key="ask_btn"):
         if query.strip():
-            with st.spinner("🤔 Analyzing your question..."):
-                try:
-                    resp = requests.post(f"{API_URL}/ask", data={"q": query, "use_web": use_web})
-                    answer = resp.json().get("answer", "No answer returned.")
-                except Exception as e:
-                    answer = f"⚠️ Could not connect to backend: {e}"
+            answer_slot = st.empty()
+            stats_slot = st.empty()
+            answer = ""
+            done = False
+            try:
+                # consume the SSE stream and re-render the answer box as tokens arrive
+                with requests.post(f"{API_URL}/ask_stream", data={"q": query, "use_web": use_web}, stream=True) as resp:
+                    if not resp.ok:
+                        raise RuntimeError(http_error(resp))
+                    answer_slot.markdown('<div class="answer-box">🤔 Analyzing your question...</div>', unsafe_allow_html=True)
+                    for line in resp.iter_lines(decode_unicode=True):
+                        if not line or not line.startswith("data: "):
+                            continue
+                        event = json.loads(line[len("data: "):])
+                        if event.get("done"):
+                            done = True
+                            stats_slot.caption(
+                                f"⏱️ First token after {event['ttft_ms']:.0f} ms · "
+                                f"full answer in {event['total_ms']:.0f} ms"
+                            )
+                            continue
+                        answer += event.get("token", "")
+                        answer_slot.markdown(f'<div class="answer-box">💡 <strong>Answer:</strong><br><br>{answer}</div>', unsafe_allow_html=True)
+                if not done:
+                    raise RuntimeError("the stream ended before the answer was complete")
+                if not answer:
+                    answer = "No answer returned."
+            except requests.ConnectionError as e:
+                answer = f"{answer}<br><br>⚠️ Lost connection to backend: {e}" if answer else f"⚠️ Could not connect to backend: {e}"
+            except Exception as e:
+                answer = f"{answer}<br><br>⚠️ {e}" if answer else f"⚠️ {e}"
             
-            st.markdown(f'<div class="answer-box">💡 <strong>Answer:</strong><br><br>{answer}</div>', unsafe_allow_html=True)
+            answer_slot.markdown(f'<div class="answer-box">💡 <strong>Answer:</strong><br><br>{answer}</div>', unsafe_allow_html=True)
         else:
             st.warning("Please enter a question first!")
     
@@ -297,7 +335,9 @@ with tab2:
                     try:
                         files = {"file": (uploaded_file.name, uploaded_file.read())}
                         resp = requests.post(f"{API_URL}/add", files=files)
-                        chunks_added = resp.json().get('file', 0)
+                        if not resp.ok:
+                            raise RuntimeError(http_error(resp))
+                        chunks_added = resp.json().get('chunks', 0)
                         st.success(f"✅ Successfully processed! Added {chunks_added} knowledge chunks to your database.")
                     except Exception as e:
                         st.error(f"⚠️ Upload failed: {e}")
@@ -337,6 +377,8 @@ with tab3:
                         "use_web": True
                     }
                     resp = requests.post(f"{API_URL}/ask", data=payload)
+                    if not resp.ok:
+                        raise RuntimeError(http_error(resp))
                     generated_code = resp.json().get("answer", "No code generated.")
                     
                     st.markdown("### 📝 Generated Code:")
@@ -0,0 +1,47 @@
+import threading, time
+import pytest
+from utils.batcher import MicroBatcher
+
+
+def test_concurrent_submits_share_one_batch():
+    batches = []
+    batcher = MicroBatcher(lambda items: batches.append(items) or [i * 2 for i in items],
+                           max_batch_size=4, max_wait_ms=200)
+    futures = [batcher.submit(i) for i in range(6)]
+    assert [f.result(timeout=5) for f in futures] == [0, 2, 4, 6, 8, 10]
+    assert batches == [[0, 1, 2, 3], [4, 5]]
+
+
+def test_cancelled_requests_are_dropped_from_the_batch():
+    gate, batches = threading.Event(), []
+
+    def run(items):
+        batches.append(items)
+        if "block" in items:
+            gate.wait(5)
+        return [f"{i}!" for i in items]
+
+    batcher = MicroBatcher(run, max_batch_size=8, max_wait_ms=20)
+    first = batcher.submit("block")
+    time.sleep(0.2)  # the batcher is now busy with the first batch; the rest queue up
+    a, b, c = batcher.submit("a"), batcher.submit("b"), batcher.submit("c")
+    assert b.cancel()
+    gate.set()
+    assert first.result(timeout=5) == "block!"
+    assert (a.result(timeout=5), c.result(timeout=5)) == ("a!", "c!")
+    assert b.cancelled()
+    assert batches == [["block"], ["a", "c"]]
+
+
+def test_batch_failure_reaches_every_caller_and_the_loop_survives():
+    def run(items):
+        if "bad" in items:
+            raise ValueError("boom")
+        return items
+
+    batcher = MicroBatcher(run, max_batch_size=2, max_wait_ms=200)
+    failed = [batcher.submit("bad"), batcher.submit("ok")]
+    for fut in failed:
+        with pytest.raises(ValueError, match="boom"):
+            fut.result(timeout=5)
+    assert batcher("next") == "next"
@@ -0,0 +1,33 @@
+import numpy as np
+from utils.dedup import NearDuplicateFilter, _PRIME, _mulmod, _perm_params, lsh_bands, minhash, shingles
+
+TEXT = ("a zone file lists the resource records of a dns zone, one per line, starting with the soa "
+        "record and the name servers that are authoritative for it")
+
+
+def test_minhash_is_the_exact_universal_hash():
+    x = shingles(TEXT, 3)
+    a, b = _perm_params(32, seed=1)
+    p = int(_PRIME)
+    expected = [min((int(ai) * int(xi) + int(bi)) % p for xi in x) for ai, bi in zip(a, b)]
+    assert minhash(TEXT, num_perm=32, shingle=3).tolist() == expected
+
+
+def test_mulmod_does_not_wrap_at_the_largest_operands():
+    x = np.array([2 ** 32 - 1], dtype=np.uint64)
+    a = np.array([int(_PRIME) - 1], dtype=np.uint64)
+    assert int(_mulmod(x, a)[0, 0]) == (2 ** 32 - 1) * (int(_PRIME) - 1) % int(_PRIME)
+
+
+def test_lsh_bands_reach_the_requested_recall():
+    bands, rows = lsh_bands(128, threshold=0.8)
+    assert bands * rows == 128
+    assert 1 - (1 - 0.8 ** rows) ** bands >= 0.95
+
+
+def test_filter_drops_near_duplicates_and_keeps_distinct_text():
+    f = NearDuplicateFilter(threshold=0.8)
+    assert not f.is_duplicate(f.signature(TEXT))
+    assert f.is_duplicate(f.signature(TEXT.upper() + "."))  # same words after lower-casing
+    assert not f.is_duplicate(f.signature("gradient descent updates the weights against the gradient of the loss"))
+    assert f.stats()["dropped"] == 1 and f.stats()["kept"] == 2
@@ -0,0 +1,108 @@
+import os, zlib
+import faiss
+import numpy as np
+import pytest
+from utils import snapshots
+from utils.chunk_store import BuildStore, iter_chunks, load_store
+from utils.live_index import DELTA_LOG, LiveIndex, log_records, log_size
+
+BASE = ["dns maps names to addresses", "tcp retransmits lost segments", "arp resolves mac addresses"]
+
+
+class WordEmbeddings:
+    """Bag of hashed words; counts how many texts it was asked to embed."""
+
+    def __init__(self, dim: int = 32):
+        self.dim = dim
+        self.embedded = 0
+
+    def _vec(self, text):
+        v = np.zeros(self.dim, dtype="float32")
+        for w in text.lower().split():
+            v[zlib.crc32(w.encode()) % self.dim] += 1
+        return v.tolist()
+
+    def embed_documents(self, texts):
+        self.embedded += len(texts)
+        return [self._vec(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._vec(text)
+
+
+@pytest.fixture
+def root(tmp_path):
+    root = tmp_path / "faiss"
+    root.mkdir()
+    store = BuildStore(str(tmp_path / "build.sqlite"))
+    store.add([f"base{i}" for i in range(len(BASE))], BASE, [{"source": "lecture"}] * len(BASE),
+              WordEmbeddings().embed_documents(BASE))
+    build = snapshots.new_build_dir(str(root))
+    faiss.write_index(store.flat_index(), os.path.join(build, "index.faiss"))
+    store.write_chunk_db(build)
+    store.close()
+    snapshots.publish(str(root), build)
+    return str(root)
+
+
+def open_live(root, embeddings=None):
+    embeddings = embeddings or WordEmbeddings()
+    version = snapshots.current_version(root)
+    db = load_store(snapshots.version_dir(root, version), embeddings)
+    return LiveIndex(db, embeddings, root, compact_every=10_000, version=version)
+
+
+def texts_of(docs):
+    return [d.page_content for d in docs]
+
+
+def test_uploads_are_searchable_at_once_and_logged(root):
+    live = open_live(root)
+    live.add_texts(["ospf floods link state adverts"], [{"source": "upload"}])
+    assert len(live) == 4
+    assert texts_of(live.search("ospf link state", k=1, mode="bm25")) == ["ospf floods link state adverts"]
+    assert texts_of(live.search("ospf floods link state adverts", k=1, mode="dense")) == ["ospf floods link state adverts"]
+    assert [r["text"] for r in log_records(root)] == ["ospf floods link state adverts"]
+
+
+def test_replay_restores_uploads_without_embedding_them_again(root):
+    open_live(root).add_texts(["ospf floods link state adverts", "bgp exchanges routes"])
+    embeddings = WordEmbeddings()
+    live = open_live(root, embeddings)
+    assert len(live) == 5 and embeddings.embedded == 0
+    assert live.replay() == 2 and len(live) == 5  # records already applied are skipped by id
+    assert texts_of(live.search("bgp routes", k=1, mode="bm25")) == ["bgp exchanges routes"]
+
+
+def test_torn_last_record_is_ignored(root):
+    open_live(root).add_texts(["bgp exchanges routes"])
+    with open(os.path.join(root, DELTA_LOG), "a") as f:
+        f.write('{"id": "half", "text": "cut of')
+    assert len(open_live(root)) == 4
+
+
+def test_compaction_publishes_a_version_and_empties_the_log(root):
+    first = snapshots.current_version(root)
+    live = open_live(root)
+    ids = live.add_texts(["ospf floods link state adverts"])
+    # a record appended by another process serving the same directory is folded as well
+    open_live(root).add_texts(["bgp exchanges routes"])
+    live.compact()
+    assert live.version != first and snapshots.current_version(root) == live.version
+    assert log_size(root) == 0
+    assert len(live) == 5
+    # the new version holds everything on its own; the old one was not modified
+    fresh = open_live(root)
+    assert len(fresh) == 5
+    assert texts_of(fresh.search("bgp routes", k=1, mode="bm25")) == ["bgp exchanges routes"]
+    assert ids[0] in [i for _, i, _, _ in iter_chunks(snapshots.version_dir(root, live.version))]
+    assert len(list(iter_chunks(snapshots.version_dir(root, first)))) == 3
+
+
+def test_other_process_switches_to_the_compacted_version(root):
+    writer, reader = open_live(root), open_live(root)
+    writer.add_texts(["bgp exchanges routes"])
+    writer.compact()
+    assert reader.reload()
+    assert reader.version == writer.version and len(reader) == 4
+    assert not reader.reload()
@@ -0,0 +1,63 @@
+from types import SimpleNamespace
+import pytest
+import torch
+import torch.nn.functional as F
+from utils import packing
+from utils.packing import PackedCollator, enable_packed_attention, pack_examples
+
+
+def test_examples_are_packed_whole_with_restarting_positions():
+    out = pack_examples({"input_ids": [[1, 2, 3], [4, 5], [6, 7, 8, 9]]}, block_size=5)
+    assert out["input_ids"] == [[1, 2, 3, 4, 5], [6, 7, 8, 9]]
+    assert out["position_ids"] == [[0, 1, 2, 0, 1], [0, 1, 2, 3]]
+    # the first token of every example predicts nothing, so no label crosses a boundary
+    assert out["labels"] == [[-100, 2, 3, -100, 5], [-100, 7, 8, 9]]
+
+
+def test_overlong_example_is_truncated_to_the_block():
+    out = pack_examples({"input_ids": [[1, 2], list(range(10, 20))]}, block_size=4)
+    assert out["input_ids"] == [[1, 2], [10, 11, 12, 13]]
+
+
+def test_collator_pads_and_masks():
+    batch = PackedCollator(pad_token_id=0)([
+        {"input_ids": [5, 6, 7], "position_ids": [0, 1, 0], "labels": [-100, 6, -100]},
+        {"input_ids": [8], "position_ids": [0], "labels": [-100]},
+    ])
+    assert batch["input_ids"].tolist() == [[5, 6, 7], [8, 0, 0]]
+    assert batch["position_ids"].tolist() == [[0, 1, 0], [0, 0, 0]]
+    assert batch["labels"].tolist() == [[-100, 6, -100], [-100, -100, -100]]
+    assert batch["attention_mask"].tolist() == [[1, 1, 1], [1, 0, 0]]
+
+
+def test_packed_attention_stays_inside_each_example():
+    torch.manual_seed(0)
+    module = SimpleNamespace(scale_attn_weights=True, scale_attn_by_inverse_layer_idx=False, layer_idx=0)
+    q, k, v = (torch.randn(1, 2, 5, 4) for _ in range(3))
+    position_ids = torch.tensor([[0, 1, 2, 0, 1]])
+    packing._segments.ids = torch.cumsum(position_ids == 0, dim=-1)
+    try:
+        out, _ = packing._packed_attention(module, q, k, v, attention_mask=None)
+    finally:
+        packing._segments.ids = None
+    for lo, hi in ((0, 3), (3, 5)):
+        alone = F.scaled_dot_product_attention(q[..., lo:hi, :], k[..., lo:hi, :], v[..., lo:hi, :], is_causal=True)
+        assert torch.allclose(out[:, lo:hi], alone.transpose(1, 2), atol=1e-6)
+
+
+def test_packed_gpt2_matches_examples_run_alone():
+    transformers = pytest.importorskip("transformers")
+    torch.manual_seed(0)
+    config = transformers.GPT2Config(vocab_size=50, n_positions=16, n_embd=16, n_layer=2, n_head=2)
+    model = transformers.GPT2LMHeadModel(config).eval()
+    if not enable_packed_attention(model):
+        pytest.skip("transformers has no attention-function registry")
+    a, b = [3, 4, 5], [6, 7]
+    packed = pack_examples({"input_ids": [a, b]}, block_size=8)
+    with torch.no_grad():
+        logits = model(input_ids=torch.tensor(packed["input_ids"]),
+                       position_ids=torch.tensor(packed["position_ids"])).logits[0]
+        alone = [model(input_ids=torch.tensor([ex]), position_ids=torch.arange(len(ex))[None]).logits[0]
+                 for ex in (a, b)]
+    assert torch.allclose(logits[:3], alone[0], atol=1e-5)
+    assert torch.allclose(logits[3:], alone[1], atol=1e-5)
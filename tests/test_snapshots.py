@@ -0,0 +1,79 @@
+import os
+from utils import snapshots
+
+
+def publish_version(root, payload: str) -> str:
+    build = snapshots.new_build_dir(str(root))
+    with open(os.path.join(build, "index.faiss"), "w") as f:
+        f.write(payload)
+    return snapshots.publish(str(root), build)
+
+
+def test_publish_swaps_current_and_names_increase(tmp_path):
+    names = [publish_version(tmp_path, str(i)) for i in range(3)]
+    assert names == sorted(names) and len(set(names)) == 3  # unique even within one millisecond
+    assert snapshots.versions(str(tmp_path)) == names
+    assert snapshots.current_version(str(tmp_path)) == names[-1]
+    with open(os.path.join(snapshots.current_dir(str(tmp_path)), "index.faiss")) as f:
+        assert f.read() == "2"
+    assert not os.path.exists(os.path.join(tmp_path, snapshots.CURRENT + ".tmp"))
+
+
+def test_root_without_current_is_the_unversioned_layout(tmp_path):
+    assert snapshots.current_version(str(tmp_path)) is None
+    assert snapshots.current_dir(str(tmp_path)) == str(tmp_path)
+    assert snapshots.versions(str(tmp_path)) == []
+
+
+def test_gc_keeps_the_newest_versions(tmp_path):
+    names = [publish_version(tmp_path, str(i)) for i in range(4)]
+    assert snapshots.versions(str(tmp_path)) == names  # publish's own gc is inside the grace period
+    assert snapshots.gc(str(tmp_path), keep=2, grace=0) == names[:2]
+    assert snapshots.versions(str(tmp_path)) == names[2:]
+
+
+def test_gc_keeps_versions_superseded_within_the_grace_period(tmp_path):
+    names = [publish_version(tmp_path, str(i)) for i in range(3)]
+    assert snapshots.gc(str(tmp_path), keep=0, grace=3600) == []
+    assert snapshots.versions(str(tmp_path)) == names
+
+
+def test_gc_with_keep_zero_never_deletes_current(tmp_path):
+    names = [publish_version(tmp_path, str(i)) for i in range(3)]
+    assert snapshots.gc(str(tmp_path), keep=0, grace=0) == names[:2]
+    assert snapshots.versions(str(tmp_path)) == names[2:]
+
+
+def test_gc_keeps_a_rolled_back_current_and_the_newest(tmp_path):
+    names = [publish_version(tmp_path, str(i)) for i in range(3)]
+    with open(os.path.join(tmp_path, snapshots.CURRENT), "w") as f:
+        f.write(names[0])
+    assert snapshots.gc(str(tmp_path), keep=0, grace=0) == [names[1]]
+    assert snapshots.versions(str(tmp_path)) == [names[0], names[2]]
+
+
+def test_gc_removes_leftover_build_dirs(tmp_path):
+    publish_version(tmp_path, "0")
+    crashed = snapshots.new_build_dir(str(tmp_path))
+    snapshots.gc(str(tmp_path))
+    assert not os.path.exists(crashed)
+
+
+def test_copy_files_skips_named_hidden_and_temporary_files(tmp_path):
+    src, dst = tmp_path / "src", tmp_path / "dst"
+    src.mkdir()
+    dst.mkdir()
+    for name in ("manifest.json", "index.faiss", ".publish.lock", "x.tmp", snapshots.CURRENT):
+        (src / name).write_text(name)
+    snapshots.copy_files(str(src), str(dst), skip=("index.faiss",))
+    assert sorted(os.listdir(dst)) == ["manifest.json"]
+
+
+def test_non_blocking_lock_reports_a_held_lock(tmp_path):
+    with snapshots.publish_lock(str(tmp_path)) as first:
+        assert first
+        # flock is per open file description, so a second open in this process contends too
+        with snapshots.publish_lock(str(tmp_path), blocking=False) as second:
+            assert not second
+    with snapshots.publish_lock(str(tmp_path), blocking=False) as again:
+        assert again
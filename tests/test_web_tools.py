@@ -0,0 +1,131 @@
+import os, threading, time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from utils import web_tools
+
+ARTICLE = "<html><body><article><h1>Zone files</h1>" + "<p>A zone file lists the records of a zone.</p>" * 20 + \
+          "</article></body></html>"
+
+
+class StubServer:
+    """Search page linking to /page/<name>; "fast" answers at once, "slow" before its headers, "drip" byte by byte."""
+
+    def __init__(self, pages=("fast", "slow", "drip"), search_drip: bool = False):
+        self.hits = Counter()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _send(self, body: bytes, drip: bool = False):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if not drip:
+                    self.wfile.write(body)
+                    return
+                for i in range(0, len(body), 20):
+                    self.wfile.write(body[i:i + 20])
+                    self.wfile.flush()
+                    time.sleep(0.05)
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                stub.hits["search"] += 1
+                base = f"http://{self.headers['Host']}"
+                links = "".join(f'<a class="result__a" href="{base}/page/{p}">{p}</a>' for p in pages)
+                padding = "<!-- %s -->" % ("." * 2000) if search_drip else ""
+                self._send(f"<html><body>{links}{padding}</body></html>".encode(), drip=search_drip)
+
+            def do_GET(self):
+                name = self.path.rsplit("/", 1)[-1]
+                stub.hits[name] += 1
+                if name.startswith("slow"):
+                    time.sleep(3)
+                self._send(ARTICLE.encode(), drip=name.startswith("drip"))
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def web(monkeypatch, tmp_path):
+    monkeypatch.setattr(web_tools, "WEB_CACHE_TTL", 0)
+    monkeypatch.setattr(web_tools, "WEB_CACHE_DIR", str(tmp_path / "cache"))
+    pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="test-fetch")
+    monkeypatch.setattr(web_tools, "_fetch_pool", pool)
+    servers = []
+
+    def start(**kwargs):
+        stub = StubServer(**kwargs)
+        servers.append(stub)
+        monkeypatch.setattr(web_tools, "DDG_URL", stub.base + "/html/")
+        return stub
+    yield start
+    for stub in servers:
+        stub.close()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def test_web_search_keeps_pages_that_beat_the_deadline(web):
+    stub = web()
+    t0 = time.monotonic()
+    pages = web_tools.web_search("zone file", deadline=1.0)
+    assert time.monotonic() - t0 < 1.5
+    assert [p["url"] for p in pages] == [stub.base + "/page/fast"]
+    assert "zone file lists the records" in pages[0]["text"]
+
+
+def test_slow_search_is_cut_off_at_the_deadline(web):
+    # every read returns within requests' timeout, so only an overall deadline stops this one
+    web(search_drip=True)
+    t0 = time.monotonic()
+    assert web_tools.web_search("zone file", deadline=0.5) == []
+    assert time.monotonic() - t0 < 1.0
+
+
+def test_late_fetches_give_their_workers_back(web):
+    # both workers download dripping pages past the first deadline; they must stop there, not run on for seconds
+    stub = web(pages=("drip1", "drip2"))
+    assert web_tools.web_search("zone file", deadline=0.5) == []
+    pages = web_tools.fetch_many([stub.base + "/page/fast"], deadline=1.5)
+    assert list(pages) == [stub.base + "/page/fast"]
+
+
+def test_fetches_still_queued_at_the_deadline_never_start(web):
+    stub = web()
+    urls = [stub.base + f"/page/{name}" for name in ("slow1", "slow2", "fast1", "fast2")]
+    assert web_tools.fetch_many(urls, deadline=0.3) == {}
+    time.sleep(0.5)
+    assert stub.hits["fast1"] == stub.hits["fast2"] == 0
+
+
+def test_cache_sweeps_only_past_the_size_limit(monkeypatch, tmp_path):
+    monkeypatch.setattr(web_tools, "WEB_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(web_tools, "WEB_CACHE_MAX_MB", 0.02)
+    monkeypatch.setattr(web_tools, "_cache_bytes", None)
+    monkeypatch.setattr(web_tools, "_puts_since_sweep", 0)
+    walks = []
+    real_walk = os.walk
+    monkeypatch.setattr(web_tools.os, "walk", lambda *a, **kw: walks.append(1) or real_walk(*a, **kw))
+    for i in range(60):
+        web_tools._cache_put(f"http://example.com/{i}", "x" * 1000)
+        for t in threading.enumerate():
+            if t.name == "web-cache-evict":
+                t.join()
+    on_disk = sum(os.path.getsize(os.path.join(d, n)) for d, _, names in real_walk(tmp_path) for n in names)
+    assert on_disk <= 0.02 * 1024 * 1024
+    assert web_tools._cache_bytes == on_disk
+    assert len(walks) < 30
@@ -0,0 +1,46 @@
+import asyncio, threading
+import pytest
+from utils.workers import BoundedPool, PoolSaturated
+
+
+def test_submissions_past_capacity_are_rejected():
+    gate = threading.Event()
+    pool = BoundedPool("test", max_workers=1, max_queue=1, timeout=5)
+    try:
+        running, queued = pool.submit(gate.wait, 5), pool.submit(gate.wait, 5)
+        with pytest.raises(PoolSaturated) as err:
+            pool.submit(gate.wait, 5)
+        assert err.value.name == "test"
+        gate.set()
+        assert running.result(timeout=5) and queued.result(timeout=5)
+        assert pool.stats() == {"inflight": 0, "capacity": 2}
+    finally:
+        gate.set()
+        pool.shutdown()
+
+
+def test_reserved_slot_is_returned_once():
+    pool = BoundedPool("test", max_workers=1, max_queue=0, timeout=5)
+    try:
+        release = pool.reserve()
+        with pytest.raises(PoolSaturated):
+            pool.reserve()
+        release()
+        release()
+        assert pool.stats()["inflight"] == 0
+    finally:
+        pool.shutdown()
+
+
+def test_run_times_out_and_frees_a_queued_task():
+    gate = threading.Event()
+    pool = BoundedPool("test", max_workers=1, max_queue=1, timeout=0.2)
+    try:
+        pool.submit(gate.wait, 5)
+        with pytest.raises(asyncio.TimeoutError):
+            asyncio.run(pool.run(lambda: "never"))
+        gate.set()
+        assert asyncio.run(pool.run(lambda: "done", timeout=5)) == "done"
+    finally:
+        gate.set()
+        pool.shutdown()
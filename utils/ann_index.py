@@ -0,0 +1,173 @@
+import math, time
+from typing import Dict, List, Optional
+import numpy as np
+import faiss
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+# Exact copy of the vectors kept next to an approximate index.faiss; builds edit this one
+# (IVF-PQ is lossy and HNSW cannot delete) and re-derive the approximate index from it.
+FLAT_SIDECAR = "flat.faiss"
+_ADD_BATCH = 16384
+
+
+def _pq_m(d: int) -> int:
+    for m in (64, 48, 32, 24, 16, 12, 8, 4, 2, 1):
+        if d % m == 0:
+            return m
+    return 1
+
+def _sample(flat, size: int, seed: int) -> np.ndarray:
+    ids = np.random.default_rng(seed).choice(flat.ntotal, size=min(size, flat.ntotal), replace=False)
+    return np.vstack([flat.reconstruct(int(i)) for i in np.sort(ids)]).astype("float32")
+
+def build_index(flat, index_type: str, nlist: Optional[int] = None, pq_m: Optional[int] = None,
+                hnsw_m: int = 32, seed: int = 0):
+    """
+    Derive an index of `index_type` from an exact IndexFlatL2, keeping vector order
+    (so LangChain's index_to_docstore_id stays valid). IVF variants are trained on a sample.
+    Falls back to a cheaper type when the corpus is too small to train the requested one.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type!r}, expected one of {INDEX_TYPES}")
+    d, n = flat.d, flat.ntotal
+    if index_type == "ivf_pq" and n < 256 * 39:
+        print(f"Only {n} vectors, too few to train 8-bit PQ codebooks; using ivf_flat instead.")
+        index_type = "ivf_flat"
+    if index_type == "ivf_flat" and n < 39 * 4:
+        print(f"Only {n} vectors, too few to train IVF centroids; keeping the flat index.")
+        index_type = "flat"
+    if index_type == "flat":
+        return flat
+
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(d, hnsw_m)
+        index.hnsw.efConstruction = 200
+    else:
+        # ~4*sqrt(n) lists, with at least 39 training points per centroid
+        nlist = nlist or max(4, min(int(4 * math.sqrt(n)), n // 39))
+        quantizer = faiss.IndexFlatL2(d)
+        if index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, d, nlist)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, d, nlist, pq_m or _pq_m(d), 8)
+        index.train(_sample(flat, max(nlist * 64, 256 * 64), seed))
+
+    for start in range(0, n, _ADD_BATCH):
+        index.add(flat.reconstruct_n(start, min(_ADD_BATCH, n - start)))
+    return index
+
+class LayeredIndex:
+    """
+    Read-only memory-mapped base index plus a small in-RAM IndexFlat for vectors added
+    since the base was written (mmapped faiss storage cannot grow). Implements the part of
+    the faiss.Index API LangChain's FAISS store uses: d, ntotal, add, search, reconstruct.
+    """
+
+    def __init__(self, base):
+        self.base = base
+        self.d = base.d
+        self.metric_type = base.metric_type
+        self.delta = faiss.IndexFlat(base.d, base.metric_type)  # the file behind `base` is never rewritten
+
+    @property
+    def ntotal(self) -> int:
+        return self.base.ntotal + self.delta.ntotal
+
+    def add(self, x):
+        self.delta.add(x)
+
+    def search(self, x, k: int):
+        D, I = self.base.search(x, k)
+        if self.delta.ntotal == 0:
+            return D, I
+        D2, I2 = self.delta.search(x, k)
+        I2 = np.where(I2 >= 0, I2 + self.base.ntotal, -1)
+        D, I = np.hstack([D, D2]), np.hstack([I, I2])
+        # missing results (-1) come back as +inf (L2) / -inf (IP) and sort last either way
+        order = np.argsort(D if self.metric_type == faiss.METRIC_L2 else -D, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(D, order, axis=1), np.take_along_axis(I, order, axis=1)
+
+    def reconstruct(self, i: int):
+        i = int(i)
+        return self.base.reconstruct(i) if i < self.base.ntotal else self.delta.reconstruct(i - self.base.ntotal)
+
+    def unflushed(self) -> np.ndarray:
+        return self.delta.reconstruct_n(0, self.delta.ntotal)
+
+    def merged(self, path: str, tail: Optional[np.ndarray] = None):
+        """
+        Full in-memory copy of the saved index at `path` plus the delta vectors not written
+        to it yet (`tail`, as returned by unflushed(), when taken earlier under a lock).
+        """
+        index = faiss.read_index(path)
+        tail = self.unflushed() if tail is None else tail
+        if len(tail):
+            index.add(tail)
+        return index
+
+def read_index_mmap(path: str) -> LayeredIndex:
+    """Map a saved index instead of reading it into each process's heap; pages are shared between workers."""
+    try:
+        # flat codes (IndexFlat, HNSW storage)
+        base = faiss.read_index(path, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError:
+        # IVF: inverted lists are mapped through faiss' on-disk invlists instead
+        base = faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    return LayeredIndex(base)
+
+
+def tune_index(index, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+    """Query-time knobs: nprobe for IVF indexes, efSearch for HNSW. No-op for flat."""
+    if isinstance(index, LayeredIndex):
+        index = index.base
+    index = faiss.downcast_index(index)
+    if nprobe and isinstance(index, faiss.IndexIVF):
+        index.nprobe = nprobe
+    if ef_search and isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search
+    return index
+
+def index_type_of(index) -> str:
+    if isinstance(index, LayeredIndex):
+        index = index.base
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf_flat"
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    return "flat"
+
+
+def _timed_search(index, queries: np.ndarray, k: int):
+    t0 = time.perf_counter()
+    _, ids = index.search(queries, k)
+    return ids, (time.perf_counter() - t0) * 1000 / len(queries)
+
+def recall_report(flat, index, k: int = 10, n_queries: int = 200, seed: int = 0) -> List[Dict]:
+    """
+    recall@k and per-query latency of `index` against the exact `flat` baseline, swept over
+    nprobe (IVF) or efSearch (HNSW). Queries are stored vectors with a little noise added.
+    """
+    rng = np.random.default_rng(seed)
+    queries = _sample(flat, n_queries, seed)
+    queries += rng.normal(scale=0.01 * float(np.std(queries)), size=queries.shape).astype("float32")
+    truth, flat_ms = _timed_search(flat, queries, k)
+    rows = [{"index": "flat", "param": None, "value": None, "recall": 1.0, "ms_per_query": round(flat_ms, 3)}]
+
+    kind = index_type_of(index)
+    if kind == "flat":
+        return rows
+    if kind == "hnsw":
+        param, values = "efSearch", [16, 32, 64, 128, 256]
+    else:
+        nlist = faiss.extract_index_ivf(index).nlist
+        param, values = "nprobe", sorted({v for v in (1, 2, 4, 8, 16, 32, 64, 128) if v <= nlist})
+    for v in values:
+        tune_index(index, nprobe=v if param == "nprobe" else None, ef_search=v if param == "efSearch" else None)
+        ids, ms = _timed_search(index, queries, k)
+        hits = sum(len(set(a) & set(b)) for a, b in zip(ids.tolist(), truth.tolist()))
+        rows.append({"index": kind, "param": param, "value": v,
+                     "recall": round(hits / truth.size, 4), "ms_per_query": round(ms, 3)})
+    return rows
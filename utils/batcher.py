@@ -0,0 +1,56 @@
+import queue, threading, time
+from concurrent.futures import Future
+from typing import Any, Callable, List
+
+
+class MicroBatcher:
+    """
+    Collects concurrent submit() calls for a short window and runs them
+    through fn(list_of_items) -> list_of_results in one go.
+    Each caller gets a Future resolved with its own result.
+    """
+
+    def __init__(self, fn: Callable[[List[Any]], List[Any]], max_batch_size: int = 8, max_wait_ms: float = 20):
+        self.fn = fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, item: Any) -> Future:
+        fut: Future = Future()
+        self._queue.put((item, fut))
+        return fut
+
+    def __call__(self, item: Any) -> Any:
+        return self.submit(item).result()
+
+    def _collect(self):
+        # block for the first item, then keep the window open until it is full or expires
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        # drop callers that cancelled while waiting in the queue
+        return [(item, fut) for item, fut in batch if fut.set_running_or_notify_cancel()]
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            if not batch:
+                continue
+            try:
+                results = self.fn([item for item, _ in batch])
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            for (_, fut), res in zip(batch, results):
+                fut.set_result(res)
@@ -0,0 +1,139 @@
+import re, math, threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+import numpy as np
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_SEGMENT_DOCS = 50000  # docs per postings segment when building; bounds build memory
+K1, B = 1.5, 0.75      # rank_bm25's BM25Okapi defaults; idf is the Lucene form, which never goes negative
+
+BM25_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bm25_postings (term TEXT NOT NULL, docs BLOB NOT NULL, tfs BLOB NOT NULL, dls BLOB NOT NULL);
+CREATE INDEX IF NOT EXISTS bm25_postings_term ON bm25_postings(term);
+CREATE TABLE IF NOT EXISTS bm25_stats (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+"""
+
+
+def tokenize(text: str) -> List[str]:
+    # keep short tokens: record types (A, MX), RFC numbers and port numbers matter here
+    return _TOKEN.findall(text.lower())
+
+
+class _Postings:
+    """term -> parallel lists of (faiss position, term frequency, doc length)."""
+
+    def __init__(self):
+        self.terms: Dict[str, Tuple[List[int], List[int], List[int]]] = defaultdict(lambda: ([], [], []))
+        self.n_docs = 0
+        self.total_len = 0
+
+    def add(self, pos: int, text: str):
+        toks = tokenize(text)
+        counts: Dict[str, int] = defaultdict(int)
+        for t in toks:
+            counts[t] += 1
+        for t, tf in counts.items():
+            docs, tfs, dls = self.terms[t]
+            docs.append(pos)
+            tfs.append(tf)
+            dls.append(len(toks))
+        self.n_docs += 1
+        self.total_len += len(toks)
+
+    def rows(self):
+        for t, (docs, tfs, dls) in self.terms.items():
+            yield (t, np.asarray(docs, dtype="int64").tobytes(), np.asarray(tfs, dtype="int32").tobytes(),
+                   np.asarray(dls, dtype="int32").tobytes())
+
+
+def _bump_stats(conn, n_docs: int, total_len: int):
+    conn.executemany(
+        "INSERT INTO bm25_stats VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = value + excluded.value",
+        [("n_docs", n_docs), ("total_len", total_len)])
+
+def write_postings(conn, docs: Iterable[Tuple[int, str]]):
+    """Index (position, text) pairs into the bm25 tables of an open connection, in segments."""
+    seg = _Postings()
+    for pos, text in docs:
+        seg.add(pos, text)
+        if seg.n_docs >= _SEGMENT_DOCS:
+            conn.executemany("INSERT INTO bm25_postings VALUES (?, ?, ?, ?)", seg.rows())
+            _bump_stats(conn, seg.n_docs, seg.total_len)
+            seg = _Postings()
+    conn.executemany("INSERT INTO bm25_postings VALUES (?, ?, ?, ?)", seg.rows())
+    _bump_stats(conn, seg.n_docs, seg.total_len)
+
+
+class BM25Index:
+    """
+    Okapi BM25 over the postings stored in chunks.sqlite. Only the two corpus statistics are
+    read at startup; a query loads the postings of its own terms. Chunks added at runtime are
+    kept in an in-memory segment until compaction publishes a snapshot that contains them.
+    """
+
+    def __init__(self, sql):
+        self._sql = sql  # utils.chunk_store._SQLite
+        self._lock = threading.Lock()
+        self._pending = _Postings()
+        # files from before BM25 are republished with postings first (utils.chunk_store.needs_repair)
+        stats = dict(sql.conn().execute("SELECT key, value FROM bm25_stats"))
+        self.n_docs = stats.get("n_docs", 0)
+        self.total_len = stats.get("total_len", 0)
+
+    def add(self, docs: Iterable[Tuple[int, str]]):
+        with self._lock:
+            for pos, text in docs:
+                self._pending.add(pos, text)
+
+    def _postings(self, term: str, overlays: List[_Postings]):
+        docs, tfs, dls = [], [], []
+        for d, t, l in self._sql.conn().execute("SELECT docs, tfs, dls FROM bm25_postings WHERE term = ?", (term,)):
+            docs.append(np.frombuffer(d, dtype="int64"))
+            tfs.append(np.frombuffer(t, dtype="int32"))
+            dls.append(np.frombuffer(l, dtype="int32"))
+        for seg in overlays:
+            if term in seg.terms:
+                d, t, l = seg.terms[term]
+                docs.append(np.asarray(d, dtype="int64"))
+                tfs.append(np.asarray(t, dtype="int32"))
+                dls.append(np.asarray(l, dtype="int32"))
+        if not docs:
+            return None
+        return np.concatenate(docs), np.concatenate(tfs).astype("float32"), np.concatenate(dls).astype("float32")
+
+    def search(self, query: str, k: int = 4, max_pos: int = None) -> List[Tuple[int, float]]:
+        """Top-k (faiss position, score); positions >= max_pos (not in the index) are ignored."""
+        all_docs, all_scores = [], []
+        with self._lock:
+            overlays = [self._pending]
+            n = self.n_docs + sum(seg.n_docs for seg in overlays)
+            total = self.total_len + sum(seg.total_len for seg in overlays)
+            if not n:
+                return []
+            avgdl = total / n
+            for term in set(tokenize(query)):
+                post = self._postings(term, overlays)
+                if post is None:
+                    continue
+                docs, tfs, dls = post
+                idf = math.log((n - len(docs) + 0.5) / (len(docs) + 0.5) + 1)
+                all_docs.append(docs)
+                all_scores.append(idf * tfs * (K1 + 1) / (tfs + K1 * (1 - B + B * dls / avgdl)))
+        if not all_docs:
+            return []
+        docs, inv = np.unique(np.concatenate(all_docs), return_inverse=True)
+        scores = np.bincount(inv, weights=np.concatenate(all_scores))
+        if max_pos is not None:
+            keep = docs < max_pos
+            docs, scores = docs[keep], scores[keep]
+        top = np.argsort(-scores, kind="stable")[:k]
+        return [(int(docs[i]), float(scores[i])) for i in top]
+
+
+def rrf_fuse(rankings: List[List[int]], k: int, c: int = 60) -> List[int]:
+    """Reciprocal-rank fusion: score(d) = sum over rankings of 1 / (c + rank)."""
+    scores: Dict[int, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, d in enumerate(ranking):
+            scores[d] += 1.0 / (c + rank + 1)
+    return [d for d, _ in sorted(scores.items(), key=lambda x: -x[1])[:k]]
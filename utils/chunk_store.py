@@ -0,0 +1,341 @@
+import os, json, pickle, sqlite3, threading
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+import numpy as np
+import faiss
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from utils.ann_index import read_index_mmap
+from utils.bm25_index import BM25_SCHEMA, write_postings
+
+CHUNK_DB = "chunks.sqlite"
+_FETCH_BATCH = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (id TEXT PRIMARY KEY, text TEXT NOT NULL, metadata TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS positions (pos INTEGER PRIMARY KEY, id TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS positions_id ON positions(id);
+""" + BM25_SCHEMA
+
+
+class _SQLite:
+    """One connection per thread (sqlite3 connections are not shareable across threads)."""
+
+    def __init__(self, path: str, readonly: bool = False):
+        self.path = path
+        self.readonly = readonly  # published snapshot versions are never modified
+        self._local = threading.local()
+
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if self.readonly:
+                conn = sqlite3.connect(f"{Path(os.path.abspath(self.path)).as_uri()}?mode=ro", uri=True)
+            else:
+                conn = sqlite3.connect(self.path)
+                conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+
+class ChunkStore(Docstore, AddableMixin):
+    """
+    LangChain docstore backed by an SQLite file: chunk text + metadata are read lazily by id
+    instead of unpickling the whole corpus into every process. Documents added at runtime
+    sit in a small in-memory overlay until compaction writes them into the next snapshot
+    version (extend_chunk_db).
+    """
+
+    def __init__(self, db: _SQLite):
+        self._db = db
+        self._overlay: Dict[str, Document] = {}
+        self._deleted = set()
+
+    @property
+    def sql(self) -> _SQLite:
+        return self._db
+
+    def search(self, search: str) -> Document:
+        """The chunk with id `search`; KeyError if there is none (LangChain's stores return a string)."""
+        if search in self._overlay:
+            return self._overlay[search]
+        if search in self._deleted:
+            raise KeyError(search)
+        row = self._db.conn().execute("SELECT text, metadata FROM chunks WHERE id = ?", (search,)).fetchone()
+        if row is None:
+            raise KeyError(search)
+        return Document(id=search, page_content=row[0], metadata=json.loads(row[1]))
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        self._overlay.update(texts)
+        self._deleted.difference_update(texts)
+
+    def delete(self, ids: List) -> None:
+        for i in ids:
+            self._overlay.pop(i, None)
+            self._deleted.add(i)
+
+    def mget(self, ids: List[str]) -> Iterator[Tuple[str, Document]]:
+        """(id, Document) for ids in order; file rows are fetched in batches."""
+        for start in range(0, len(ids), _FETCH_BATCH):
+            batch = ids[start:start + _FETCH_BATCH]
+            marks = ",".join("?" * len(batch))
+            rows = {r[0]: r for r in self._db.conn().execute(
+                f"SELECT id, text, metadata FROM chunks WHERE id IN ({marks})", batch)}
+            for i in batch:
+                if i in self._overlay:
+                    yield i, self._overlay[i]
+                elif i in rows and i not in self._deleted:
+                    yield i, Document(id=i, page_content=rows[i][1], metadata=json.loads(rows[i][2]))
+                else:
+                    raise KeyError(i)
+
+    def pending(self) -> Dict[str, Document]:
+        return dict(self._overlay)
+
+
+class PositionMap:
+    """
+    index_to_docstore_id for LangChain's FAISS store (faiss row -> chunk id) read from the
+    positions table, with rows added at runtime kept in memory (like ChunkStore's overlay).
+    """
+
+    def __init__(self, db: _SQLite):
+        self._db = db
+        self._overlay: Dict[int, str] = {}
+        self._overlay_ids: Set[str] = set()  # reverse of _overlay, so has_id stays O(1) during replay
+        self._base_len = db.conn().execute("SELECT COUNT(*) FROM positions").fetchone()[0]
+
+    def __getitem__(self, pos) -> str:
+        pos = int(pos)  # faiss hands back numpy ints
+        if pos in self._overlay:
+            return self._overlay[pos]
+        row = self._db.conn().execute("SELECT id FROM positions WHERE pos = ?", (pos,)).fetchone()
+        if row is None:
+            raise KeyError(pos)
+        return row[0]
+
+    def get(self, pos, default=None):
+        try:
+            return self[pos]
+        except KeyError:
+            return default
+
+    def __contains__(self, pos) -> bool:
+        return self.get(pos) is not None
+
+    def __len__(self) -> int:
+        return self._base_len + len(self._overlay)
+
+    def update(self, other: Dict[int, str]):
+        for k, v in other.items():
+            old = self._overlay.get(int(k))
+            if old is not None:
+                self._overlay_ids.discard(old)
+            self._overlay[int(k)] = v
+            self._overlay_ids.add(v)
+
+    def items(self) -> Iterator[Tuple[int, str]]:
+        yield from self._db.conn().execute("SELECT pos, id FROM positions ORDER BY pos")
+        yield from sorted(self._overlay.items())
+
+    def values(self) -> Iterator[str]:
+        return (i for _, i in self.items())
+
+    def keys(self) -> Iterator[int]:
+        return (p for p, _ in self.items())
+
+    def __iter__(self):
+        return self.keys()
+
+    def has_id(self, chunk_id: str) -> bool:
+        if chunk_id in self._overlay_ids:
+            return True
+        return self._db.conn().execute("SELECT 1 FROM positions WHERE id = ?", (chunk_id,)).fetchone() is not None
+
+    def pending(self) -> Dict[int, str]:
+        return dict(self._overlay)
+
+
+def needs_repair(db_dir: str) -> bool:
+    """
+    True for a snapshot from before the current chunks.sqlite layout: only LangChain's pickled
+    docstore (index.pkl), no or partial BM25 postings, or positions past the end of index.faiss
+    (left by the in-place compaction of the unversioned layout when it died midway).
+    Fix it with repair_chunk_db into a new version; load_store never writes.
+    """
+    index_path, path = os.path.join(db_dir, "index.faiss"), os.path.join(db_dir, CHUNK_DB)
+    if not os.path.exists(index_path):
+        return False  # nothing built yet
+    if not os.path.exists(path):
+        return os.path.exists(os.path.join(db_dir, "index.pkl"))
+    conn = _SQLite(path, readonly=True).conn()
+    try:
+        tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if "bm25_stats" not in tables:
+            return True
+        n_pos, max_pos = conn.execute("SELECT COUNT(*), MAX(pos) FROM positions").fetchone()
+        n_docs = dict(conn.execute("SELECT key, value FROM bm25_stats")).get("n_docs", 0)
+    finally:
+        conn.close()
+    return n_docs != n_pos or (max_pos is not None and max_pos >= read_index_mmap(index_path).ntotal)
+
+def repair_chunk_db(src_dir: str, dst_dir: str):
+    """Write dst_dir's chunks.sqlite, with fresh BM25 postings, from src_dir's index.pkl or chunks.sqlite."""
+    path = os.path.join(src_dir, CHUNK_DB)
+    if not os.path.exists(path):
+        with open(os.path.join(src_dir, "index.pkl"), "rb") as f:
+            docstore, index_to_id = pickle.load(f)
+        rows = []
+        for pos, chunk_id in sorted(index_to_id.items()):
+            doc = docstore.search(chunk_id)
+            rows.append((pos, chunk_id, doc.page_content, doc.metadata))
+        _write_chunk_db(os.path.join(dst_dir, CHUNK_DB), rows)
+        print(f"Migrated {len(rows)} chunks from index.pkl to {CHUNK_DB}")
+        return
+    # positions past the end of the index drop out, so the delta log replays those chunks
+    ntotal = read_index_mmap(os.path.join(src_dir, "index.faiss")).ntotal
+    conn = _SQLite(path, readonly=True).conn()
+    try:
+        rows = conn.execute("SELECT p.pos, p.id, c.text, c.metadata FROM positions p JOIN chunks c ON c.id = p.id "
+                            "WHERE p.pos < ? ORDER BY p.pos", (ntotal,))
+        _write_chunk_db(os.path.join(dst_dir, CHUNK_DB), ((p, i, t, json.loads(m)) for p, i, t, m in rows))
+    finally:
+        conn.close()
+
+def _write_chunk_db(path: str, rows: Iterable[Tuple[int, str, str, dict]]):
+    tmp = path + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    conn = sqlite3.connect(tmp)
+    conn.executescript(_SCHEMA)
+
+    def insert():
+        for pos, chunk_id, text, meta in rows:
+            conn.execute("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?)", (chunk_id, text, json.dumps(meta, ensure_ascii=False)))
+            conn.execute("INSERT INTO positions VALUES (?, ?)", (pos, chunk_id))
+            yield pos, text
+
+    with conn:
+        # the BM25 postings are built in the same pass over the chunk text
+        write_postings(conn, insert())
+    conn.close()
+    # readers that still have the old file open keep seeing a consistent snapshot
+    os.replace(tmp, path)
+
+
+def extend_chunk_db(src_dir: str, dst_dir: str, docs: Dict[str, Document], positions: Dict[int, str]):
+    """Copy chunks.sqlite from src_dir to dst_dir and add docs at their positions, with BM25 postings."""
+    src = sqlite3.connect(os.path.join(src_dir, CHUNK_DB))
+    dst = sqlite3.connect(os.path.join(dst_dir, CHUNK_DB))
+    try:
+        src.backup(dst)
+        dst.executescript(_SCHEMA)
+        with dst:
+            dst.executemany("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?)",
+                            [(i, d.page_content, json.dumps(d.metadata, ensure_ascii=False)) for i, d in docs.items()])
+            dst.executemany("INSERT OR REPLACE INTO positions VALUES (?, ?)", list(positions.items()))
+            write_postings(dst, ((pos, docs[i].page_content) for pos, i in sorted(positions.items())))
+    finally:
+        src.close()
+        dst.close()
+
+
+class BuildStore:
+    """
+    Working state of build_vector_db in one SQLite file: every chunk with its text, metadata and
+    vector, in index order. Rows go to disk as they are embedded, so the build's memory does not
+    grow with the corpus, and checkpoint() commits only the rows added since the last one together
+    with the build manifest. An interrupted build reopens the file at its last checkpoint.
+    """
+
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS build_chunks (seq INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, text TEXT NOT NULL,
+                                             metadata TEXT NOT NULL, vector BLOB NOT NULL);
+    CREATE TABLE IF NOT EXISTS build_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.executescript(self._SCHEMA)
+
+    def manifest(self) -> Optional[dict]:
+        """Manifest of the last checkpoint, if there is one."""
+        row = self._conn.execute("SELECT value FROM build_meta WHERE key = 'manifest'").fetchone()
+        return json.loads(row[0]) if row else None
+
+    def checkpoint(self, manifest: dict):
+        self._conn.execute("INSERT OR REPLACE INTO build_meta VALUES ('manifest', ?)", (json.dumps(manifest),))
+        self._conn.commit()
+
+    def add(self, ids: List[str], texts: List[str], metadatas: List[dict], vectors):
+        vectors = np.asarray(vectors, dtype="float32")
+        self._conn.executemany("INSERT INTO build_chunks (id, text, metadata, vector) VALUES (?, ?, ?, ?)",
+                               [(i, t, json.dumps(m, ensure_ascii=False), v.tobytes())
+                                for i, t, m, v in zip(ids, texts, metadatas, vectors)])
+
+    def delete(self, ids: List[str]):
+        self._conn.executemany("DELETE FROM build_chunks WHERE id = ?", [(i,) for i in ids])
+
+    def has(self, chunk_id: str) -> bool:
+        return self._conn.execute("SELECT 1 FROM build_chunks WHERE id = ?", (chunk_id,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM build_chunks").fetchone()[0]
+
+    def seed(self, src_dir: str, flat):
+        """Start from a published version: its chunks with their exact vectors from `flat`."""
+        self._conn.executemany(
+            "INSERT INTO build_chunks (id, text, metadata, vector) VALUES (?, ?, ?, ?)",
+            ((i, t, json.dumps(m, ensure_ascii=False), flat.reconstruct(p).tobytes())
+             for p, i, t, m in iter_chunks(src_dir) if p < flat.ntotal))
+
+    def flat_index(self):
+        """IndexFlatL2 over every vector, in index order (LangChain's default for FAISS stores)."""
+        index = None
+        rows = self._conn.execute("SELECT vector FROM build_chunks ORDER BY seq")
+        while True:
+            batch = rows.fetchmany(_FETCH_BATCH)
+            if not batch:
+                break
+            vectors = np.vstack([np.frombuffer(v, dtype="float32") for v, in batch])
+            if index is None:
+                index = faiss.IndexFlatL2(vectors.shape[1])
+            index.add(vectors)
+        return index
+
+    def write_chunk_db(self, db_dir: str):
+        """chunks.sqlite (positions in index order, BM25 postings) of a snapshot built from this store."""
+        rows = self._conn.execute("SELECT id, text, metadata FROM build_chunks ORDER BY seq")
+        _write_chunk_db(os.path.join(db_dir, CHUNK_DB),
+                        ((pos, i, t, json.loads(m)) for pos, (i, t, m) in enumerate(rows)))
+
+    def close(self):
+        self._conn.close()
+
+
+def iter_chunks(db_dir: str) -> Iterator[Tuple[int, str, str, dict]]:
+    """(position, id, text, metadata) of every chunk of a saved snapshot, in index order."""
+    conn = _SQLite(os.path.join(db_dir, CHUNK_DB), readonly=True).conn()
+    try:
+        rows = conn.execute("SELECT p.pos, p.id, c.text, c.metadata FROM positions p JOIN chunks c ON c.id = p.id "
+                            "ORDER BY p.pos")
+        for pos, chunk_id, text, meta in rows:
+            yield pos, chunk_id, text, json.loads(meta)
+    finally:
+        conn.close()
+
+
+def load_store(db_dir: str, embeddings, mmap: bool = True) -> FAISS:
+    """
+    LangChain FAISS store over storage/faiss without unpickling anything:
+    index.faiss is memory-mapped (mmap=True, for serving) or read into RAM, chunk text comes
+    from chunks.sqlite on demand. Both are opened read-only;
+    additions stay in memory (see ChunkStore). The snapshot must not need_repair().
+    """
+    index_path = os.path.join(db_dir, "index.faiss")
+    index = read_index_mmap(index_path) if mmap else faiss.read_index(index_path)
+    sql = _SQLite(os.path.join(db_dir, CHUNK_DB), readonly=True)
+    return FAISS(embeddings, index, ChunkStore(sql), PositionMap(sql))
@@ -0,0 +1,111 @@
+import copy
+from typing import Dict, List, Optional, Tuple
+
+MIN_OVERLAP_CHARS = 20   # shorter matches between chunks are coincidence, not splitter overlap
+MAX_OVERLAP_CHARS = 300  # > the 150-char splitter overlap, which the splitter may round up to a word/line boundary
+MIN_ITEM_TOKENS = 32     # a piece that would be cut below this is dropped instead
+
+
+def _overlap(a: str, b: str) -> int:
+    """Length of the longest suffix of `a` that is also a prefix of `b`."""
+    for n in range(min(len(a), len(b), MAX_OVERLAP_CHARS), MIN_OVERLAP_CHARS - 1, -1):
+        if a.endswith(b[:n]):
+            return n
+    return 0
+
+def strip_overlap(text: str, kept: List[str]) -> str:
+    """Remove the parts of `text` already present in `kept` (duplicates, text shared with a neighbour chunk)."""
+    text = text.strip()
+    for other in kept:
+        if text in other:
+            return ""
+        n = _overlap(other, text)   # text continues `other`
+        if n:
+            text = text[n:].lstrip()
+        n = _overlap(text, other)   # text precedes `other`
+        if n:
+            text = text[:-n].rstrip()
+    return text
+
+
+class ContextPacker:
+    """
+    Builds the prompt within a token budget measured with the generator's tokenizer.
+
+    The template with the question and the answer cue is paid for first; lecture chunks and web
+    snippets are then added in relevance order (L1, W1, L2, W2, ...) with overlapping text
+    removed, each capped at max_item_tokens, until the budget is spent. Nothing is cut from
+    the right of the final prompt, so the question and "Answer:" always survive.
+    """
+
+    def __init__(self, tokenizer, template: str, budget: int = 900, max_item_tokens: int = 300):
+        # own copy: a fast tokenizer keeps its truncation setting in shared Rust state, and packing
+        # (no truncation) concurrently with prompt encoding (truncation) fails with "Already borrowed"
+        self.tokenizer = copy.deepcopy(tokenizer)
+        self.template = template
+        self.budget = budget
+        self.max_item_tokens = max_item_tokens
+
+    def count(self, text: str) -> int:
+        return len(self.tokenizer(text, add_special_tokens=False)["input_ids"])
+
+    def _head(self, text: str, n: int) -> str:
+        ids = self.tokenizer(text, add_special_tokens=False)["input_ids"]
+        return text if len(ids) <= n else self.tokenizer.decode(ids[:n])
+
+    def pack(self, question: str, chunks: List[str], web: Optional[List[Dict]] = None) -> Tuple[str, Dict]:
+        """
+        chunks: lecture texts, best first. web: [{"title", "url", "text"}], best first.
+        Returns (prompt, info) where info has tokens, budget and how many pieces were kept/dropped.
+        """
+        # an absurdly long question may take at most half the budget
+        question = self._head(question, self.budget // 2)
+        fixed = self.count(self.template.format(question=question, context="", web="(none)"))
+        left = self.budget - fixed - 8  # slack for merges across the joins, see below
+
+        items = []  # (kind, header, body, footer)
+        web = web or []
+        for i in range(max(len(chunks), len(web))):
+            if i < len(chunks):
+                items.append(("L", "", chunks[i], ""))
+            if i < len(web):
+                w = web[i]
+                items.append(("W", f"{w['title']}\n", w["text"], f"\n(Source: {w['url']})"))
+
+        kept_text, picked, dropped, overlap_chars = [], {"L": [], "W": []}, 0, 0
+        for kind, header, body, footer in items:
+            text = strip_overlap(body, kept_text)
+            overlap_chars += len(body.strip()) - len(text)
+            if not text:
+                dropped += 1
+                continue
+            tag = f"[{kind}{len(picked[kind]) + 1}] "
+            cost_wrap = self.count(tag + header + footer) + 2  # + the "\n\n" separator
+            room = min(self.max_item_tokens, left - cost_wrap)
+            if room < MIN_ITEM_TOKENS:
+                dropped += 1
+                continue
+            text = self._head(text, room)
+            left -= cost_wrap + self.count(text)
+            kept_text.append(text)
+            picked[kind].append(tag + header + text + footer)
+
+        prompt = self._render(question, picked)
+        # pieces were measured one by one; BPE merges across the joins can add a few tokens
+        while self.count(prompt) > self.budget and (picked["L"] or picked["W"]):
+            kind = "W" if len(picked["W"]) >= len(picked["L"]) and picked["W"] else "L"
+            picked[kind].pop()
+            dropped += 1
+            prompt = self._render(question, picked)
+        return prompt, {
+            "tokens": self.count(prompt), "budget": self.budget,
+            "lecture_chunks": len(picked["L"]), "web_snippets": len(picked["W"]),
+            "dropped": dropped, "overlap_chars_removed": overlap_chars,
+        }
+
+    def _render(self, question: str, picked: Dict[str, List[str]]) -> str:
+        return self.template.format(
+            question=question,
+            context="\n\n".join(picked["L"]),
+            web="\n\n".join(picked["W"]) or "(none)",
+        )
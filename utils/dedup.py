@@ -0,0 +1,93 @@
+import re, zlib
+from collections import defaultdict
+from typing import Dict, List, Tuple
+import numpy as np
+
+_WORD = re.compile(r"\w+")
+_PRIME = np.uint64(4294967311)  # smallest prime above 2**32; hashed shingles are crc32 values
+
+
+def _perm_params(num_perm: int, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    # a, b in [0, p): a universal hash family for x < p
+    rng = np.random.RandomState(seed)
+    a = rng.randint(1, 2 ** 32, size=num_perm, dtype=np.uint64)
+    b = rng.randint(0, 2 ** 32, size=num_perm, dtype=np.uint64)
+    return a, b
+
+def _mulmod(x: np.ndarray, a: np.ndarray) -> np.ndarray:
+    """
+    outer(x, a) mod p for x, a < p without leaving uint64: a plain product reaches 2**65, so x
+    is split into 16-bit halves and every partial product stays below 2**50.
+    """
+    hi, lo = (x >> np.uint64(16))[:, None], (x & np.uint64(0xFFFF))[:, None]
+    return (((hi * a) % _PRIME << np.uint64(16)) + lo * a) % _PRIME
+
+def shingles(text: str, n: int = 5) -> np.ndarray:
+    """crc32 of every n-word shingle of the lower-cased text (deterministic across processes)."""
+    words = _WORD.findall(text.lower())
+    if len(words) < n:
+        grams = [" ".join(words)] if words else []
+    else:
+        grams = [" ".join(words[i:i + n]) for i in range(len(words) - n + 1)]
+    return np.fromiter((zlib.crc32(g.encode()) for g in set(grams)), dtype=np.uint64)
+
+def minhash(text: str, num_perm: int = 128, shingle: int = 5, seed: int = 1) -> np.ndarray:
+    """MinHash signature: per permutation, the minimum of (a * x + b) mod p over the shingles."""
+    x = shingles(text, shingle)
+    if x.size == 0:
+        return np.full(num_perm, _PRIME, dtype=np.uint64)
+    a, b = _perm_params(num_perm, seed)
+    return ((_mulmod(x, a) + b) % _PRIME).min(axis=0)
+
+def lsh_bands(num_perm: int, threshold: float, recall: float = 0.95) -> Tuple[int, int]:
+    """
+    (bands, rows) dividing num_perm with the most rows per band (fewest spurious candidates) that
+    still makes a pair at exactly `threshold` a candidate with probability >= recall.
+    """
+    options = sorted(((num_perm // r, r) for r in range(1, num_perm + 1) if num_perm % r == 0),
+                     key=lambda br: -br[1])
+    for b, r in options:
+        if 1 - (1 - threshold ** r) ** b >= recall:
+            return b, r
+    return num_perm, 1
+
+
+class NearDuplicateFilter:
+    """
+    Streaming MinHash/LSH near-duplicate filter: the first text of a group is kept, later texts
+    whose estimated Jaccard similarity (over word shingles) with a kept one reaches `threshold`
+    are reported as duplicates. LSH bands only pick the candidates; each candidate is confirmed
+    against its full signature, so the band setting trades recall for speed, not precision.
+    """
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 128, shingle: int = 5):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle = shingle
+        self.bands, self.rows = lsh_bands(num_perm, threshold)
+        self._buckets: List[Dict[bytes, List[int]]] = [defaultdict(list) for _ in range(self.bands)]
+        self._sigs: List[np.ndarray] = []
+        self.seen = self.dropped = 0
+
+    def signature(self, text: str) -> np.ndarray:
+        return minhash(text, self.num_perm, self.shingle)
+
+    def is_duplicate(self, sig: np.ndarray) -> bool:
+        """Check a signature against everything kept so far; keeps (indexes) it when it is new."""
+        self.seen += 1
+        keys = [sig[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+        candidates = {j for band, key in zip(self._buckets, keys) for j in band.get(key, ())}
+        for j in candidates:
+            if np.mean(self._sigs[j] == sig) >= self.threshold:
+                self.dropped += 1
+                return True
+        idx = len(self._sigs)
+        self._sigs.append(sig)
+        for band, key in zip(self._buckets, keys):
+            band[key].append(idx)
+        return False
+
+    def stats(self) -> Dict:
+        return {"seen": self.seen, "kept": self.seen - self.dropped, "dropped": self.dropped,
+                "dedup_ratio": round(self.dropped / self.seen, 4) if self.seen else 0.0,
+                "threshold": self.threshold, "bands": self.bands, "rows": self.rows}
@@ -0,0 +1,361 @@
+import os, json, base64, shutil, threading, time, uuid
+from typing import Callable, Iterator, List, Optional, Tuple
+import numpy as np
+import faiss
+from langchain_core.documents import Document
+from utils import snapshots
+from utils.ann_index import FLAT_SIDECAR, LayeredIndex
+from utils.bm25_index import BM25Index, rrf_fuse
+from utils.chunk_store import CHUNK_DB, ChunkStore, extend_chunk_db, load_store, needs_repair, repair_chunk_db
+
+DELTA_LOG = "delta.log"
+DELTA_LOCK = ".delta.lock"  # held by every process while it appends to or truncates the log
+
+
+def _encode_vec(vec) -> str:
+    return base64.b64encode(np.asarray(vec, dtype="float32").tobytes()).decode("ascii")
+
+def _decode_vec(s: str) -> List[float]:
+    return np.frombuffer(base64.b64decode(s), dtype="float32").tolist()
+
+def _atomic_write(path: str, data: bytes):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def _bm25_of(db) -> Optional[BM25Index]:
+    return BM25Index(db.docstore.sql) if isinstance(db.docstore, ChunkStore) else None
+
+def _docs_at(db, positions: List[int]):
+    # a position without a chunk (index and chunk store out of step) is a miss, not an answer
+    docs = []
+    for p in positions:
+        try:
+            doc = db.docstore.search(db.index_to_docstore_id[p])
+        except KeyError:
+            continue
+        if isinstance(doc, Document):  # LangChain's in-memory docstore returns an error string instead
+            docs.append(doc)
+    return docs
+
+def log_size(db_dir: str) -> int:
+    """Bytes in the delta log; records up to here can be folded and then dropped with drop_log_head."""
+    path = os.path.join(db_dir, DELTA_LOG)
+    with snapshots.file_lock(os.path.join(db_dir, DELTA_LOCK)):
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+def log_records(db_dir: str, upto: Optional[int] = None) -> Iterator[dict]:
+    """Records of the delta log ({"id", "text", "metadata", "vector"}); upto: only the first `upto` bytes."""
+    path = os.path.join(db_dir, DELTA_LOG)
+    if not os.path.exists(path):
+        return
+    with open(path, "rb") as f:
+        data = f.read() if upto is None else f.read(upto)
+    for line in data.decode("utf-8", errors="replace").splitlines():
+        try:
+            rec = json.loads(line)
+        except json.JSONDecodeError:
+            return  # torn last line from a crash mid-append
+        rec["vector"] = _decode_vec(rec["vector"])
+        yield rec
+
+def drop_log_head(db_dir: str, offset: int):
+    """Remove the first `offset` bytes of the delta log (records that are in a published version now)."""
+    path = os.path.join(db_dir, DELTA_LOG)
+    with snapshots.file_lock(os.path.join(db_dir, DELTA_LOCK)):
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as f:
+            f.seek(offset)
+            tail = f.read()
+        _atomic_write(path, tail)
+
+
+def upgrade_current(db_dir: str) -> Optional[str]:
+    """
+    The current version, republished first if its chunks.sqlite needs a repair or migration
+    (utils.chunk_store.needs_repair). Call it before load_store and without the publish lock:
+    of several workers starting together, the first republishes and the rest find it done.
+    """
+    if needs_repair(snapshots.current_dir(db_dir)):
+        with snapshots.publish_lock(db_dir):
+            src = snapshots.current_dir(db_dir)
+            if needs_repair(src):
+                build = snapshots.new_build_dir(db_dir)
+                try:
+                    snapshots.copy_files(src, build, skip=("index.pkl", CHUNK_DB, DELTA_LOG))
+                    repair_chunk_db(src, build)
+                except BaseException:
+                    shutil.rmtree(build, ignore_errors=True)
+                    raise
+                snapshots.publish(db_dir, build)
+    return snapshots.current_version(db_dir)
+
+
+class LiveIndex:
+    """
+    Keeps the loaded LangChain FAISS store current without reloading or rewriting it per upload.
+
+    - add_texts() embeds with the already-loaded embedder, adds the vectors to the in-memory
+      index (searchable immediately) and appends them to an append-only delta log that every
+      process serving db_dir shares.
+    - On startup the delta log is replayed on top of the snapshot version (no re-embedding).
+    - search() runs dense (faiss), lexical (BM25 postings in chunks.sqlite) or hybrid retrieval,
+      the latter fused with reciprocal-rank fusion.
+    - A background thread folds the log into a new snapshot version (utils/snapshots.py) once it
+      holds compact_every chunks, publishes it and switches to it; searches only wait while the
+      pending rows are copied out.
+    - watch() follows versions published by other processes and replays what they append to the
+      log. A new version is opened next to the old one and swapped in, so a search that is
+      already running finishes on the version it started with.
+    """
+
+    def __init__(self, db, embeddings, db_dir: str, compact_every: int = 500, version: Optional[str] = None):
+        # db: store from utils.chunk_store.load_store over snapshots.version_dir(db_dir, version)
+        self.db = db
+        self.embeddings = embeddings
+        self.db_dir = db_dir
+        self.version = version
+        self.compact_every = compact_every
+        self.log_path = os.path.join(db_dir, DELTA_LOG)
+        self._log_lock = os.path.join(db_dir, DELTA_LOCK)
+        self.lock = threading.RLock()
+        self._compacting = threading.Lock()
+        self._reloading = threading.Lock()
+        self._listeners: List[Callable[[], None]] = []
+        self._reload_hooks: List[Callable] = []
+        self.bm25 = _bm25_of(db)
+        self._pending = self.replay()
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._compactor, name="delta-compactor", daemon=True)
+        self._thread.start()
+        self._watcher: Optional[threading.Thread] = None
+
+    # --- reads ---
+    def search(self, query: str, k: int = 4, mode: str = "hybrid", fetch_k: int = 20):
+        """mode: "dense", "bm25" or "hybrid" (each side fetches fetch_k candidates, fused by RRF)."""
+        vectors = [self.embeddings.embed_query(query)] if mode != "bm25" else None
+        return self.search_batch([query], k=k, mode=mode, fetch_k=fetch_k, vectors=vectors)[0]
+
+    def search_batch(self, queries: List[str], k: int = 4, mode: str = "hybrid", fetch_k: int = 20,
+                     vectors: Optional[List[List[float]]] = None):
+        """
+        search() for many queries: the dense side is one matrix index.search over all query
+        vectors (one embed_documents call unless `vectors` are given). Returns one list per query.
+        """
+        db, bm25 = self.db, self.bm25  # a reload swaps both; positions are only valid within one version
+        if bm25 is None:
+            mode = "dense"
+        dense = None
+        if mode in ("dense", "hybrid"):
+            if vectors is None:
+                vectors = self.embeddings.embed_documents(queries)
+            with self.lock:
+                _, found = db.index.search(np.asarray(vectors, dtype="float32"),
+                                           fetch_k if mode == "hybrid" else k)
+            dense = [[int(p) for p in row if p >= 0] for row in found]
+        results = []
+        for i, query in enumerate(queries):
+            rankings = [dense[i]] if dense is not None else []
+            if mode in ("bm25", "hybrid"):
+                hits = bm25.search(query, fetch_k if mode == "hybrid" else k, max_pos=db.index.ntotal)
+                rankings.append([p for p, _ in hits])
+            positions = rrf_fuse(rankings, k) if len(rankings) > 1 else rankings[0][:k]
+            with self.lock:
+                results.append(_docs_at(db, positions))
+        return results
+
+    def similarity_search(self, query: str, k: int = 4):
+        return self.search(query, k=k, mode="dense")
+
+    def __len__(self):
+        return self.db.index.ntotal
+
+    # --- writes ---
+    def add_texts(self, texts: List[str], metadatas: Optional[List[dict]] = None) -> List[str]:
+        if not texts:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        vectors = self.embeddings.embed_documents(texts)  # the slow part, done outside the lock
+        ids = [uuid.uuid4().hex for _ in texts]
+        lines = "".join(
+            json.dumps({"id": i, "text": t, "metadata": m, "vector": _encode_vec(v)}, ensure_ascii=False) + "\n"
+            for i, t, m, v in zip(ids, texts, metadatas, vectors)
+        )
+        with self.lock:
+            with snapshots.file_lock(self._log_lock), open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+            self._add(self.db, self.bm25, texts, vectors, metadatas, ids)
+            self._pending += len(ids)
+            if self._pending >= self.compact_every:
+                self._wake.set()
+        self._changed()
+        return ids
+
+    def on_change(self, fn: Callable[[], None]):
+        """Call fn() whenever the searchable chunks change (e.g. to drop cached retrieval results)."""
+        self._listeners.append(fn)
+
+    def on_reload(self, fn: Callable):
+        """Call fn(db) on a newly opened snapshot version before it is swapped in (e.g. to tune the index)."""
+        self._reload_hooks.append(fn)
+
+    def _changed(self):
+        for fn in self._listeners:
+            fn()
+
+    def replay(self) -> int:
+        """Apply delta-log records that are not in the index yet; returns how many the log holds."""
+        with self.lock:
+            return self._replay(self.db, self.bm25)[0]
+
+    def _replay(self, db, bm25, upto: Optional[int] = None) -> Tuple[int, int]:
+        # (records in the log, records added to db); upto: only read the first `upto` bytes
+        mapping = db.index_to_docstore_id
+        known = mapping.has_id if hasattr(mapping, "has_id") else set(mapping.values()).__contains__
+        texts, vectors, metas, ids, pending = [], [], [], [], 0
+        for rec in log_records(self.db_dir, upto):
+            pending += 1
+            if known(rec["id"]):
+                continue
+            texts.append(rec["text"])
+            vectors.append(rec["vector"])
+            metas.append(rec["metadata"])
+            ids.append(rec["id"])
+        if ids:
+            self._add(db, bm25, texts, vectors, metas, ids)
+        return pending, len(ids)
+
+    def _add(self, db, bm25, texts, vectors, metadatas, ids):
+        start = len(db.index_to_docstore_id)
+        db.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas, ids=ids)
+        if bm25 is not None:
+            bm25.add(zip(range(start, start + len(texts)), texts))
+
+    # --- snapshot versions ---
+    def compact(self):
+        """Fold the delta log into a new snapshot version, publish it and switch to it."""
+        with self._compacting, snapshots.publish_lock(self.db_dir, blocking=False) as locked:
+            if not locked:
+                return  # another process is publishing; watch() picks its version up
+            if snapshots.current_version(self.db_dir) != self.version:
+                self.reload()  # fork from the newest version, not the one this process loaded
+            with self.lock:
+                offset = log_size(self.db_dir)
+                # records other processes logged since our last replay are folded as well
+                self._pending = self._replay(self.db, self.bm25, upto=offset)[0]
+                if not offset:
+                    return
+                src = snapshots.version_dir(self.db_dir, self.version)
+                index = self.db.index
+                if isinstance(index, LayeredIndex):
+                    tail = index.unflushed()
+                else:
+                    index_bytes = faiss.serialize_index(index).tobytes()
+                docs = self.db.docstore.pending()
+                positions = self.db.index_to_docstore_id.pending()
+
+            # disk writes happen without blocking searches or new appends; nothing is visible to
+            # other processes until publish() swaps the pointer
+            build = snapshots.new_build_dir(self.db_dir)
+            try:
+                snapshots.copy_files(src, build, skip=("index.faiss", CHUNK_DB, DELTA_LOG))
+                extend_chunk_db(src, build, docs, positions)
+                if isinstance(index, LayeredIndex):
+                    index_bytes = faiss.serialize_index(index.merged(os.path.join(src, "index.faiss"), tail)).tobytes()
+                _atomic_write(os.path.join(build, "index.faiss"), index_bytes)
+                self._extend_flat_sidecar(build, positions, offset)
+            except BaseException:
+                shutil.rmtree(build, ignore_errors=True)
+                raise
+            version = snapshots.publish(self.db_dir, build)
+            # a crash before this only leaves folded records in the log; replay skips them by id
+            drop_log_head(self.db_dir, offset)
+            self.reload(version)
+
+    def reload(self, version: Optional[str] = None) -> bool:
+        """
+        Switch to a published snapshot version (default: the current one); False if already on it.
+        The new version is opened and caught up with the delta log beside the old one, so the
+        swap itself is a pointer assignment and the generator / embedder are not touched.
+        """
+        with self._reloading:
+            version = version or snapshots.current_version(self.db_dir)
+            if version is None or version == self.version:
+                return False
+            db = load_store(snapshots.version_dir(self.db_dir, version), self.db.embedding_function,
+                            mmap=isinstance(self.db.index, LayeredIndex))
+            for fn in self._reload_hooks:
+                fn(db)
+            bm25 = _bm25_of(db)
+            self._replay(db, bm25)  # the bulk of the log, while searches keep using the old version
+            with self.lock:
+                # plus whatever was appended meanwhile (records already applied are skipped by id)
+                pending = self._replay(db, bm25)[0]
+                self.db, self.bm25, self.version, self._pending = db, bm25, version, pending
+        self._changed()
+        return True
+
+    def watch(self, interval: float = 2.0):
+        """
+        Every `interval` seconds, switch to a newly published version and replay records other
+        processes appended to the delta log, so every worker serving db_dir sees every upload.
+        """
+        if self._watcher is None and interval > 0:
+            self._watcher = threading.Thread(target=self._watch, args=(interval,), name="snapshot-watcher", daemon=True)
+            self._watcher.start()
+
+    def _watch(self, interval: float):
+        seen = None
+        while True:
+            time.sleep(interval)
+            try:
+                self.reload()
+                st = os.stat(self.log_path) if os.path.exists(self.log_path) else None
+                sig = (st.st_ino, st.st_size, st.st_mtime_ns) if st else None
+                if sig == seen:
+                    continue
+                seen = sig
+                with self.lock:
+                    self._pending, added = self._replay(self.db, self.bm25)
+                    if self._pending >= self.compact_every:
+                        self._wake.set()
+                if added:
+                    self._changed()
+            except Exception as e:
+                print(f"Snapshot watcher failed: {e}")
+
+    def _extend_flat_sidecar(self, build_dir: str, positions, offset: int):
+        # an approximate index.faiss has an exact copy next to it (see utils/ann_index.py);
+        # append the vectors being folded, in position order, so the next build_vector_db sees them too
+        sidecar = os.path.join(build_dir, FLAT_SIDECAR)
+        if not os.path.exists(sidecar):
+            return
+        flat = faiss.read_index(sidecar)
+        new = sorted(p for p in positions if p >= flat.ntotal)
+        if not new:
+            return
+        vectors = {}
+        with open(self.log_path, "rb") as f:
+            for line in f.read(offset).decode("utf-8", errors="replace").splitlines():
+                rec = json.loads(line)
+                vectors[rec["id"]] = rec["vector"]
+        if new[0] != flat.ntotal or any(positions[p] not in vectors for p in new):
+            print(f"{sidecar} is out of sync with the index; run build_vector_db.py --full")
+            return
+        flat.add(np.asarray([_decode_vec(vectors[positions[p]]) for p in new], dtype="float32"))
+        _atomic_write(sidecar, faiss.serialize_index(flat).tobytes())
+
+    def _compactor(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            try:
+                self.compact()
+            except Exception as e:
+                print(f"Delta log compaction failed: {e}")
@@ -1,18 +1,77 @@
-import os,re
-from typing import List
+import os,re,hashlib,tempfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Dict, Iterator, List, Optional, Tuple
 from pathlib import Path
-from unstructured.partition.pdf import partition_pdf
-from unstructured.partition.docx import partition_docx
+
+# Bump when load_* output changes so cached text from the old extractor is not reused
+EXTRACTOR_VERSION = "1"
+PARSE_CACHE_DIR = os.getenv("PARSE_CACHE_DIR", "storage/parse_cache")
+# "pymupdf" (fast text layer, unstructured only for pages without text) or "unstructured" (slow, full layout)
+PDF_BACKEND = os.getenv("PDF_BACKEND", "pymupdf")
+PDF_PAGE_WORKERS = int(os.getenv("PDF_PAGE_WORKERS", "0")) or os.cpu_count() or 1
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "40"))
+
+# set inside load_many() worker processes (mark_file_worker), which already run one file per core
+_IN_FILE_WORKER = False
 
 def load_txt(path: str) -> str:
     with open(path, "r", encoding="utf-8", errors="ignore") as f:
         return f.read()
-def load_pdf(path:str)->str:
-    elements=partition_pdf(filename=path)
+
+def _elements_text(elements) -> str:
     return "\n".join(e.text for e in elements if getattr(e, "text", None))
+
+def load_pdf_unstructured(path: str) -> str:
+    from unstructured.partition.pdf import partition_pdf  # heavy import, only when this backend is used
+    return _elements_text(partition_pdf(filename=path))
+
+def _pymupdf_pages(args: Tuple[str, int, int]) -> List[str]:
+    import pymupdf
+    path, start, stop = args
+    with pymupdf.open(path) as doc:
+        return [doc[i].get_text("text") for i in range(start, stop)]
+
+def _unstructured_page(path: str, page_no: int) -> str:
+    # scanned / image-only page: copy it into a one-page PDF and let unstructured OCR just that
+    import pymupdf
+    from unstructured.partition.pdf import partition_pdf
+    with pymupdf.open(path) as src, pymupdf.open() as one:
+        one.insert_pdf(src, from_page=page_no, to_page=page_no)
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+            tmp_path = tmp.name
+        try:
+            one.save(tmp_path)
+            return _elements_text(partition_pdf(filename=tmp_path))
+        finally:
+            os.remove(tmp_path)
+
+def load_pdf_pymupdf(path: str, workers: Optional[int] = None, fallback: bool = True) -> str:
+    """Text layer via PyMuPDF, split into page ranges across processes for large decks."""
+    import pymupdf
+    with pymupdf.open(path) as doc:
+        n = doc.page_count
+    workers = 1 if _IN_FILE_WORKER else (workers or PDF_PAGE_WORKERS)
+    if workers > 1 and n >= PDF_PARALLEL_MIN_PAGES:
+        step = -(-n // workers)
+        ranges = [(path, s, min(s + step, n)) for s in range(0, n, step)]
+        # spawned, not forked: this runs in API ingest threads, and forking a process with other
+        # threads running (model, pools, watchers) can leave the child stuck on a lock they held
+        with ProcessPoolExecutor(max_workers=len(ranges), mp_context=get_context("spawn")) as ex:
+            pages = [t for part in ex.map(_pymupdf_pages, ranges) for t in part]
+    else:
+        pages = _pymupdf_pages((path, 0, n))
+    if fallback:
+        pages = [t if t.strip() else _unstructured_page(path, i) for i, t in enumerate(pages)]
+    return "\n".join(t.strip() for t in pages if t.strip())
+
+def load_pdf(path:str)->str:
+    if PDF_BACKEND == "unstructured":
+        return load_pdf_unstructured(path)
+    return load_pdf_pymupdf(path)
 def load_docx(path:str)->str:
-    elements = partition_docx(filename=path)
-    return "\n".join(e.text for e in elements if getattr(e, "text", None))
+    from unstructured.partition.docx import partition_docx
+    return _elements_text(partition_docx(filename=path))
 def load_any(path:str)->str:
     ext=Path(path).suffix.lower()
     if ext ==".txt":
@@ -29,4 +88,64 @@ def collect_files(root: str) -> List[str]:
         for f in files:
             if Path(f).suffix.lower() in [".txt", ".pdf", ".docx"]:
                 paths.append(os.path.join(dirpath, f))
-    return sorted(paths)
\ No newline at end of file
+    return sorted(paths)
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _cache_path(path: str, sha: str) -> str:
+    backend = PDF_BACKEND if Path(path).suffix.lower() == ".pdf" else ""
+    key = hashlib.sha256(f"{sha}:{Path(path).suffix.lower()}:{backend}:{EXTRACTOR_VERSION}".encode()).hexdigest()
+    return os.path.join(PARSE_CACHE_DIR, key[:2], key + ".txt")
+
+def load_cached(path: str, sha: Optional[str] = None) -> str:
+    """load_any() backed by an on-disk cache keyed by content hash + extractor version."""
+    cp = _cache_path(path, sha or file_sha256(path))
+    if os.path.exists(cp):
+        return load_txt(cp)
+    text = load_any(path)
+    os.makedirs(os.path.dirname(cp), exist_ok=True)
+    tmp = f"{cp}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, cp)
+    return text
+
+def mark_file_worker():
+    """ProcessPoolExecutor initializer for pools that parse one file per process: no page-level pool inside."""
+    global _IN_FILE_WORKER
+    _IN_FILE_WORKER = True
+
+def _load_cached_job(args: Tuple[str, str]) -> None:
+    # text goes to the parse cache, not back through the pipe, so finished-but-unconsumed
+    # files do not pile up in the parent's memory
+    load_cached(*args)
+
+def load_many(paths: List[str], hashes: Optional[Dict[str, str]] = None,
+              workers: Optional[int] = None) -> Iterator[Tuple[str, str]]:
+    """
+    Yields (path, text) in input order. Cache hits are read in this process;
+    misses are parsed in parallel worker processes (partition_pdf is CPU-bound).
+    """
+    hashes = hashes or {}
+    shas = [hashes.get(p) or file_sha256(p) for p in paths]
+    misses = [i for i, (p, sha) in enumerate(zip(paths, shas)) if not os.path.exists(_cache_path(p, sha))]
+    workers = workers or int(os.getenv("EXTRACT_WORKERS", "0")) or os.cpu_count() or 1
+
+    if len(misses) <= 1 or workers <= 1:
+        for p, sha in zip(paths, shas):
+            yield p, load_cached(p, sha)
+        return
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(misses)), initializer=mark_file_worker) as ex:
+        # misses are in input order, so the ordered map results line up with the loop below
+        parsed = ex.map(_load_cached_job, [(paths[i], shas[i]) for i in misses])
+        miss_set = set(misses)
+        for i, (p, sha) in enumerate(zip(paths, shas)):
+            if i in miss_set:
+                next(parsed)  # wait until the worker has written it to the cache
+            yield p, load_cached(p, sha)
\ No newline at end of file
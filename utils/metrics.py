@@ -0,0 +1,136 @@
+import bisect, threading, time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# Minimal in-process metrics with Prometheus text exposition (GET /metrics in scripts/api.py).
+# Each uvicorn worker process keeps its own registry; scrape every worker (or run one per pod).
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048)
+
+Labels = Tuple[Tuple[str, str], ...]
+_registry: List["_Metric"] = []
+_collectors: List[Callable[[], List[Tuple[str, str, str, List[Tuple[Dict, float]]]]]] = []
+_local = threading.local()  # per-request stage breakdown of the request running in this thread
+
+
+def _labels(labels: Dict) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _fmt(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+def _num(v: float) -> str:
+    return repr(float(v)) if v != float("inf") else "+Inf"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonic count; exposed as <name> (pass a name ending in _total)."""
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_fmt(k)} {_num(v)}" for k, v in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    """Cumulative buckets + sum + count per label set, as Prometheus histograms are exposed."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Labels, list] = {}  # labels -> [per-bucket counts (+Inf last), sum, count]
+
+    def observe(self, value: float, **labels):
+        key = _labels(labels)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            s[0][bisect.bisect_left(self.buckets, value)] += 1
+            s[1] += value
+            s[2] += 1
+
+    def _samples(self) -> List[str]:
+        out = []
+        with self._lock:
+            for key, (counts, total, n) in sorted(self._series.items()):
+                running = 0
+                for le, c in zip(self.buckets + (float("inf"),), counts):
+                    running += c
+                    out.append(f"{self.name}_bucket{_fmt(key, ('le', _num(le)))} {running}")
+                out.append(f"{self.name}_sum{_fmt(key)} {_num(total)}")
+                out.append(f"{self.name}_count{_fmt(key)} {n}")
+        return out
+
+
+def collector(fn: Callable[[], List[Tuple[str, str, str, List[Tuple[Dict, float]]]]]):
+    """Register fn() -> [(name, kind, help, [(labels, value)])], evaluated at every scrape (for stats kept elsewhere)."""
+    _collectors.append(fn)
+    return fn
+
+def render() -> str:
+    lines = []
+    for m in _registry:
+        lines += m.render()
+    for fn in _collectors:
+        for name, kind, help, samples in fn():
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+            lines += [f"{name}{_fmt(_labels(labels))} {_num(v)}" for labels, v in samples]
+    return "\n".join(lines) + "\n"
+
+
+STAGE_SECONDS = Histogram("rag_stage_seconds", "Wall time per pipeline stage")
+
+@contextmanager
+def stage(name: str, **labels) -> Iterator[None]:
+    """Time a block into rag_stage_seconds{stage=name} and the current request's breakdown, if any."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        dt = time.perf_counter() - t0
+        STAGE_SECONDS.observe(dt, stage=name, **labels)
+        timings = getattr(_local, "timings", None)
+        if timings is not None:
+            timings[name] = round(timings.get(name, 0.0) + dt * 1000, 2)
+
+@contextmanager
+def trace() -> Iterator[Dict[str, float]]:
+    """Collect the stages run by this thread into a {stage: ms} dict (plus "total")."""
+    prev, _local.timings = getattr(_local, "timings", None), {}
+    t0 = time.perf_counter()
+    try:
+        yield _local.timings
+    finally:
+        _local.timings["total"] = round((time.perf_counter() - t0) * 1000, 2)
+        _local.timings = prev
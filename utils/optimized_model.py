@@ -0,0 +1,50 @@
+import os, json
+from typing import Dict, Optional
+import torch
+from transformers import AutoModelForCausalLM
+from transformers.pytorch_utils import Conv1D
+
+OPTIMIZE_CONFIG = "optimize.json"  # written next to the merged weights by scripts/optimize_model.py
+
+
+def conv1d_to_linear(model):
+    """
+    GPT-2 implements its projections as transformers' Conv1D (x @ W + b), which
+    quantize_dynamic does not recognise; swap each one for the equivalent nn.Linear.
+    """
+    for parent in list(model.modules()):
+        for name, child in list(parent.named_children()):
+            if isinstance(child, Conv1D):
+                nx, nf = child.weight.shape
+                linear = torch.nn.Linear(nx, nf, bias=True)
+                linear.weight.data = child.weight.data.t().contiguous()
+                linear.bias.data = child.bias.data
+                setattr(parent, name, linear)
+    return model
+
+def apply_optimizations(model, quantize: Optional[str] = "int8", compile_model: bool = False):
+    """Post-load transforms for CPU serving: dynamic int8 Linear weights and/or torch.compile."""
+    model.eval()
+    if quantize == "int8":
+        model = torch.ao.quantization.quantize_dynamic(conv1d_to_linear(model), {torch.nn.Linear}, dtype=torch.qint8)
+    if compile_model:
+        # generate() calls forward with a growing sequence; dynamic shapes avoid a recompile per length
+        model.forward = torch.compile(model.forward, dynamic=True)
+    return model
+
+def read_config(path: str) -> Optional[Dict]:
+    cfg = os.path.join(path, OPTIMIZE_CONFIG)
+    if not os.path.exists(cfg):
+        return None
+    with open(cfg, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def load_optimized(path: str):
+    """
+    Load an artifact from scripts/optimize_model.py: LoRA already merged into the fp32 weights,
+    quantization/compilation re-applied on load as recorded in optimize.json (quantized modules
+    are not portable through save_pretrained, and re-quantizing GPT-2 takes about a second).
+    """
+    cfg = read_config(path) or {}
+    model = AutoModelForCausalLM.from_pretrained(path, torch_dtype=torch.float32)
+    return apply_optimizations(model, quantize=cfg.get("quantize"), compile_model=cfg.get("compile", False))
@@ -0,0 +1,93 @@
+import threading
+from typing import Dict, List
+import torch
+import torch.nn.functional as F
+
+PACKED_ATTENTION = "packed_sdpa"
+_segments = threading.local()  # segment ids of the batch being run in this thread
+
+
+def pack_examples(batch: Dict[str, List[List[int]]], block_size: int = 1024) -> Dict[str, List[List[int]]]:
+    """
+    datasets.map(batched=True) fn: concatenate tokenized examples into blocks of at most
+    block_size tokens without splitting an example. position_ids restart at 0 for every example
+    (so each one sees the same positions as when trained alone) and the first token of each
+    example gets no label, so nothing is predicted across a boundary.
+    """
+    out = {"input_ids": [], "position_ids": [], "labels": []}
+    ids, pos, labels = [], [], []
+    for ex in batch["input_ids"]:
+        ex = ex[:block_size]
+        if ids and len(ids) + len(ex) > block_size:
+            out["input_ids"].append(ids)
+            out["position_ids"].append(pos)
+            out["labels"].append(labels)
+            ids, pos, labels = [], [], []
+        ids += ex
+        pos += list(range(len(ex)))
+        labels += [-100] + ex[1:]
+    if ids:
+        out["input_ids"].append(ids)
+        out["position_ids"].append(pos)
+        out["labels"].append(labels)
+    return out
+
+
+class PackedCollator:
+    """Pads packed blocks to the longest in the batch (labels with -100, positions with 0)."""
+
+    def __init__(self, pad_token_id: int):
+        self.pad_token_id = pad_token_id
+
+    def __call__(self, features: List[Dict]) -> Dict[str, torch.Tensor]:
+        width = max(len(f["input_ids"]) for f in features)
+
+        def pad(key, value):
+            return torch.tensor([list(f[key]) + [value] * (width - len(f[key])) for f in features])
+
+        return {
+            "input_ids": pad("input_ids", self.pad_token_id),
+            "position_ids": pad("position_ids", 0),
+            "labels": pad("labels", -100),
+            "attention_mask": torch.tensor([[1] * len(f["input_ids"]) + [0] * (width - len(f["input_ids"]))
+                                            for f in features]),
+        }
+
+
+def _packed_attention(module, query, key, value, attention_mask, head_mask=None, dropout=0.0, **kwargs):
+    # causal attention restricted to the token's own example: a position may attend to a key
+    # only if no example starts between them (segment ids come from the position_ids restarts)
+    n = query.shape[-2]
+    allowed = torch.ones(n, n, dtype=torch.bool, device=query.device).tril()
+    seg = getattr(_segments, "ids", None)
+    if seg is not None:
+        allowed = allowed & (seg[:, None, :, None] == seg[:, None, None, :])
+    elif attention_mask is not None:
+        allowed = allowed & (attention_mask == 0)  # GPT-2 passes padding as an additive mask
+    scale = value.size(-1) ** -0.5 if module.scale_attn_weights else 1.0
+    if module.scale_attn_by_inverse_layer_idx:
+        scale /= float(module.layer_idx + 1)
+    out = F.scaled_dot_product_attention(query, key, value, attn_mask=allowed, dropout_p=dropout, scale=scale)
+    return out.transpose(1, 2).contiguous(), None
+
+def enable_packed_attention(model) -> bool:
+    """
+    Make a GPT-2 style model respect example boundaries inside packed blocks. GPT-2 only takes
+    a 2D padding mask, so the block-diagonal mask is built inside a registered attention function
+    from the position_ids of the current forward call. Returns False when this transformers
+    version has no attention-function registry (examples in a block then see earlier ones).
+    """
+    try:
+        from transformers.modeling_utils import ALL_ATTENTION_FUNCTIONS
+    except ImportError:
+        return False
+    ALL_ATTENTION_FUNCTIONS[PACKED_ATTENTION] = _packed_attention
+    base = model.get_base_model() if hasattr(model, "get_base_model") else model
+    base.config._attn_implementation = PACKED_ATTENTION
+
+    def capture(module, args, kwargs):
+        pos = kwargs.get("position_ids")
+        _segments.ids = None if pos is None else torch.cumsum(pos == 0, dim=-1)
+
+    base.register_forward_pre_hook(capture, with_kwargs=True)
+    return True
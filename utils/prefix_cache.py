@@ -0,0 +1,98 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+import torch
+
+try:
+    from transformers import DynamicCache
+except ImportError:  # older transformers only take the legacy tuple format
+    DynamicCache = None
+
+
+def common_prefix(tokenizer, texts: Sequence[str]) -> List[int]:
+    """
+    Longest token prefix shared by the tokenizations of `texts`. Render a template with
+    different fillers to get its static head exactly as it is tokenized inside a full prompt
+    (BPE merges at the boundary would make tokenizing the head on its own differ).
+    """
+    rows = [tokenizer(t, add_special_tokens=False)["input_ids"] for t in texts]
+    n = 0
+    while all(len(r) > n for r in rows) and len({r[n] for r in rows}) == 1:
+        n += 1
+    return rows[0][:n]
+
+
+class PrefixCache:
+    """
+    Past key/values of token prefixes shared by many prompts (the PROMPT preamble, or any other
+    fixed head), computed once and reused so generate() only prefills the rest of each prompt.
+
+    prepare() returns model.generate() kwargs. On a hit the batch is laid out as
+    [cached prefix][padding][rest of prompt] with the padding masked out: the positions GPT-2
+    derives from the attention mask stay the same as for left padding, and one prefix KV can be
+    shared by every row of a micro-batch.
+    """
+
+    def __init__(self, model, maxsize: int = 8):
+        self.model = model
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Tuple[int, ...], tuple]" = OrderedDict()  # ids -> legacy past_key_values
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.tokens_saved = 0
+
+    @torch.inference_mode()
+    def add(self, ids: Sequence[int]):
+        key = tuple(ids)
+        if not key or key in self._entries:
+            return
+        out = self.model(torch.tensor([key], device=self.model.device), use_cache=True)
+        pkv = out.past_key_values
+        legacy = pkv.to_legacy_cache() if hasattr(pkv, "to_legacy_cache") else pkv
+        with self._lock:
+            self._entries[key] = legacy
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def match(self, rows: List[List[int]]) -> Tuple[Optional[Tuple[int, ...]], Optional[tuple]]:
+        """(ids, past) of the longest cached prefix shared by every row, leaving at least one token per row to prefill."""
+        best = None
+        with self._lock:
+            for key in self._entries:
+                n = len(key)
+                if (best is None or n > len(best)) and all(len(r) > n and tuple(r[:n]) == key for r in rows):
+                    best = key
+            if best is None:
+                self.misses += 1
+                return None, None
+            self._entries.move_to_end(best)
+            self.hits += 1
+            self.tokens_saved += len(best) * len(rows)
+            return best, self._entries[best]
+
+    def _past(self, legacy: tuple, batch: int):
+        # fresh tensors per call: generate() appends to the cache it is given
+        layers = tuple(tuple(t.expand(batch, *t.shape[1:]).contiguous() for t in layer) for layer in legacy)
+        if DynamicCache is not None and getattr(self.model, "_supports_cache_class", False):
+            return DynamicCache.from_legacy_cache(layers)
+        return layers
+
+    def prepare(self, rows: List[List[int]], pad_id: int) -> Dict:
+        """generate() kwargs for unpadded token id rows: input_ids, attention_mask (+ past_key_values on a hit)."""
+        key, legacy = self.match(rows)
+        n = len(key) if key else 0
+        rests = [r[n:] for r in rows]
+        width = max(len(r) for r in rests)
+        ids = [list(key or ()) + [pad_id] * (width - len(r)) + r for r in rests]
+        mask = [[1] * n + [0] * (width - len(r)) + [1] * len(r) for r in rests]
+        kwargs = {
+            "input_ids": torch.tensor(ids, device=self.model.device),
+            "attention_mask": torch.tensor(mask, device=self.model.device),
+        }
+        if key:
+            kwargs["past_key_values"] = self._past(legacy, len(rows))
+        return kwargs
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"prefixes": [len(k) for k in self._entries], "hits": self.hits,
+                    "misses": self.misses, "tokens_saved": self.tokens_saved}
@@ -0,0 +1,87 @@
+import os, sys, threading, time
+from collections import Counter
+from typing import Dict, List, Optional
+
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler that can be switched on and off in a running server. A
+    background thread snapshots every thread's Python stack each `interval` seconds and counts
+    identical stacks, so the cost is proportional to the sampling rate, not to the code being
+    profiled. Stacks come out in the collapsed format flamegraph.pl / speedscope read.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stacks: Counter = Counter()
+        self.samples = 0
+        self.interval = 0.01
+        self.started_at: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval_ms: float = 10) -> bool:
+        """Start sampling (clears the previous profile); False when it is already running."""
+        with self._lock:
+            if self.running:
+                return False
+            self._stacks, self.samples = Counter(), 0
+            self.interval = max(1.0, interval_ms) / 1000
+            self.started_at = time.time()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        me = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            names.update((t.ident, t.name) for t in threading.enumerate())
+            sample = []
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                sample.append(";".join(reversed(stack)))
+            # readers copy the counter under the same lock
+            with self._lock:
+                self._stacks.update(sample)
+                self.samples += 1
+
+    def _snapshot(self):
+        with self._lock:
+            return Counter(self._stacks), self.samples
+
+    def collapsed(self) -> str:
+        """"thread;outer;...;inner count" lines, most frequent first."""
+        stacks, _ = self._snapshot()
+        return "".join(f"{s} {n}\n" for s, n in stacks.most_common())
+
+    def report(self, top: int = 20) -> Dict:
+        # innermost frames by how often they were on-CPU-or-waiting when sampled
+        stacks, samples = self._snapshot()
+        leaves: Counter = Counter()
+        for s, n in stacks.items():
+            leaves[s.rsplit(";", 1)[-1]] += n
+        total = sum(stacks.values()) or 1
+        hot: List[Dict] = [{"frame": f, "samples": n, "share": round(n / total, 4)} for f, n in leaves.most_common(top)]
+        return {"running": self.running, "samples": samples, "interval_ms": self.interval * 1000,
+                "started_at": self.started_at, "top_frames": hot}
+
+
+profiler = SamplingProfiler()
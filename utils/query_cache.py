@@ -0,0 +1,136 @@
+import re, threading, time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+import numpy as np
+
+_SPACE = re.compile(r"\s+")
+
+
+def normalize_query(q: str) -> str:
+    # "What is DNS?" / "what is  dns" hit the same entry
+    return _SPACE.sub(" ", q.lower()).strip().rstrip("?!. ")
+
+def _unit(vec) -> np.ndarray:
+    v = np.asarray(vec, dtype="float32")
+    n = float(np.linalg.norm(v))
+    return v / n if n else v
+
+
+class QueryCache:
+    """
+    Thread-safe LRU keyed by (params, normalized query), with an optional TTL. With
+    normalize=False the query is used verbatim, for values that depend on the exact text.
+
+    With a semantic threshold, a miss on the exact query falls back to the cached entry with
+    the same params whose query embedding has the highest cosine similarity, if that is at
+    least `threshold` (near-duplicate questions reuse the result).
+    """
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: Optional[float] = None,
+                 threshold: Optional[float] = None, normalize: bool = True):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl or None
+        self.threshold = threshold or None
+        self.normalize = normalize
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (value, expires, unit vec)
+        self.hits = self.semantic_hits = self.misses = self.evictions = 0
+
+    def _key(self, query: str, params: tuple) -> Hashable:
+        return params, normalize_query(query) if self.normalize else query
+
+    def get(self, query: str, params: tuple = (), vec=None) -> Optional[Any]:
+        if self.maxsize <= 0:
+            return None
+        key = self._key(query, params)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is not None and entry[1] < now:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if self.threshold and vec is not None:
+                best = self._nearest(params, _unit(vec), now)
+                if best is not None:
+                    self._entries.move_to_end(best)
+                    self.semantic_hits += 1
+                    return self._entries[best][0]
+            self.misses += 1
+            return None
+
+    def _nearest(self, params: tuple, q: np.ndarray, now: float) -> Optional[Hashable]:
+        keys = [k for k, (_, expires, v) in self._entries.items()
+                if k[0] == params and v is not None and (expires is None or expires >= now)]
+        if not keys:
+            return None
+        sims = np.stack([self._entries[k][2] for k in keys]) @ q
+        i = int(np.argmax(sims))
+        return keys[i] if sims[i] >= self.threshold else None
+
+    def put(self, query: str, value: Any, params: tuple = (), vec=None):
+        if self.maxsize <= 0:
+            return
+        key = self._key(query, params)
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires, _unit(vec) if vec is not None else None)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.semantic_hits + self.misses
+            return {
+                "size": len(self._entries), "maxsize": self.maxsize,
+                "hits": self.hits, "semantic_hits": self.semantic_hits, "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.semantic_hits) / lookups, 4) if lookups else None,
+            }
+
+
+class CachedEmbeddings:
+    """
+    Wraps a LangChain embeddings object so repeated queries are not re-encoded.
+    Keyed on the exact text: case, spacing and punctuation change the vector, so normalized
+    matching is left to the answer/retrieval caches. embed_documents (ingest) is passed through
+    uncached.
+    """
+
+    def __init__(self, embeddings, maxsize: int = 1024):
+        self.embeddings = embeddings
+        self.cache = QueryCache("embedding", maxsize=maxsize, normalize=False)
+
+    def embed_query(self, text: str) -> List[float]:
+        vec = self.cache.get(text)
+        if vec is None:
+            vec = self.embeddings.embed_query(text)
+            self.cache.put(text, vec)
+        return vec
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """embed_query for many texts: cached ones are reused, the rest are encoded in one call."""
+        vecs = [self.cache.get(t) for t in texts]
+        missing = list(dict.fromkeys(t for t, v in zip(texts, vecs) if v is None))
+        if missing:
+            fresh = dict(zip(missing, self.embeddings.embed_documents(missing)))
+            for t, v in fresh.items():
+                self.cache.put(t, v)
+            vecs = [fresh[t] if v is None else v for t, v in zip(texts, vecs)]
+        return vecs
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def __getattr__(self, name):
+        return getattr(self.embeddings, name)
@@ -0,0 +1,138 @@
+import os, shutil, threading, time, uuid
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+try:
+    import fcntl
+except ImportError:  # Windows: locks below only exclude threads of one process
+    fcntl = None
+
+# Versioned index snapshots under one root (storage/faiss):
+#   versions/v<publish ms>/   index.faiss, chunks.sqlite, flat.faiss, manifest.json, ... (never modified)
+#   CURRENT                   name of the published version, replaced atomically
+#   delta.log                 uploads not folded into a version yet (see utils/live_index.py)
+# Writers build a new version in a private directory and publish it by swapping CURRENT; serving
+# processes poll CURRENT and switch over (LiveIndex.watch). A root without CURRENT is the
+# unversioned layout from before, with the snapshot files directly in it; it is read as is and
+# the first publish copies it into versions/. Its files are left in place (they may be tracked).
+
+CURRENT = "CURRENT"
+VERSIONS = "versions"
+PUBLISH_LOCK = ".publish.lock"
+# superseded versions kept for processes that have not switched yet (or still serve a request from one)
+SNAPSHOT_KEEP = int(os.getenv("SNAPSHOT_KEEP", "2"))
+SNAPSHOT_GRACE_S = float(os.getenv("SNAPSHOT_GRACE_S", "300"))
+_thread_locks = {}
+
+
+def current_version(root: str) -> Optional[str]:
+    try:
+        with open(os.path.join(root, CURRENT), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def version_dir(root: str, version: Optional[str]) -> str:
+    return os.path.join(root, VERSIONS, version) if version else root
+
+def current_dir(root: str) -> str:
+    return version_dir(root, current_version(root))
+
+def versions(root: str) -> List[str]:
+    """Published versions, oldest first."""
+    path = os.path.join(root, VERSIONS)
+    if not os.path.isdir(path):
+        return []
+    return sorted(n for n in os.listdir(path) if n.startswith("v") and n[1:].isdigit())
+
+
+@contextmanager
+def file_lock(path: str, blocking: bool = True) -> Iterator[bool]:
+    """Exclusive lock across processes (flock on `path`); yields False if non-blocking and taken."""
+    if fcntl is None:
+        lock = _thread_locks.setdefault(os.path.abspath(path), threading.Lock())
+        acquired = lock.acquire(blocking)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                lock.release()
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def publish_lock(root: str, blocking: bool = True):
+    """Held while building and publishing a version, so two writers never fork from the same base."""
+    return file_lock(os.path.join(root, PUBLISH_LOCK), blocking)
+
+
+def new_build_dir(root: str) -> str:
+    """Private directory to write the next version into; pass it to publish() when complete."""
+    path = os.path.join(root, VERSIONS, f".build-{uuid.uuid4().hex[:12]}")
+    os.makedirs(path)
+    return path
+
+def copy_files(src: str, dst: str, skip=()):
+    """Copy the snapshot's other files (sidecar, manifest, reports) into a build directory."""
+    for name in os.listdir(src):
+        path = os.path.join(src, name)
+        if name in skip or name == CURRENT or name.startswith(".") or name.endswith(".tmp") or not os.path.isfile(path):
+            continue
+        shutil.copy2(path, os.path.join(dst, name))
+
+def _fsync_dir(path: str):
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+def publish(root: str, build_dir: str) -> str:
+    """Make build_dir the current version (one atomic rename of CURRENT), then gc(); returns its name."""
+    name = f"v{time.time_ns() // 1_000_000:013d}"
+    last = versions(root)
+    if last and name <= last[-1]:
+        name = f"v{int(last[-1][1:]) + 1:013d}"
+    final = version_dir(root, name)
+    os.rename(build_dir, final)
+    _fsync_dir(os.path.dirname(final))
+    tmp = os.path.join(root, CURRENT + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(name)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, os.path.join(root, CURRENT))
+    _fsync_dir(root)
+    gc(root)
+    return name
+
+def gc(root: str, keep: int = SNAPSHOT_KEEP, grace: float = SNAPSHOT_GRACE_S) -> List[str]:
+    """
+    Delete versions that are neither current, among the `keep` newest, nor superseded less than
+    `grace` seconds ago (a version is superseded when the next one is published). Call it with
+    the publish lock held: leftover build directories are removed as crashed builds.
+    """
+    now_ms = time.time() * 1000
+    names, current = versions(root), current_version(root)
+    kept = set(names[-keep:]) if keep > 0 else set()  # names[-0:] would be every version
+    removed = []
+    # the newest version is never an `older`, so it survives even when CURRENT is missing or stale
+    for older, newer in zip(names, names[1:]):
+        if older == current or older in kept or now_ms - int(newer[1:]) < grace * 1000:
+            continue
+        shutil.rmtree(version_dir(root, older), ignore_errors=True)
+        removed.append(older)
+    vdir = os.path.join(root, VERSIONS)
+    for name in os.listdir(vdir) if os.path.isdir(vdir) else ():
+        if name.startswith(".build-"):
+            shutil.rmtree(os.path.join(vdir, name), ignore_errors=True)
+    return removed
@@ -0,0 +1,116 @@
+import threading, time
+from collections import deque
+from typing import Dict, Optional
+import torch
+
+
+class SpeculativeDecoder:
+    """
+    Assisted (speculative) generation: a small draft model proposes `draft_tokens` tokens per
+    step and the main model verifies them in a single forward pass. Only used for single-prompt
+    generate() calls (transformers' assisted decoding does not batch).
+
+    The acceptance rate is estimated per call from forward-pass counts: every main-model pass
+    yields one token of its own, so accepted drafts = new tokens - main passes, out of one
+    proposed token per draft pass. When the mean over the last `window` calls drops below
+    `min_acceptance` the draft only costs time, so calls fall back to plain decoding; every
+    `probe_every`-th call runs the other mode to keep both speed estimates current and to
+    re-enable drafting if acceptance recovers.
+    """
+
+    def __init__(self, model, draft, draft_tokens: int = 5, min_acceptance: float = 0.3,
+                 window: int = 20, probe_every: int = 20):
+        self.model = model
+        self.draft = draft
+        draft.generation_config.num_assistant_tokens = draft_tokens
+        draft.generation_config.num_assistant_tokens_schedule = "constant"
+        self.min_acceptance = min_acceptance
+        self.probe_every = probe_every
+        self.enabled = True
+        self._recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._local = threading.local()  # forward counts of the generate() running in this thread
+        self._calls = 0
+        self.totals = {"speculative_calls": 0, "plain_calls": 0, "proposed": 0, "accepted": 0,
+                       "speculative_tokens": 0, "speculative_s": 0.0, "plain_tokens": 0, "plain_s": 0.0}
+        model.register_forward_hook(self._count("main"))
+        draft.register_forward_hook(self._count("draft"))
+
+    def _count(self, which: str):
+        def hook(module, args, output):
+            counts = getattr(self._local, "counts", None)
+            if counts is not None:
+                counts[which] += 1
+        return hook
+
+    def _use_draft(self) -> bool:
+        with self._lock:
+            self._calls += 1
+            probe = self.probe_every and self._calls % self.probe_every == 0
+            return self.enabled != bool(probe)
+
+    @torch.inference_mode()
+    def generate(self, **kwargs):
+        """model.generate(**kwargs) for a batch of one, with the draft model when it pays off."""
+        speculative = self._use_draft()
+        self._local.counts = {"main": 0, "draft": 0}
+        prompt_len = kwargs["input_ids"].shape[1]
+        t0 = time.perf_counter()
+        try:
+            if speculative:
+                out = self.model.generate(assistant_model=self.draft, **kwargs)
+            else:
+                out = self.model.generate(**kwargs)
+        finally:
+            counts, self._local.counts = self._local.counts, None
+        elapsed = time.perf_counter() - t0
+        new_tokens = out.shape[1] - prompt_len
+
+        with self._lock:
+            if speculative:
+                proposed = counts["draft"]
+                accepted = max(0, new_tokens - counts["main"])
+                self.totals["speculative_calls"] += 1
+                self.totals["proposed"] += proposed
+                self.totals["accepted"] += accepted
+                self.totals["speculative_tokens"] += new_tokens
+                self.totals["speculative_s"] += elapsed
+                if proposed:
+                    self._recent.append(accepted / proposed)
+                if len(self._recent) == self._recent.maxlen:
+                    rate = sum(self._recent) / len(self._recent)
+                    if self.enabled and rate < self.min_acceptance:
+                        print(f"Draft acceptance {rate:.2f} < {self.min_acceptance}; falling back to plain decoding")
+                    self.enabled = rate >= self.min_acceptance
+            else:
+                self.totals["plain_calls"] += 1
+                self.totals["plain_tokens"] += new_tokens
+                self.totals["plain_s"] += elapsed
+        return out
+
+    def stats(self) -> Dict:
+        with self._lock:
+            t = dict(self.totals)
+            recent = sum(self._recent) / len(self._recent) if self._recent else None
+        spec_tps = t["speculative_tokens"] / t["speculative_s"] if t["speculative_s"] else None
+        plain_tps = t["plain_tokens"] / t["plain_s"] if t["plain_s"] else None
+        return {
+            "enabled": self.enabled,
+            "draft_tokens": self.draft.generation_config.num_assistant_tokens,
+            "acceptance_rate": round(t["accepted"] / t["proposed"], 4) if t["proposed"] else None,
+            "recent_acceptance_rate": round(recent, 4) if recent is not None else None,
+            "speculative_tokens_per_sec": round(spec_tps, 2) if spec_tps else None,
+            "plain_tokens_per_sec": round(plain_tps, 2) if plain_tps else None,
+            "speedup": round(spec_tps / plain_tps, 3) if spec_tps and plain_tps else None,
+            "speculative_calls": t["speculative_calls"], "plain_calls": t["plain_calls"],
+        }
+
+
+def load_draft(name: str, model, device=None) -> Optional[torch.nn.Module]:
+    """The draft model, or None when it cannot verify against `model` (different vocabulary)."""
+    from transformers import AutoModelForCausalLM
+    draft = AutoModelForCausalLM.from_pretrained(name).to(device or model.device).eval()
+    if draft.config.vocab_size != model.config.vocab_size:
+        print(f"Draft model {name} has a different vocabulary than the generator; speculative decoding disabled")
+        return None
+    return draft
@@ -1,15 +1,65 @@
-import os, re, time, html
+import os, re, time, html, json, hashlib, threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, wait
+from typing import Dict, List, Optional
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 from readability import Document
+from utils.metrics import Counter, stage
 
 TIMEOUT = int(os.getenv("SCRAPE_TIMEOUT", "10"))
+DDG_URL = os.getenv("DDG_URL", "https://duckduckgo.com/html/")  # point at a stub server for testing
+WEB_DEADLINE = float(os.getenv("WEB_DEADLINE", "4"))           # seconds for search + all fetches of one question
+WEB_FETCH_WORKERS = int(os.getenv("WEB_FETCH_WORKERS", "8"))
+WEB_CACHE_DIR = os.getenv("WEB_CACHE_DIR", "storage/web_cache")
+WEB_CACHE_TTL = float(os.getenv("WEB_CACHE_TTL", str(24 * 3600)))  # seconds; 0 disables the cache
+WEB_CACHE_MAX_MB = float(os.getenv("WEB_CACHE_MAX_MB", "200"))
+# puts between full sweeps even below the limit (expiry, and writes by other worker processes)
+WEB_CACHE_SWEEP_EVERY = int(os.getenv("WEB_CACHE_SWEEP_EVERY", "500"))
+HEADERS = {"User-Agent": "Mozilla/5.0"}
 
-def ddg_search(query: str, max_results: int = 5):
-    # DuckDuckGo lite HTML
-    url = "https://duckduckgo.com/html/"
-    r = requests.post(url, data={"q": query}, timeout=TIMEOUT, headers={"User-Agent":"Mozilla/5.0"})
-    soup = BeautifulSoup(r.text, "html.parser")
+# One pooled session for every request: keep-alive connections are reused across questions
+_session = requests.Session()
+_session.headers.update(HEADERS)
+_adapter = HTTPAdapter(pool_connections=WEB_FETCH_WORKERS, pool_maxsize=WEB_FETCH_WORKERS)
+_session.mount("http://", _adapter)
+_session.mount("https://", _adapter)
+# searches and page fetches; work whose question's deadline has passed is cancelled while queued and
+# gives up while running (_get_text), so late pages never hold a worker another question needs
+_fetch_pool = ThreadPoolExecutor(max_workers=WEB_FETCH_WORKERS, thread_name_prefix="web-fetch")
+_evict_lock = threading.Lock()
+_size_lock = threading.Lock()
+_cache_bytes: Optional[int] = None  # running size of WEB_CACHE_DIR; None until the first sweep
+_puts_since_sweep = 0
+WEB_REQUESTS = Counter("rag_web_requests_total", "Web searches and page fetches by outcome (ok, error, timeout)")
+
+def _get_text(method: str, url: str, deadline: float, **kwargs) -> str:
+    """
+    Response body as text. requests' timeout only bounds each connect / read, so the body is
+    streamed and the request abandoned with requests.Timeout once time.monotonic() passes `deadline`.
+    """
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise requests.Timeout(f"deadline passed before requesting {url}")
+    with _session.request(method, url, timeout=min(TIMEOUT, remaining), stream=True, **kwargs) as r:
+        r.raise_for_status()  # never parse (or cache) error pages
+        if hasattr(r.raw, "read1"):
+            # urllib3 >= 2.2: returns whatever has arrived, so a slowly dripping body is checked too
+            chunks = iter(lambda: r.raw.read1(64 * 1024, decode_content=True), b"")
+        else:
+            chunks = r.iter_content(64 * 1024)
+        body = []
+        for chunk in chunks:
+            body.append(chunk)
+            if time.monotonic() > deadline:
+                raise requests.Timeout(f"{url} was still downloading at the deadline")
+        return b"".join(body).decode(r.encoding or "utf-8", errors="replace")
+
+def ddg_search(query: str, max_results: int = 5, deadline: Optional[float] = None):
+    # DuckDuckGo lite HTML; deadline is a time.monotonic() value (default TIMEOUT from now)
+    with stage("ddg_search"):
+        page = _get_text("POST", DDG_URL, deadline or time.monotonic() + TIMEOUT, data={"q": query})
+    soup = BeautifulSoup(page, "html.parser")
     results = []
     for a in soup.select("a.result__a")[:max_results]:
         href = a.get("href")
@@ -17,10 +67,135 @@ def ddg_search(query: str, max_results: int = 5):
         results.append({"title": title, "url": href})
     return results
 
-def fetch_readable(url: str) -> str:
-    r = requests.get(url, timeout=TIMEOUT, headers={"User-Agent":"Mozilla/5.0"})
-    doc = Document(r.text)
+
+def _cache_path(url: str) -> str:
+    key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    return os.path.join(WEB_CACHE_DIR, key[:2], key + ".json")
+
+def _cache_get(url: str) -> Optional[str]:
+    cp = _cache_path(url)
+    try:
+        with open(cp, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if entry.get("url") != url or time.time() - entry.get("fetched_at", 0) > WEB_CACHE_TTL:
+        return None
+    return entry["text"]
+
+def _cache_put(url: str, text: str):
+    cp = _cache_path(url)
+    os.makedirs(os.path.dirname(cp), exist_ok=True)
+    try:
+        replaced = os.stat(cp).st_size
+    except OSError:
+        replaced = 0
+    tmp = f"{cp}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"url": url, "fetched_at": time.time(), "text": text}, f, ensure_ascii=False)
+        size = f.tell()
+    os.replace(tmp, cp)
+    if _account(size - replaced):
+        # the directory walk runs off the fetch path
+        threading.Thread(target=_evict, name="web-cache-evict", daemon=True).start()
+
+def _account(delta: int) -> bool:
+    """Add a put to the running cache size; True when a sweep is due."""
+    global _cache_bytes, _puts_since_sweep
+    with _size_lock:
+        _puts_since_sweep += 1
+        if _cache_bytes is None:
+            return True
+        _cache_bytes += delta
+        return _cache_bytes > WEB_CACHE_MAX_MB * 1024 * 1024 or _puts_since_sweep >= WEB_CACHE_SWEEP_EVERY
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass  # already gone
+
+def _evict():
+    """Drop expired entries, then the oldest ones until the cache is 10% under WEB_CACHE_MAX_MB."""
+    global _cache_bytes, _puts_since_sweep
+    if not _evict_lock.acquire(blocking=False):
+        return  # a sweep is already running
+    try:
+        now, entries, total = time.time(), [], 0
+        for root, _, names in os.walk(WEB_CACHE_DIR):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if now - st.st_mtime > WEB_CACHE_TTL:
+                    _remove(path)
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        # sweep down to a low-water mark so the next few puts do not trigger another walk
+        limit = WEB_CACHE_MAX_MB * 1024 * 1024
+        if total > limit:
+            for _, size, path in sorted(entries):
+                if total <= 0.9 * limit:
+                    break
+                _remove(path)
+                total -= size
+        with _size_lock:
+            _cache_bytes, _puts_since_sweep = total, 0
+    finally:
+        _evict_lock.release()
+
+
+def readable_text(page_html: str) -> str:
+    doc = Document(page_html)
     summary_html = doc.summary()
     soup = BeautifulSoup(summary_html, "html.parser")
-    text = soup.get_text("\n", strip=True)
+    return soup.get_text("\n", strip=True)
+
+def fetch_readable(url: str, deadline: Optional[float] = None) -> str:
+    """Readable text of a page (from the cache when fresh); deadline as for ddg_search."""
+    if WEB_CACHE_TTL > 0:
+        text = _cache_get(url)
+        if text is not None:
+            return text
+    with stage("fetch_readable"):
+        text = readable_text(_get_text("GET", url, deadline or time.monotonic() + TIMEOUT))
+    if WEB_CACHE_TTL > 0:
+        _cache_put(url, text)
     return text
+
+def _outcome(fut) -> str:
+    if fut.cancelled() or not fut.done() or isinstance(fut.exception(), requests.Timeout):
+        return "timeout"
+    return "error" if fut.exception() is not None else "ok"
+
+def fetch_many(urls: List[str], deadline: float = WEB_DEADLINE) -> Dict[str, str]:
+    """
+    Fetch urls concurrently and return {url: text} for those that finished within `deadline`
+    seconds; failed and late pages are left out.
+    """
+    end = time.monotonic() + deadline
+    futures = {_fetch_pool.submit(fetch_readable, u, end): u for u in dict.fromkeys(urls)}
+    done, late = wait(futures, timeout=max(0.0, deadline))
+    for f in late:
+        f.cancel()  # still queued: never started; running ones give up at `end` by themselves
+    for f in futures:
+        WEB_REQUESTS.inc(kind="fetch", result=_outcome(f) if f in done else "timeout")
+    return {futures[f]: f.result() for f in done if f.exception() is None}
+
+def web_search(query: str, max_results: int = 3, deadline: float = WEB_DEADLINE) -> List[Dict]:
+    """ddg_search + fetch_many under one deadline: [{"title", "url", "text"}] in search order."""
+    end = time.monotonic() + deadline
+    # on the pool, so a stalled connect or name lookup cannot hold the caller past the deadline
+    search = _fetch_pool.submit(ddg_search, query, max_results, end)
+    try:
+        hits = search.result(timeout=max(0.0, end - time.monotonic()))
+    except (FutureTimeout, requests.RequestException):
+        search.cancel()
+        WEB_REQUESTS.inc(kind="search", result=_outcome(search))
+        return []
+    WEB_REQUESTS.inc(kind="search", result="ok")
+    pages = fetch_many([h["url"] for h in hits], deadline=end - time.monotonic())
+    return [dict(h, text=pages[h["url"]]) for h in hits if h["url"] in pages]
@@ -0,0 +1,80 @@
+import asyncio, threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+
+class PoolSaturated(RuntimeError):
+    """Raised when a pool already holds max_workers + max_queue tasks."""
+
+    def __init__(self, name: str, retry_after: int):
+        super().__init__(f"{name} pool is saturated")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class BoundedPool:
+    """
+    Dedicated thread pool for one kind of blocking work (inference, ingest, ...)
+    with admission control: at most max_workers running plus max_queue waiting.
+    Anything beyond that is rejected right away with PoolSaturated.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int, timeout: float, retry_after: int = 5):
+        self.name = name
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.capacity = max(1, max_workers) + max(0, max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix=f"{name}-pool")
+        self._lock = threading.Lock()
+        self._inflight = 0
+
+    def _acquire(self):
+        with self._lock:
+            if self._inflight >= self.capacity:
+                raise PoolSaturated(self.name, self.retry_after)
+            self._inflight += 1
+
+    def _release(self, *_):
+        with self._lock:
+            self._inflight -= 1
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        self._acquire()
+        try:
+            fut = self._executor.submit(fn, *args, **kwargs)
+        except Exception:
+            self._release()
+            raise
+        fut.add_done_callback(self._release)
+        return fut
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Await fn(*args, **kwargs) on the pool; raises TimeoutError after `timeout` seconds."""
+        fut = self.submit(fn, *args, **kwargs)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(fut), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            # only takes effect while the task is still queued; a running task cannot be interrupted
+            fut.cancel()
+            raise
+
+    def reserve(self) -> Callable[[], None]:
+        """
+        Reserve capacity for work that runs outside the executor (e.g. a token stream).
+        Returns a callable that gives the slot back; calling it more than once is a no-op.
+        """
+        self._acquire()
+        released = threading.Event()
+
+        def release():
+            if not released.is_set():
+                released.set()
+                self._release()
+        return release
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"inflight": self._inflight, "capacity": self.capacity}
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)